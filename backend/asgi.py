@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Index d'autocomplétion construit en arrière-plan dès le démarrage (voir core/autocomplete.py).
+from core.autocomplete import autocomplete  # noqa: E402
+
+autocomplete.warm()
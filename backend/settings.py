@@ -138,6 +138,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# --- IMPORTATION DES CIRCULAIRES EN ARRIÈRE-PLAN ---
+# Dossier où les documents reçus attendent d'être traités par 'manage.py run_import_worker'.
+FLYER_IMPORT_DIR = os.getenv('FLYER_IMPORT_DIR', os.path.join(BASE_DIR, 'flyer_imports'))
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -33,17 +33,26 @@ urlpatterns = [
     
     # --- API : MARCHÉ & RABAIS (market_api) ---
     path('api/import-flyer/', market_api.importer_circulaire, name='api_import_flyer'),
+    path('api/import-flyer/stream/', market_api.importer_circulaire_flux, name='api_import_flyer_stream'),
+    path('api/import-flyer/jobs/', market_api.creer_import_job, name='api_import_job_create'),
+    path('api/import-flyer/jobs/<int:job_id>/', market_api.get_import_job, name='api_import_job_status'),
     path('api/rabais-actifs/', market_api.get_rabais_actifs, name='api_get_rabais_actifs'),
     path('api/community-prices/', market_api.get_community_prices, name='api_get_community_prices'),
     path('api/commerces/', market_api.get_commerces, name='api_get_commerces'),
     path('api/circulaires-actives/', market_api.get_circulaires_actives, name='api_get_circulaires_actives'),
     path('api/products/search/', market_api.search_products, name='product_search'),
+    path('api/products/autocomplete/', market_api.autocomplete_products, name='product_autocomplete'),
+    path('api/products/barcode/', market_api.lookup_barcodes_batch, name='product_barcode_batch'),
+    path('api/products/barcode/<str:code>/', market_api.lookup_barcode, name='product_barcode'),
     path('api/products/', market_api.ProductView.as_view(), name='product_create'),
     path('api/prices/', market_api.PriceSubmissionView.as_view(), name='price_submit'),
     path('api/submit-deal/', market_api.submit_deal, name='api_submit_deal'),
     path('api/prices/<int:price_id>/confirm/', market_api.confirm_price, name='price_confirm'),
     path('api/prices/<int:price_id>/report/', market_api.report_price, name='price_report'),
     path('api/optimize/', market_api.optimize_shopping_list, name='api_optimize_list'),
+    path('api/optimize/solve/', market_api.solve_shopping_basket, name='api_optimize_solve'),
+    path('api/optimize/selection/', market_api.record_deal_selection, name='api_optimize_selection'),
+    path('api/optimize/recommendations/', market_api.get_recommendations, name='api_optimize_recommendations'),
 
     # --- API : INVENTAIRE (inventory_api) ---
     path('api/inventory/categories/', inventory_api.InventoryCategoryView.as_view(), name='inventory_category_list'),
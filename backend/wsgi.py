@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Index d'autocomplétion construit en arrière-plan dès le démarrage (voir core/autocomplete.py).
+from core.autocomplete import autocomplete  # noqa: E402
+
+autocomplete.warm()
@@ -0,0 +1,114 @@
+# Fichier: core/active_deals.py
+
+"""
+Instantané des rabais de circulaires actifs (table ActiveDeal).
+
+Les endpoints publics get_rabais_actifs et get_circulaires_actives lisent cette
+table au lieu de refaire la jointure Prix → Circulaire → Produit → Catégorie
+/ Commerce à chaque chargement de page. L'instantané est reconstruit :
+- après chaque importation de circulaire et chaque rabais soumis (partiellement) ;
+- au changement de date (paresseusement à la première lecture du jour, ou par
+  la commande 'manage.py rebuild_active_deals' planifiée chaque nuit).
+
+Une reconstruction partielle suppose l'instantané du jour complet : s'il est
+vide (premier déploiement) ou d'une autre date, tout est refait. Les
+reconstructions sont sérialisées par un verrou sur la ligne de
+MarketDataVersion, pour que deux reconstructions complètes simultanées (au
+changement de date) ne réinsèrent pas les mêmes prix (price_entry est unique).
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import ActiveDeal, MarketDataVersion, Prix
+
+BATCH_SIZE = 500
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _active_prices(today):
+    return Prix.objects.filter(
+        circulaire__isnull=False,
+        circulaire__date_debut__lte=today,
+        circulaire__date_fin__gte=today,
+    )
+
+
+def _insert(prices, today):
+    rows = prices.values_list(
+        'id', 'circulaire_id', 'commerce_id', 'produit_id',
+        'produit__nom', 'produit__marque', 'commerce__nom', 'produit__categorie__nom',
+        'prix', 'details_prix', 'submitted_by__username',
+        'prix_unitaire', 'quantite_lot', 'unite_mesure',
+    ).order_by('id')
+
+    total = 0
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(ActiveDeal(
+            price_entry_id=row[0], circulaire_id=row[1], commerce_id=row[2], produit_id=row[3],
+            snapshot_date=today,
+            produit_nom=row[4], marque=row[5], commerce_nom=row[6], categorie_nom=row[7],
+            prix=row[8], details_prix=row[9], submitted_by_username=row[10],
+            prix_unitaire=row[11], quantite_lot=row[12], unite_mesure=row[13],
+        ))
+        if len(batch) >= BATCH_SIZE:
+            ActiveDeal.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        ActiveDeal.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def _lock_rebuilds():
+    """ Verrou de ligne jusqu'à la fin de la transaction (sans effet sur SQLite, qui sérialise déjà les écritures). """
+    MarketDataVersion.objects.get_or_create(pk=1)
+    MarketDataVersion.objects.select_for_update().filter(pk=1).exists()
+
+
+def rebuild_active_deals(today=None, circulaire_ids=None, produit_ids=None):
+    """
+    Reconstruit l'instantané. Sans argument, tout est refait pour 'today'.
+    Avec 'circulaire_ids' et/ou 'produit_ids', seules les lignes touchées le
+    sont (l'instantané du jour doit alors déjà exister, sinon tout est refait).
+    Retourne le nombre de lignes insérées.
+    """
+    today = today or timezone.now().date()
+    partiel = circulaire_ids is not None or produit_ids is not None
+
+    with transaction.atomic():
+        _lock_rebuilds()
+        if partiel and (ActiveDeal.objects.exclude(snapshot_date=today).exists()
+                        or not ActiveDeal.objects.filter(snapshot_date=today).exists()):
+            partiel = False
+        if not partiel:
+            ActiveDeal.objects.all().delete()
+            return _insert(_active_prices(today), today)
+
+        total = 0
+        for champ, ids in (('circulaire_id', circulaire_ids), ('produit_id', produit_ids)):
+            for chunk in _chunks(ids or []):
+                filtre = Q(**{f'{champ}__in': chunk})
+                ActiveDeal.objects.filter(filtre).delete()
+                total += _insert(_active_prices(today).filter(filtre), today)
+        return total
+
+
+def active_deals(today=None):
+    """
+    Retourne le queryset de l'instantané du jour, en le reconstruisant d'abord
+    si la date a changé depuis la dernière reconstruction.
+    """
+    today = today or timezone.now().date()
+    deals = ActiveDeal.objects.filter(snapshot_date=today)
+    if not deals.exists() and _active_prices(today).exists():
+        rebuild_active_deals(today)
+    return deals
@@ -8,9 +8,10 @@ from django import forms
 
 # Import de tous les modèles nécessaires
 from .models import (
-    Commerce, Produit, Circulaire, Prix, Categorie, Profile, Report,
+    Commerce, CommerceAlias, Produit, ProduitAlias, ProduitRedirection, Circulaire, Prix, Categorie, Profile, Report, ImportJob,
     InventoryItem, ShoppingListItem, Recipe
 )
+from .active_deals import rebuild_active_deals
 
 # On crée une vue "inline" pour afficher le profil directement dans la page de l'utilisateur
 class ProfileInline(admin.StackedInline):
@@ -132,6 +133,13 @@ class ReportAdmin(admin.ModelAdmin):
     search_fields = ('price_entry__produit__nom', 'reported_by__username')
     list_editable = ('status',)
     
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    """ Suivi des importations de circulaires en arrière-plan. """
+    list_display = ('id', 'status', 'items_processed', 'attempts', 'submitted_by', 'date_created', 'date_finished')
+    list_filter = ('status',)
+    readonly_fields = ('items_processed', 'attempts', 'errors', 'result', 'date_created', 'date_started', 'date_progress', 'date_finished')
+
 # --- AMÉLIORATION DE L'ADMIN POUR LE MODÈLE PRIX ---
 
 # Filtre personnalisé pour les types de prix
@@ -152,10 +160,10 @@ class PrixTypeFilter(admin.SimpleListFilter):
 @admin.register(Prix)
 class PrixAdmin(admin.ModelAdmin):
     list_display = (
-        'produit', 'commerce', 'prix', 'type_de_prix', 'submitted_by',
+        'produit', 'commerce', 'prix', 'prix_unitaire', 'unite_mesure', 'type_de_prix', 'submitted_by',
         'date_mise_a_jour',
     )
-    list_filter = (PrixTypeFilter, 'commerce', 'submitted_by',)
+    list_filter = (PrixTypeFilter, 'commerce', 'unite_mesure', 'submitted_by',)
     search_fields = (
         'produit__nom', 'commerce__nom', 'submitted_by__username',
     )
@@ -165,6 +173,21 @@ class PrixAdmin(admin.ModelAdmin):
     def type_de_prix(self, obj):
         return "Communautaire" if obj.circulaire is None else "Circulaire"
 
+    # Une correction doit aussi se voir dans l'instantané des rabais actifs (core/active_deals.py).
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ancien = form.initial.get('produit') if change else None
+        rebuild_active_deals(produit_ids=[produit_id for produit_id in {obj.produit_id, ancien} if produit_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_active_deals(produit_ids=[obj.produit_id])
+
+    def delete_queryset(self, request, queryset):
+        produit_ids = list(queryset.values_list('produit_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        rebuild_active_deals(produit_ids=produit_ids)
+
 # Administration pour les modèles de données utilisateur
 @admin.register(InventoryItem)
 class InventoryItemAdmin(admin.ModelAdmin):
@@ -187,8 +210,45 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'user__username', 'ingredients')
     list_select_related = ('user',)
 
+class CommerceAliasForm(forms.ModelForm):
+
+    class Meta:
+        model = CommerceAlias
+        fields = ('alias',)
+
+    def clean_alias(self):
+        # Normalisé dès le formulaire : le contrôle des doublons du formset compare ces valeurs.
+        return self.cleaned_data['alias'].strip().lower()
+
+class CommerceAliasInline(admin.TabularInline):
+    model = CommerceAlias
+    form = CommerceAliasForm
+    extra = 1
+
+@admin.register(Commerce)
+class CommerceAdmin(admin.ModelAdmin):
+    """ Commerces et noms alternatifs reconnus par l'optimiseur. """
+    list_display = ('nom', 'adresse')
+    search_fields = ('nom', 'aliases__alias')
+    inlines = (CommerceAliasInline,)
+
+@admin.register(ProduitAlias)
+class ProduitAliasAdmin(admin.ModelAdmin):
+    """ Associations apprises des choix de rabais dans l'optimiseur. """
+    list_display = ('terme', 'produit', 'selections', 'date_mise_a_jour')
+    search_fields = ('terme', 'produit__nom')
+    list_select_related = ('produit',)
+    readonly_fields = ('selections', 'selectionne_par', 'date_mise_a_jour')
+
+@admin.register(ProduitRedirection)
+class ProduitRedirectionAdmin(admin.ModelAdmin):
+    """ Produits fusionnés par la commande dedupe_produits. """
+    list_display = ('ancien_id', 'ancien_nom', 'ancien_marque', 'produit', 'date_creation')
+    search_fields = ('ancien_nom', 'produit__nom')
+    list_select_related = ('produit',)
+    raw_id_fields = ('produit',)
+
 # Enregistrement des autres modèles
-admin.site.register(Commerce)
 admin.site.register(Produit)
 admin.site.register(Circulaire)
 admin.site.register(Categorie)
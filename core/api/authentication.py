@@ -0,0 +1,33 @@
+# Fichier: core/api/authentication.py
+
+"""
+Authentification par jeton sans requête SQL pour les endpoints appelés à
+chaque frappe (autocomplétion).
+
+Le jeton lu en base par TokenAuthentication est gardé TOKEN_CACHE_TIMEOUT
+secondes dans le cache Django. La suppression d'un jeton (déconnexion) ou la
+modification de son utilisateur (désactivation) retire l'entrée du cache
+(signaux de core/models.py) ; avec un cache local au processus, les autres
+processus l'oublient au plus tard à l'expiration.
+"""
+
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_CACHE_TIMEOUT = 60  # secondes
+
+
+def token_cache_key(key):
+    return f"auth-token:{key}"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, TOKEN_CACHE_TIMEOUT)
+            return user, token
+        return token.user, token
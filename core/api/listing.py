@@ -0,0 +1,261 @@
+# Fichier: core/api/listing.py
+
+"""
+Paramètres communs des listes publiques du marché :
+
+- ?commerce=IGA,Metro   (noms ou identifiants, séparés par des virgules)
+- ?categorie=Fruits     ("Non classé" désigne les produits sans catégorie)
+- ?unite=kg,l           (unité de mesure 'unite', 'kg' ou 'l', sans égard à la
+                         casse, pour les listes qui en ont une)
+- ?fields=price_id,prix (sous-ensemble des clés de chaque élément)
+- ?limit=100&cursor=... (pagination par curseur sur l'identifiant, sans OFFSET)
+- ?tri=prix_unitaire    (tri croissant sur une colonne permise, valeurs nulles
+                         à la fin ; le curseur porte alors la valeur et l'identifiant)
+
+Une colonne de tri peut être regroupée par une autre : les prix unitaires
+ne se comparent qu'à unité égale ($/kg, $/L, $/unité), la liste est donc
+triée par (unite_mesure, prix_unitaire) et le curseur porte aussi l'unité.
+
+Sans 'limit' ni 'cursor', la réponse reste le tableau complet habituel. Avec
+l'un des deux, elle devient {"results": [...], "next_cursor": "..." | null}.
+
+?stream=1 envoie le tableau complet en flux (mêmes octets que la réponse
+normale), sans le construire en mémoire.
+"""
+
+import base64
+import binascii
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.http import JsonResponse, StreamingHttpResponse
+
+from core.pricing import KILOGRAMME, LITRE, UNITE
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+SANS_CATEGORIE = "Non classé"
+UNITES = (UNITE, KILOGRAMME, LITRE)
+
+
+def _csv(request, name):
+    return [value.strip() for value in request.GET.get(name, '').split(',') if value.strip()]
+
+
+_UNSORTED = object()
+
+
+def encode_cursor(last_id, sort_value=_UNSORTED, group_value=None):
+    if sort_value is _UNSORTED:
+        payload = f"id:{last_id}"
+    else:
+        payload = f"tri:{'' if sort_value is None else sort_value}:{last_id}"
+        if group_value is not None:
+            payload = f"{payload}:{group_value}"
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sorted_=False, grouped=False):
+    """
+    Retourne l'identifiant du curseur, ou (valeur de tri, identifiant) si
+    'sorted_' ; la valeur vaut None quand la dernière ligne n'en avait pas.
+    Avec 'grouped', (valeur de tri, identifiant, valeur du groupe).
+    """
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        if not sorted_:
+            prefix, last_id = decoded.split(':', 1)
+            if prefix != 'id':
+                raise ValueError
+            return int(last_id)
+        if grouped:
+            prefix, value, last_id, group = decoded.split(':', 3)
+        else:
+            prefix, value, last_id = decoded.split(':', 2)
+        if prefix != 'tri':
+            raise ValueError
+        value = Decimal(value) if value else None
+        return (value, int(last_id), group) if grouped else (value, int(last_id))
+    except (ValueError, InvalidOperation, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Paramètre 'cursor' invalide.")
+
+
+class ListParams:
+    """
+    Lit et valide les paramètres de liste ; lève ValueError si invalides.
+    'sort_fields' associe chaque colonne de tri permise à la colonne qui
+    regroupe ses valeurs comparables, ou à None.
+    """
+
+    def __init__(self, request, allowed_fields, sort_fields=None):
+        sort_fields = sort_fields or {}
+        self.commerces = _csv(request, 'commerce')
+        self.categories = _csv(request, 'categorie')
+        self.unites = [value.lower() for value in _csv(request, 'unite')]
+        inconnues = [value for value in self.unites if value not in UNITES]
+        if inconnues:
+            raise ValueError(f"Unité(s) inconnue(s) dans 'unite' : {', '.join(inconnues)} (valeurs permises : {', '.join(UNITES)}).")
+
+        self.fields = _csv(request, 'fields') or None
+        if self.fields:
+            inconnus = [field for field in self.fields if field not in allowed_fields]
+            if inconnus:
+                raise ValueError(f"Champ(s) inconnu(s) dans 'fields' : {', '.join(inconnus)}.")
+
+        self.stream = request.GET.get('stream') == '1'
+
+        self.sort = request.GET.get('tri') or None
+        if self.sort and self.sort not in sort_fields:
+            raise ValueError(f"Paramètre 'tri' invalide (valeurs permises : {', '.join(sort_fields)}).")
+        self.sort_group = sort_fields.get(self.sort)
+
+        cursor = request.GET.get('cursor')
+        limit = request.GET.get('limit')
+        self.paginated = cursor is not None or limit is not None
+        self.after = self.after_value = self.after_group = None
+        if cursor and self.sort_group:
+            self.after_value, self.after, self.after_group = decode_cursor(cursor, sorted_=True, grouped=True)
+        elif cursor and self.sort:
+            self.after_value, self.after = decode_cursor(cursor, sorted_=True)
+        elif cursor:
+            self.after = decode_cursor(cursor)
+        self.limit = None
+        if self.paginated:
+            try:
+                self.limit = int(limit) if limit is not None else DEFAULT_LIMIT
+            except ValueError:
+                raise ValueError("Paramètre 'limit' invalide.")
+            if self.limit < 1:
+                raise ValueError("Paramètre 'limit' invalide.")
+            self.limit = min(self.limit, MAX_LIMIT)
+
+    def filter(self, queryset, commerce_id_field, commerce_nom_field, categorie_field, unite_field=None):
+        if self.commerces:
+            # isdigit() seul accepte '²', que int() refuse.
+            ids = [int(value) for value in self.commerces if value.isascii() and value.isdigit()]
+            noms = [value for value in self.commerces if not (value.isascii() and value.isdigit())]
+            queryset = queryset.filter(
+                Q(**{f'{commerce_id_field}__in': ids}) | Q(**{f'{commerce_nom_field}__in': noms})
+            )
+        if self.categories:
+            condition = Q(**{f'{categorie_field}__in': [c for c in self.categories if c != SANS_CATEGORIE]})
+            if SANS_CATEGORIE in self.categories:
+                condition |= Q(**{f'{categorie_field}__isnull': True})
+            queryset = queryset.filter(condition)
+        if self.unites and unite_field:
+            queryset = queryset.filter(**{f'{unite_field}__in': self.unites})
+        return queryset
+
+    def page(self, queryset, key_field):
+        """ Trie sur la clé et applique le curseur ; lit une ligne de plus pour savoir s'il reste une page. """
+        if self.sort:
+            return self._sorted_page(queryset, key_field)
+        queryset = queryset.order_by(key_field)
+        if self.after is not None:
+            queryset = queryset.filter(**{f'{key_field}__gt': self.after})
+        if self.limit is not None:
+            queryset = queryset[:self.limit + 1]
+        return queryset
+
+    def _sorted_page(self, queryset, key_field):
+        """ Comme page(), trié sur (groupe ; colonne de tri, valeurs nulles à la fin ; clé). """
+        order = [F(self.sort).asc(nulls_last=True), key_field]
+        if self.sort_group:
+            order.insert(0, self.sort_group)
+        queryset = queryset.order_by(*order)
+        if self.after is not None:
+            after_key = Q(**{f'{key_field}__gt': self.after})
+            if self.after_value is None:
+                after = after_key & Q(**{f'{self.sort}__isnull': True})
+            else:
+                after = (
+                    Q(**{f'{self.sort}__gt': self.after_value})
+                    | (Q(**{self.sort: self.after_value}) & after_key)
+                    | Q(**{f'{self.sort}__isnull': True})
+                )
+            if self.sort_group:
+                after = Q(**{f'{self.sort_group}__gt': self.after_group}) | (Q(**{self.sort_group: self.after_group}) & after)
+            queryset = queryset.filter(after)
+        if self.limit is not None:
+            queryset = queryset[:self.limit + 1]
+        return queryset
+
+    def _select(self, items):
+        for item in items:
+            yield {field: item[field] for field in self.fields}
+
+    def stream_response(self, items):
+        """ Réponse en flux pour une liste non paginée ('items' peut être un générateur). """
+        return stream_json_array(self._select(items) if self.fields else items)
+
+    def response(self, items, key='price_id'):
+        return JsonResponse(self.payload(items, key), safe=False)
+
+    def payload(self, items, key='price_id'):
+        """ Le tableau des éléments, ou {"results", "next_cursor"} si la liste est paginée. """
+        next_cursor = None
+        if self.paginated and len(items) > self.limit:
+            items = items[:self.limit]
+            if self.sort:
+                group = items[-1][self.sort_group] if self.sort_group else None
+                next_cursor = encode_cursor(items[-1][key], items[-1][self.sort], group)
+            else:
+                next_cursor = encode_cursor(items[-1][key])
+        if self.fields:
+            items = list(self._select(items))
+        if not self.paginated:
+            return items
+        return {"results": items, "next_cursor": next_cursor}
+
+
+def bad_request(message):
+    return JsonResponse({'error': message}, status=400)
+
+
+def _json(value):
+    # Mêmes options que JsonResponse, pour produire exactement les mêmes octets.
+    return json.dumps(value, cls=DjangoJSONEncoder)
+
+
+STREAM_BUFFER_SIZE = 16 * 1024
+
+
+def _buffered(parts):
+    """ Regroupe les petits morceaux pour éviter un envoi réseau par élément. """
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _stream_array(items):
+    yield '['
+    for index, item in enumerate(items):
+        yield (', ' if index else '') + _json(item)
+    yield ']'
+
+
+def _stream_object(pairs):
+    yield '{'
+    for index, (key, value) in enumerate(pairs):
+        yield (', ' if index else '') + _json(key) + ': ' + _json(value)
+    yield '}'
+
+
+def stream_json_array(items):
+    """ Équivalent en flux de JsonResponse(list(items), safe=False). """
+    return StreamingHttpResponse(_buffered(_stream_array(items)), content_type='application/json')
+
+
+def stream_json_object(pairs):
+    """ Équivalent en flux de JsonResponse(dict(pairs)). """
+    return StreamingHttpResponse(_buffered(_stream_object(pairs)), content_type='application/json')
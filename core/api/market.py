@@ -1,81 +1,89 @@
 from django.http import JsonResponse
 from django.utils import timezone
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from datetime import datetime, timedelta
-from django.db.models import Prefetch, Count, Q
+from decimal import Decimal, InvalidOperation
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Min, Max
 from collections import defaultdict
-import difflib # Nécessaire pour l'optimisation
 
-from core.models import Commerce, Produit, Circulaire, Prix, Categorie, Profile, Report
+from core.models import Commerce, Produit, ProduitAlias, ProduitRedirection, Circulaire, Prix, Categorie, Profile, Report, ImportJob, ShoppingListItem
 from core.serializers import ProduitSerializer, PrixSubmissionSerializer
+from core.flyers.importer import import_flyer, import_flyer_stream
+from core.flyers.jobs import enqueue_import, job_status
+from core.active_deals import active_deals, rebuild_active_deals
+from core.market_cache import versioned_response, bump_market_version
+from core.api.authentication import CachedTokenAuthentication
+from core.api.listing import ListParams, SANS_CATEGORIE, bad_request, stream_json_object
+from core.catalog import catalog, normalize_item_name, resolve_matcher
+from core.basket import check_items, solve_basket
+from core.pricing import unit_price_fields
+from core.recommendations import TOP_DEALS, drop_inactive_deals, schedule_recommendations
+from core import search
+from core.autocomplete import autocomplete, DEFAULT_LIMIT as AUTOCOMPLETE_LIMIT
+from core.barcodes import MAX_CODES, lookup_barcodes
 
 # --- IMPORTATION DE CIRCULAIRE ---
 @api_view(['POST'])
 def importer_circulaire(request):
     try:
-        data = request.data
-        
-        nom_commerce = data.get("store")
-        if not nom_commerce:
-            raise ValueError("Le nom du magasin ('store') est manquant dans le JSON.")
-
-        commerce_obj, created = Commerce.objects.get_or_create(
-            nom=nom_commerce,
-            defaults={ "adresse": data.get("address", ""), "site_web": data.get("website", "") },
+        resultat = import_flyer(request.data)
+        if resultat['statut'] == 'identique':
+            return Response(
+                {
+                    "status": "succès",
+                    "message": f"Circulaire identique déjà importée pour {resultat['commerce']} : aucun changement.",
+                    "articles_importes": 0,
+                    "statut": resultat['statut'],
+                    "durees_ms": resultat['durees_ms'],
+                },
+                status=status.HTTP_200_OK,
+            )
+        schedule_recommendations()
+        return Response(
+            {
+                "status": "succès",
+                "message": f"{resultat['articles_importes']} articles importés pour {resultat['commerce']}.",
+                "articles_importes": resultat['articles_importes'],
+                "statut": resultat['statut'],
+                "prix": resultat['prix'],
+                "durees_ms": resultat['durees_ms'],
+            },
+            status=status.HTTP_201_CREATED,
         )
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return Response({"status": "erreur", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not created:
-            commerce_obj.adresse = data.get("address", commerce_obj.adresse)
-            commerce_obj.site_web = data.get("website", commerce_obj.site_web)
-            commerce_obj.save()
-
-        date_debut_str = data.get("date_debut")
-        date_fin_str = data.get("date_fin")
-        
-        if not date_debut_str or not date_fin_str:
-            raise ValueError("Les clés 'date_debut' et 'date_fin' sont manquantes.")
-
-        circulaire_obj = Circulaire.objects.create(
-            commerce=commerce_obj,
-            date_debut=datetime.strptime(date_debut_str, "%Y-%m-%d").date(),
-            date_fin=datetime.strptime(date_fin_str, "%Y-%m-%d").date(),
-        )
-        items_ajoutes = 0
-        for categorie in data.get("categories", []):
-            categorie_nom = categorie.get("category_name", "Divers") or "Divers"
-            categorie_obj, _ = Categorie.objects.get_or_create(nom=categorie_nom)
-
-            for item in categorie.get("items", []):
-                produit_obj, created_produit = Produit.objects.get_or_create(
-                    nom=item["name"],
-                    defaults={
-                        "marque": item.get("brand", ""),
-                        "categorie": categorie_obj,
-                    },
-                )
-                if not created_produit and produit_obj.categorie != categorie_obj:
-                    produit_obj.categorie = categorie_obj
-                    produit_obj.save()
-                
-                prix_value = item.get("single_price")
-                if prix_value is None or prix_value == '':
-                    prix_value = 0.00
-                Prix.objects.create(
-                    produit=produit_obj,
-                    commerce=commerce_obj,
-                    circulaire=circulaire_obj,
-                    prix=float(prix_value),
-                    details_prix=item.get("price", ""),
-                )
-                items_ajoutes += 1
-        
+@api_view(['POST'])
+def importer_circulaire_flux(request):
+    """
+    Variante de importer_circulaire pour les très gros documents : le corps
+    de la requête est lu en flux (sans passer par request.data) et les
+    articles sont validés par lots.
+    """
+    if request.stream is None:
+        return Response({"status": "erreur", "message": "Le corps de la requête est vide."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        resumes = import_flyer_stream(request.stream)
+        if any(resume['statut'] != 'identique' for resume in resumes):
+            schedule_recommendations()
+        total = sum(resume['articles_importes'] for resume in resumes)
         return Response(
-            { "status": "succès", "message": f"{items_ajoutes} articles importés pour {commerce_obj.nom}." },
+            {
+                "status": "succès",
+                "message": f"{total} articles importés pour {len(resumes)} circulaire(s).",
+                "articles_importes": total,
+                "circulaires": resumes,
+            },
             status=status.HTTP_201_CREATED,
         )
     except Exception as e:
@@ -83,107 +91,155 @@ def importer_circulaire(request):
         traceback.print_exc()
         return Response({"status": "erreur", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+def creer_import_job(request):
+    """
+    Met une importation de circulaire en file d'attente et retourne
+    immédiatement son identifiant. Le traitement est fait par run_import_worker.
+    """
+    if request.stream is None:
+        return Response({"status": "erreur", "message": "Le corps de la requête est vide."}, status=status.HTTP_400_BAD_REQUEST)
+    job = enqueue_import(request.stream, user=request.user)
+    return Response(
+        {"job_id": job.id, "status": job.status, "status_url": reverse('api_import_job_status', args=[job.id])},
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+@api_view(['GET'])
+def get_import_job(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id)
+    if not request.user.is_staff and job.submitted_by_id != request.user.id:
+        return Response({'error': 'Importation introuvable.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job_status(job))
+
 # --- AFFICHAGE (GET) ---
 
+# Clés disponibles pour le paramètre ?fields= des listes de prix.
+DEAL_FIELDS = (
+    'price_id', 'produit_nom', 'commerce_nom', 'categorie_nom', 'details_prix', 'prix',
+    'prix_unitaire', 'quantite_lot', 'unite_mesure', 'submitted_by_username',
+)
+# Colonnes permises pour le paramètre ?tri= des rabais actifs, et la colonne qui
+# les regroupe (les prix unitaires ne se comparent qu'à unité égale).
+DEAL_SORT_FIELDS = {'prix_unitaire': 'unite_mesure'}
+COMMUNITY_FIELDS = ('price_id', 'produit_nom', 'commerce_nom', 'details_prix', 'prix', 'submitted_by_username')
+
+CIRCULAIRE_COLUMNS = ('circulaire_id', 'commerce_nom', 'categorie_nom', 'produit_nom', 'marque', 'details_prix', 'prix')
+
+def _circulaire_item(produit_nom, marque, details_prix, prix):
+    return {
+        "name": produit_nom,
+        "brand": marque,
+        "price": details_prix,
+        "single_price": str(prix),
+    }
+
+def _group_categories(items_par_categorie):
+    return {
+        "categories": [
+            { "category_name": nom, "items": items }
+            for nom, items in items_par_categorie.items()
+        ]
+    }
+
+def _iter_circulaires(deals):
+    """
+    Variante en flux : une circulaire à la fois (la dernière de chaque
+    commerce), dans l'ordre où les commerces apparaissent.
+    """
+    bornes = deals.values('commerce_nom').annotate(
+        premiere=Min('circulaire_id'), derniere=Max('circulaire_id'),
+    ).order_by('premiere')
+    for borne in bornes:
+        items_par_categorie = defaultdict(list)
+        rows = deals.filter(circulaire_id=borne['derniere']).order_by('price_entry_id').values_list(*CIRCULAIRE_COLUMNS)
+        for _, _, categorie_nom, produit_nom, marque, details_prix, prix in rows.iterator():
+            items_par_categorie[categorie_nom or "Divers"].append(_circulaire_item(produit_nom, marque, details_prix, prix))
+        yield borne['commerce_nom'], _group_categories(items_par_categorie)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned_response('circulaires_actives', precompress=True)
 def get_circulaires_actives(request):
-    today = timezone.now().date()
-    circulaires_actives = Circulaire.objects.filter(
-        date_debut__lte=today,
-        date_fin__gte=today
-    ).prefetch_related(
-        Prefetch('prix', queryset=Prix.objects.select_related('produit', 'produit__categorie'))
-    ).select_related('commerce')
-    
+    if request.GET.get('stream') == '1':
+        return stream_json_object(_iter_circulaires(active_deals()))
+
+    deals = active_deals().order_by('circulaire_id', 'price_entry_id').values_list(*CIRCULAIRE_COLUMNS)
+
     data = {}
-    for circulaire in circulaires_actives:
-        commerce_nom = circulaire.commerce.nom
-        items_par_categorie = defaultdict(list)
-        for prix_obj in circulaire.prix.all():
-            categorie_nom = prix_obj.produit.categorie.nom if prix_obj.produit.categorie else "Divers"
-            items_par_categorie[categorie_nom].append({
-                "name": prix_obj.produit.nom,
-                "brand": prix_obj.produit.marque,
-                "price": prix_obj.details_prix,
-                "single_price": str(prix_obj.prix),
-            })
-        data[commerce_nom] = {
-            "categories": [
-                { "category_name": nom, "items": items }
-                for nom, items in items_par_categorie.items()
-            ]
-        }
+    circulaire_courante = None
+    items_par_categorie = None
+    for circulaire_id, commerce_nom, categorie_nom, produit_nom, marque, details_prix, prix in deals:
+        if circulaire_id != circulaire_courante:
+            circulaire_courante = circulaire_id
+            items_par_categorie = defaultdict(list)
+            # Comme avant : si un commerce a plusieurs circulaires actives, la dernière l'emporte.
+            data[commerce_nom] = items_par_categorie
+        items_par_categorie[categorie_nom or "Divers"].append(_circulaire_item(produit_nom, marque, details_prix, prix))
+
+    for commerce_nom, items_par_categorie in data.items():
+        data[commerce_nom] = _group_categories(items_par_categorie)
     return JsonResponse(data)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned_response('commerces')
 def get_commerces(request):
     commerces = Commerce.objects.all().values('id', 'nom', 'adresse', 'site_web')
     return JsonResponse(list(commerces), safe=False)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned_response('rabais_actifs', precompress=True)
 def get_rabais_actifs(request):
-    today = timezone.now().date()
-    
-    # --- DEBUG LOGS (Regarde le terminal) ---
-    print(f"--- DEBUG RABAIS ACTIFS ---")
-    print(f"1. Date utilisée par le serveur : {today}")
-    
-    # Compte total des prix liés à une circulaire (peu importe la date)
-    total_circulaire = Prix.objects.filter(circulaire__isnull=False).count()
-    print(f"2. Total prix de type 'Circulaire' en DB : {total_circulaire}")
-
-    # On regarde s'il y a des circulaires qui couvrent "aujourd'hui"
-    circulaires_valides = Circulaire.objects.filter(date_debut__lte=today, date_fin__gte=today)
-    print(f"3. Nombre de circulaires valides pour cette date : {circulaires_valides.count()}")
-    for c in circulaires_valides:
-        print(f"   - Circulaire trouvée : {c.commerce.nom} ({c.date_debut} au {c.date_fin})")
-
-    # La requête finale
-    prix_en_rabais = Prix.objects.select_related("produit", "commerce", "submitted_by", "produit__categorie").filter(
-        circulaire__isnull=False,
-        circulaire__date_debut__lte=today,
-        circulaire__date_fin__gte=today,
+    try:
+        params = ListParams(request, DEAL_FIELDS, DEAL_SORT_FIELDS)
+    except ValueError as e:
+        return bad_request(str(e))
+    deals = params.filter(active_deals(), 'commerce_id', 'commerce_nom', 'categorie_nom', 'unite_mesure')
+    deals = params.page(deals, 'price_entry_id').values_list(
+        'price_entry_id', 'produit_nom', 'commerce_nom', 'categorie_nom', 'details_prix', 'prix',
+        'prix_unitaire', 'quantite_lot', 'unite_mesure', 'submitted_by_username',
     )
-    
-    count_result = prix_en_rabais.count()
-    print(f"4. Résultat final renvoyé au JS : {count_result} articles")
-    # ---------------------------------------
-
-    data = []
-    for prix_obj in prix_en_rabais:
-        details = f"🔥 {prix_obj.details_prix or str(prix_obj.prix) + ' $'}"
-        submitter_username = prix_obj.submitted_by.username if prix_obj.submitted_by else None
+    if params.stream and not params.paginated:
+        return params.stream_response(_iter_rabais(deals.iterator()))
+    return params.response(list(_iter_rabais(deals)))
+
+def _iter_rabais(rows):
+    for (price_id, produit_nom, commerce_nom, categorie_nom, details_prix, prix,
+         prix_unitaire, quantite_lot, unite_mesure, submitter_username) in rows:
+        details = f"🔥 {details_prix or str(prix) + ' $'}"
         if submitter_username:
             details += f" (Ajouté par 👤 {submitter_username})"
 
-        categorie_nom = "Non classé"
-        if prix_obj.produit.categorie:
-            categorie_nom = prix_obj.produit.categorie.nom
-
-        data.append({
-            "price_id": prix_obj.id,
-            "produit_nom": prix_obj.produit.nom,
-            "commerce_nom": prix_obj.commerce.nom,
-            "categorie_nom": categorie_nom,
+        yield {
+            "price_id": price_id,
+            "produit_nom": produit_nom,
+            "commerce_nom": commerce_nom,
+            "categorie_nom": categorie_nom or SANS_CATEGORIE,
             "details_prix": details,
-            "prix": str(prix_obj.prix),
+            "prix": str(prix),
+            "prix_unitaire": str(prix_unitaire) if prix_unitaire is not None else None,
+            "quantite_lot": quantite_lot,
+            "unite_mesure": unite_mesure,
             "submitted_by_username": submitter_username
-        })
-    return JsonResponse(data, safe=False)
+        }
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned_response('community_prices')
 def get_community_prices(request):
+    try:
+        params = ListParams(request, COMMUNITY_FIELDS)
+    except ValueError as e:
+        return bad_request(str(e))
     one_week_ago = timezone.now() - timedelta(days=7)
     prix_communautaires = Prix.objects.filter(
         circulaire__isnull=True,
         date_mise_a_jour__gte=one_week_ago
-    ).annotate(
-        confirmations_count=Count('confirmations')
-    ).select_related("produit", "commerce", "submitted_by")
+    )
+    prix_communautaires = params.filter(prix_communautaires, 'commerce_id', 'commerce__nom', 'produit__categorie__nom')
+    prix_communautaires = params.page(prix_communautaires, 'id').select_related("produit", "commerce", "submitted_by")
 
     data = []
     for prix_obj in prix_communautaires:
@@ -199,20 +255,69 @@ def get_community_prices(request):
             "prix": str(prix_obj.prix),
             "submitted_by_username": submitter_username
         })
-    return Response(data)
+    return Response(params.payload(data))
 
 # --- CONTRIBUTION COMMUNAUTAIRE ---
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_products(request):
+    """
+    Produits dont le nom ou la marque contient chaque mot de 'q', classés par
+    pertinence (voir core/search.py). 'limit' : nombre de résultats (défaut
+    20, au plus 50).
+    """
     query = request.query_params.get('q', None)
     if query:
-        produits = Produit.objects.filter(nom__icontains=query) | Produit.objects.filter(marque__icontains=query)
+        try:
+            limit = int(request.query_params.get('limit', search.DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'error': "Paramètre 'limit' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+        produits = search.search_products(query, limit)
         serializer = ProduitSerializer(produits, many=True)
         return Response(serializer.data)
     return Response([], status=status.HTTP_200_OK)
 
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def autocomplete_products(request):
+    """
+    Suggestions de produits pendant la saisie : noms (ou marques) commençant
+    par 'q', servis par l'index en mémoire du processus (voir
+    core/autocomplete.py). 'limit' : défaut 10, au plus 20. Authentification
+    requise, comme pour la recherche ; avec un jeton déjà vu, aucune requête
+    SQL (core/api/authentication.py).
+    """
+    try:
+        limit = int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return Response({'error': "Paramètre 'limit' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(autocomplete.complete(request.query_params.get('q', ''), limit))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def lookup_barcode(request, code):
+    """ Produit portant ce code-barres et son meilleur prix actif dans chaque commerce. """
+    resultat = lookup_barcodes([code])[code]
+    if resultat is None:
+        return Response({'error': "Aucun produit pour ce code-barres."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(resultat)
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def lookup_barcodes_batch(request):
+    """
+    Même recherche pour plusieurs codes : {"codes": [...]} (au plus 100).
+    Retourne {"results": {code: résultat ou null}}.
+    """
+    codes = request.data.get('codes')
+    if not isinstance(codes, list) or not codes:
+        return Response({'error': "Le champ 'codes' doit être une liste non vide."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(codes) > MAX_CODES:
+        return Response({'error': f"Au plus {MAX_CODES} codes par requête."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': lookup_barcodes([str(code) for code in codes])})
+
 class ProductView(APIView):
     permission_classes = [IsAuthenticated]
     def post(self, request):
@@ -232,6 +337,7 @@ class PriceSubmissionView(APIView):
         serializer = PrixSubmissionSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
+            bump_market_version()
             return Response({'message': 'Prix soumis avec succès !'}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -246,11 +352,17 @@ def submit_deal(request):
     try:
         product_name = data['product_name'].strip()
         brand = data.get('brand', '').strip()
-        produit_obj, _ = Produit.objects.get_or_create(
-            nom__iexact=product_name, 
-            marque__iexact=brand,
-            defaults={'nom': product_name, 'marque': brand}
-        )
+        redirection = ProduitRedirection.objects.filter(
+            ancien_nom__iexact=product_name, ancien_marque__iexact=brand
+        ).select_related('produit').first()
+        if redirection is not None:
+            produit_obj = redirection.produit
+        else:
+            produit_obj, _ = Produit.objects.get_or_create(
+                nom__iexact=product_name,
+                marque__iexact=brand,
+                defaults={'nom': product_name, 'marque': brand}
+            )
         commerce_obj = get_object_or_404(Commerce, id=data['commerce_id'])
         date_debut = datetime.strptime(data['date_debut'], '%Y-%m-%d').date()
         date_fin = datetime.strptime(data['date_fin'], '%Y-%m-%d').date()
@@ -260,8 +372,11 @@ def submit_deal(request):
         )
         Prix.objects.create(
             produit=produit_obj, commerce=commerce_obj, circulaire=circulaire_obj,
-            prix=data['single_price'], details_prix=data['price_details'], submitted_by=request.user
+            prix=data['single_price'], details_prix=data['price_details'], submitted_by=request.user,
+            **unit_price_fields(data['price_details'], data['single_price'])
         )
+        rebuild_active_deals(circulaire_ids=[circulaire_obj.id])
+        bump_market_version()
         return Response({'message': 'Rabais soumis avec succès !'}, status=status.HTTP_201_CREATED)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -269,19 +384,33 @@ def submit_deal(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def confirm_price(request, price_id):
-    price_entry = get_object_or_404(Prix, id=price_id)
+    """
+    Confirme un prix soumis par un autre utilisateur. Dans une même
+    transaction : la confirmation (seule la contrainte d'unicité de la table
+    signale une confirmation en double), le compteur du prix et les 5 points
+    de réputation de l'auteur, incrémentés en SQL (F()) pour qu'aucune
+    confirmation concurrente ne soit perdue.
+    """
+    price_entry = get_object_or_404(Prix.objects.only('id', 'submitted_by_id'), id=price_id)
     user = request.user
-    if price_entry.submitted_by == user:
+    if price_entry.submitted_by_id == user.id:
         return Response({'error': 'Vous ne pouvez pas confirmer votre propre prix.'}, status=status.HTTP_403_FORBIDDEN)
-    if price_entry.confirmations.filter(id=user.id).exists():
-        return Response({'message': 'Déjà confirmé.'}, status=status.HTTP_200_OK)
-
-    price_entry.confirmations.add(user)
-    if price_entry.submitted_by:
-        submitter_profile, _ = Profile.objects.get_or_create(user=price_entry.submitted_by)
-        submitter_profile.reputation += 5
-        submitter_profile.save()
-    
+
+    if price_entry.submitted_by_id:
+        # get_or_create absorbe lui-même la course à la création du profil.
+        Profile.objects.get_or_create(user_id=price_entry.submitted_by_id)
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Prix.confirmations.through.objects.create(prix_id=price_entry.id, user_id=user.id)
+        except IntegrityError:
+            return Response({'message': 'Déjà confirmé.'}, status=status.HTTP_200_OK)
+        Prix.objects.filter(id=price_entry.id).update(confirmations_count=F('confirmations_count') + 1)
+        if price_entry.submitted_by_id:
+            Profile.objects.filter(user_id=price_entry.submitted_by_id).update(reputation=F('reputation') + 5)
+    bump_market_version()
+
     return Response({'status': 'succès', 'message': 'Prix confirmé !'}, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
@@ -305,96 +434,165 @@ def report_price(request, price_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def optimize_shopping_list(request):
+    """
+    Associe chaque article de la liste aux rabais actifs des magasins choisis.
+    Le paramètre optionnel 'matcher' choisit le match flou ('difflib' par
+    défaut, ou 'tfidf') ; l'en-tête X-Matcher indique celui utilisé.
+    Les en-têtes X-Cache-Hits / X-Cache-Misses indiquent combien d'articles
+    ont été servis par le cache de résultats.
+    """
     shopping_list = request.data.get('items', [])
     selected_stores = request.data.get('stores', [])
-    
-    # --- DEBUG PRINTS (Regarde ton terminal après avoir cliqué) ---
-    print(f"--- DÉBUT OPTIMISATION ---")
-    print(f"1. Magasins demandés par le client : {selected_stores}")
-    print(f"2. Articles à chercher : {len(shopping_list)}")
-
-    if not shopping_list:
-        return Response([])
 
-    today = timezone.now().date()
-    one_week_ago = timezone.now() - timedelta(days=7)
-
-    # CORRECTION : On filtre moins strictement sur les magasins
-    # Au lieu de chercher le nom EXACT, on cherche si le nom contient la chaîne
-    # Exemple : "IGA" trouvera "IGA Extra"
-    # On construit une requête Q complexe pour ça
-    store_filter = Q()
-    for store_name in selected_stores:
-        store_filter |= Q(commerce__nom__icontains=store_name)
-
-    base_query = Prix.objects.filter(store_filter).select_related('produit', 'commerce', 'submitted_by')
-    
-    # DEBUG : Vérifier combien de prix on trouve avant date
-    count_total = base_query.count()
-    print(f"3. Prix trouvés pour ces magasins (Total historique) : {count_total}")
-
-    condition_flyer = Q(circulaire__isnull=False, circulaire__date_debut__lte=today, circulaire__date_fin__gte=today)
-    condition_community = Q(circulaire__isnull=True, date_mise_a_jour__gte=one_week_ago)
-    
-    available_prices = base_query.filter(condition_flyer | condition_community)
-
-    # DEBUG : Vérifier combien de prix actifs
-    print(f"4. Prix ACTIFS trouvés (après filtre date) : {available_prices.count()}")
-
-    prices_db = []
-    for p in available_prices:
-        prices_db.append({
-            'obj': p,
-            'norm_name': p.produit.nom.lower(),
-            'type': 'rabais' if p.circulaire else 'communautaire'
-        })
+    try:
+        matcher = resolve_matcher(request.data.get('matcher'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    optimized_results = []
+    if not shopping_list:
+        return Response([], headers={'X-Matcher': matcher})
 
+    items = []
     for item in shopping_list:
         item_name = item.get('name', '').strip()
-        if not item_name: continue
-            
-        item_norm = item_name.lower()
-        found_deals = []
-
-        # 1. Match exact
-        for entry in prices_db:
-            if item_norm in entry['norm_name']: # "Lait" est dans "Lait 2%"
-                found_deals.append(format_deal_response(entry['obj'], entry['type']))
-
-        # 2. Match flou
-        if len(found_deals) < 3:
-            all_names = [p['norm_name'] for p in prices_db]
-            matches = difflib.get_close_matches(item_norm, all_names, n=5, cutoff=0.5) # Seuil baissé à 0.5
-            for match_name in matches:
-                for entry in prices_db:
-                    if entry['norm_name'] == match_name:
-                        deal_data = format_deal_response(entry['obj'], entry['type'])
-                        # Éviter doublons (basé sur ID prix)
-                        if not any(d['price_id'] == deal_data['price_id'] for d in found_deals):
-                            found_deals.append(deal_data)
+        if item_name:
+            items.append((item_name, item.get('quantity', '1')))
+
+    # Les prix actifs viennent du catalogue chaud du processus. On filtre
+    # moins strictement sur les magasins : "IGA" trouvera "IGA Extra".
+    item_norms = [normalize_item_name(item_name) for item_name, _ in items]
+    all_deals, hits = catalog.find_deals(selected_stores, item_norms, timezone.now(), matcher)
 
+    optimized_results = []
+    for (item_name, quantity), deals in zip(items, all_deals):
         optimized_results.append({
             "name": item_name,
-            "quantity": item.get('quantity', '1'),
-            "deals": found_deals,
+            "quantity": quantity,
+            "deals": deals,
             "selectedDeal": None,
             "selectedPrice": ""
         })
 
-    print(f"--- FIN OPTIMISATION ---")
-    return Response(optimized_results)
+    return Response(optimized_results, headers={
+        'X-Matcher': matcher,
+        'X-Cache-Hits': str(hits),
+        'X-Cache-Misses': str(len(items) - hits),
+    })
 
-def format_deal_response(price_obj, deal_type):
-    details = price_obj.details_prix or f"{price_obj.prix} $"
-    details = f"🔥 {details}" if deal_type == 'rabais' else f"👥 {details}"
-    return {
-        "type": deal_type,
-        "price_id": price_obj.id,
-        "store": price_obj.commerce.nom,
-        "name": price_obj.produit.nom,
-        "price": str(price_obj.prix),
-        "details": details,
-        "submitted_by_username": price_obj.submitted_by.username if price_obj.submitted_by else None
-    }
\ No newline at end of file
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_recommendations(request):
+    """
+    Liste d'épicerie de l'utilisateur avec ses rabais précalculés (table
+    Recommendation), dans le format de optimize_shopping_list. Un article
+    ajouté ou renommé depuis le dernier calcul est associé sur le moment.
+    Les rabais précalculés dont le prix n'est plus actif sont retirés. Le
+    paramètre 'stores' (répétable) restreint les rabais aux magasins choisis,
+    résolus comme par l'optimiseur : tous les articles sont alors associés sur
+    le moment. Les en-têtes X-Precomputed-Hits / X-Precomputed-Misses
+    indiquent combien d'articles étaient précalculés.
+    """
+    items = list(ShoppingListItem.objects.filter(user=request.user).select_related('recommendation'))
+    selected_stores = request.query_params.getlist('stores')
+    now = timezone.now()
+
+    termes = [normalize_item_name(item.name) for item in items]
+    deals_by_item = {}
+    missing = []
+    for item, terme in zip(items, termes):
+        recommendation = getattr(item, 'recommendation', None)
+        # Les TOP_DEALS précalculés le sont tous commerces confondus : avec 'stores',
+        # les filtrer après coup en perdrait ; l'article est alors associé sur le moment.
+        if not selected_stores and recommendation is not None and recommendation.terme == terme:
+            deals_by_item[item.id] = recommendation.deals
+        elif terme:
+            missing.append((item.id, terme))
+    precalcules = list(deals_by_item)
+    for item_id, deals in zip(precalcules, drop_inactive_deals([deals_by_item[item_id] for item_id in precalcules], now)):
+        deals_by_item[item_id] = deals
+    if missing:
+        computed, _ = catalog.find_deals(selected_stores, [terme for _, terme in missing], now)
+        for (item_id, _), deals in zip(missing, computed):
+            deals_by_item[item_id] = deals[:TOP_DEALS]
+
+    results = []
+    for item in items:
+        results.append({
+            "name": item.name,
+            "quantity": item.quantity,
+            "deals": deals_by_item.get(item.id, []),
+            "selectedDeal": None,
+            "selectedPrice": ""
+        })
+    return Response(results, headers={
+        'X-Precomputed-Hits': str(len(items) - len(missing)),
+        'X-Precomputed-Misses': str(len(missing)),
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def record_deal_selection(request):
+    """
+    Enregistre le rabais choisi pour un article de la liste. Le prix doit être
+    l'un des rabais actifs que l'optimiseur propose pour cet article (mêmes
+    'stores' et 'matcher' optionnels que optimize_shopping_list). Un même
+    utilisateur n'est compté qu'une fois ; une association choisie par assez
+    d'utilisateurs fait passer ce produit en tête des rabais de l'article,
+    pour tous (voir core/catalog.py).
+    """
+    terme = normalize_item_name(request.data.get('item_name', ''))[:255]
+    price_id = request.data.get('price_id')
+    if isinstance(price_id, str) and price_id.strip().isascii() and price_id.strip().isdigit():
+        price_id = int(price_id)
+    if not terme or price_id is None:
+        return Response({'error': "Les champs 'item_name' et 'price_id' sont requis."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        matcher = resolve_matcher(request.data.get('matcher'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    [deals], _ = catalog.find_deals(request.data.get('stores', []), [terme], timezone.now(), matcher)
+    if not isinstance(price_id, int) or isinstance(price_id, bool) or price_id not in {deal['price_id'] for deal in deals}:
+        return Response({'error': "Ce prix n'est pas un rabais actif proposé pour cet article."}, status=status.HTTP_400_BAD_REQUEST)
+    price_entry = get_object_or_404(Prix, id=price_id)
+
+    with transaction.atomic():
+        alias, _ = ProduitAlias.objects.get_or_create(terme=terme, produit_id=price_entry.produit_id)
+        nouveau = not alias.selectionne_par.filter(id=request.user.id).exists()
+        if nouveau:
+            alias.selectionne_par.add(request.user)
+            ProduitAlias.objects.filter(id=alias.id).update(selections=F('selections') + 1)
+    if nouveau:
+        catalog.learn_alias(terme)
+    return Response({'status': 'succès'}, status=status.HTTP_201_CREATED if nouveau else status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def solve_shopping_basket(request):
+    """
+    Choisit, pour les articles retournés par optimize_shopping_list, le rabais
+    de chaque article qui minimise le coût total du panier. Paramètres
+    optionnels : 'max_stores' (nombre maximal de magasins à visiter) et
+    'store_penalty' (coût ajouté par magasin supplémentaire).
+    """
+    items = request.data.get('items', [])
+    try:
+        check_items(items)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        max_stores = request.data.get('max_stores')
+        max_stores = int(max_stores) if max_stores not in (None, '') else None
+        if max_stores is not None and max_stores < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        return Response({'error': "Paramètre 'max_stores' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        store_penalty = Decimal(str(request.data.get('store_penalty') or 0))
+        if not store_penalty.is_finite() or store_penalty < 0:
+            raise ValueError
+    except (InvalidOperation, ValueError):
+        return Response({'error': "Paramètre 'store_penalty' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(solve_basket(items, max_stores, store_penalty))
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def _install_search_index(sender, using, **kwargs):
+    from core.search import install_search_index
+    install_search_index(connections[using])
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Voir core/search.py : les déclencheurs FTS5 ne survivent pas à une reconstruction de core_produit.
+        post_migrate.connect(_install_search_index, sender=self)
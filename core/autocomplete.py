@@ -0,0 +1,274 @@
+# Fichier: core/autocomplete.py
+
+"""
+Autocomplétion des noms de produits, servie entièrement depuis la mémoire.
+
+Chaque processus garde un tableau trié de clés (clé, rang, produit_id) :
+- le nom normalisé complet (rang 0), "pate penne 900g" ;
+- le nom à partir de chacun de ses mots suivants (rang 1), "penne 900g" ;
+- la marque normalisée (rang 2).
+
+Une recherche est une bissection sur le préfixe normalisé suivie d'un
+parcours d'au plus MAX_SCAN clés : aucune requête SQL sur le chemin chaud.
+
+L'index est construit en arrière-plan au démarrage du serveur
+(backend/wsgi.py, backend/asgi.py, Autocomplete.warm) ; tant qu'il ne l'est
+pas, les suggestions sont vides plutôt que d'attendre la base.
+
+Mises à jour :
+- un produit créé, renommé ou supprimé dans ce processus est appliqué
+  aussitôt (signaux post_save / post_delete), sans recopier tout le
+  tableau : ses clés vont dans un petit tableau trié 'recent', et ses
+  anciennes clés du grand tableau sont masquées. Les deux sont fusionnés
+  quand le petit dépasse COMPACT_SIZE ;
+- les créations faites par les autres processus (importations) sont
+  rattrapées toutes les CATCHUP_INTERVAL secondes en lisant les produits
+  d'identifiant supérieur au plus grand déjà indexé ;
+- l'index est reconstruit en entier toutes les REBUILD_INTERVAL secondes
+  (renommages et suppressions des autres processus).
+Rattrapage et reconstruction tournent dans un fil d'arrière-plan : la
+requête qui les déclenche répond avec l'index courant. Les modifications
+du processus reçues pendant leur lecture de la base sont réappliquées
+ensuite, pour ne pas être écrasées par des lignes lues avant elles.
+
+Les lectures ne prennent pas de verrou : les tableaux ne sont jamais
+modifiés en place. Une mise à jour (sous verrou) construit de nouveaux
+tableaux puis les substitue d'une seule affectation ; une lecture en cours
+garde les anciens.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from heapq import merge
+
+from django.db import connection
+
+from core.models import Produit
+from core.text import normalize_name
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+MAX_SCAN = 500
+CATCHUP_INTERVAL = 30  # secondes
+REBUILD_INTERVAL = 60 * 60
+BATCH_SIZE = 5000
+COMPACT_SIZE = 2000
+
+NOM, MOT, MARQUE = 0, 1, 2
+
+
+def _keys(nom_normalise, marque):
+    """ Clés d'un produit : (clé, rang). """
+    mots = nom_normalise.split()
+    keys = [(' '.join(mots[start:]), NOM if start == 0 else MOT) for start in range(len(mots))]
+    marque = normalize_name(marque)
+    if marque:
+        keys.append((marque, MARQUE))
+    return keys
+
+
+class PrefixIndex:
+    """
+    Tableaux triés de (clé, rang, produit_id) et libellés des produits :
+    'entries', construit en entier, et 'recent', les clés des produits
+    ajoutés ou modifiés depuis ; 'hidden' masque dans 'entries' les produits
+    modifiés ou supprimés depuis.
+    """
+
+    def __init__(self, rows=()):
+        self.labels = {}
+        self.keys = {}
+        self.watermark = 0
+        entries = []
+        for produit_id, nom, marque, nom_normalise in rows:
+            entries.extend(self._add(produit_id, nom, marque, nom_normalise))
+        entries.sort()
+        self._view = (entries, [], frozenset())
+
+    @property
+    def entries(self):
+        return self._view[0]
+
+    def _add(self, produit_id, nom, marque, nom_normalise):
+        keys = _keys(nom_normalise or normalize_name(nom), marque)
+        self.keys[produit_id] = keys
+        # Libellé posé avant la substitution : toute clé visible a son libellé.
+        self.labels[produit_id] = (nom, marque)
+        self.watermark = max(self.watermark, produit_id)
+        return [(key, rang, produit_id) for key, rang in keys]
+
+    def update(self, rows=(), removed=()):
+        """
+        Ajoute ou remplace les produits 'rows' (id, nom, marque, nom_normalise)
+        et retire les produits 'removed', puis substitue les nouveaux tableaux.
+        Coût proportionnel à 'recent', sauf lors d'une fusion. Les appelants
+        sérialisent les mises à jour (Autocomplete._lock).
+        """
+        entries, recent, hidden = self._view
+        changed = {row[0] for row in rows} | set(removed)
+        nouvelles = []
+        for produit_id, nom, marque, nom_normalise in rows:
+            nouvelles.extend(self._add(produit_id, nom, marque, nom_normalise))
+
+        recent = list(merge((entry for entry in recent if entry[2] not in changed), sorted(nouvelles)))
+        hidden = hidden | changed
+        if len(recent) + len(hidden) > COMPACT_SIZE:
+            entries = list(merge((entry for entry in entries if entry[2] not in hidden), recent))
+            recent, hidden = [], frozenset()
+        self._view = (entries, recent, hidden)
+
+        for produit_id in removed:
+            self.keys.pop(produit_id, None)
+            self.labels.pop(produit_id, None)
+
+    def complete(self, prefix, limit):
+        """
+        Produits dont une clé commence par 'prefix' (déjà normalisé) : noms
+        complets d'abord, puis mots du nom, puis marques ; ordre alphabétique
+        des clés dans chaque rang.
+        """
+        entries, recent, hidden = self._view
+        found = []
+        for part, masked in ((entries, hidden), (recent, ())):
+            position = bisect_left(part, (prefix,))
+            end = min(position + MAX_SCAN, len(part))
+            while position < end:
+                key, rang, produit_id = part[position]
+                if not key.startswith(prefix):
+                    break
+                if produit_id not in masked:
+                    found.append((rang, key, produit_id))
+                position += 1
+        found.sort()
+
+        results = []
+        seen = set()
+        for _, _, produit_id in found:
+            label = self.labels.get(produit_id)
+            if label is None or produit_id in seen:
+                continue
+            seen.add(produit_id)
+            results.append({"id": produit_id, "nom": label[0], "marque": label[1]})
+            if len(results) >= limit:
+                break
+        return results
+
+
+def _rows(min_id=0):
+    produits = Produit.objects.filter(id__gt=min_id).order_by('id').values_list('id', 'nom', 'marque', 'nom_normalise')
+    return produits.iterator(chunk_size=BATCH_SIZE)
+
+
+class Autocomplete:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.clear()
+
+    def clear(self):
+        self._index = None
+        self._built_at = self._caught_up_at = 0.0
+        # Modifications reçues pendant qu'une construction ou un rattrapage lit la base.
+        self._changes = None
+
+    def _record_changes(self):
+        with self._lock:
+            self._changes = []
+
+    def _replay_changes(self, index):
+        """ Sous verrou : réapplique à 'index' les modifications reçues pendant la lecture. """
+        for rows, removed in self._changes or ():
+            index.update(rows, removed)
+        self._changes = None
+
+    def build(self):
+        """ Construit l'index en entier et le substitue à l'index courant. """
+        self._record_changes()
+        try:
+            index = PrefixIndex(_rows())
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+        with self._lock:
+            self._replay_changes(index)
+            self._index = index
+            self._built_at = self._caught_up_at = time.monotonic()
+
+    def catch_up(self):
+        """ Ajoute les produits créés ailleurs depuis le dernier plus grand identifiant indexé. """
+        index = self._index
+        if index is None:
+            return
+        self._record_changes()
+        try:
+            rows = list(_rows(index.watermark))
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+        with self._lock:
+            if rows:
+                index.update(rows)
+            self._replay_changes(index)
+            self._caught_up_at = time.monotonic()
+
+    def _refresh(self, rebuild):
+        try:
+            self.build() if rebuild else self.catch_up()
+        finally:
+            self._refreshing = False
+            connection.close()
+
+    def _start_refresh(self, rebuild):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, args=(rebuild,), daemon=True).start()
+
+    def warm(self):
+        """ Lance la construction de l'index en arrière-plan (démarrage du serveur). """
+        self._start_refresh(rebuild=True)
+
+    def _current(self):
+        if self._index is None:
+            # Serveur non préchauffé : la construction démarre, sans la faire attendre à la requête.
+            self.warm()
+            return None
+
+        now = time.monotonic()
+        rebuild = now - self._built_at >= REBUILD_INTERVAL
+        if rebuild or now - self._caught_up_at >= CATCHUP_INTERVAL:
+            self._start_refresh(rebuild)
+        return self._index
+
+    def complete(self, query, limit=DEFAULT_LIMIT):
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        # Un espace final tapé par l'utilisateur termine le mot.
+        if query[-1:].isspace():
+            prefix += ' '
+        index = self._current()
+        if index is None:
+            return []
+        return index.complete(prefix, max(1, min(limit, MAX_LIMIT)))
+
+    def _apply(self, rows=(), removed=()):
+        with self._lock:
+            if self._index is not None:
+                self._index.update(rows, removed)
+            if self._changes is not None:
+                self._changes.append((rows, removed))
+
+    def product_saved(self, produit):
+        self._apply(rows=[(produit.id, produit.nom, produit.marque, produit.nom_normalise)])
+
+    def product_deleted(self, produit_id):
+        self._apply(removed=[produit_id])
+
+
+autocomplete = Autocomplete()
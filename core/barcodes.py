@@ -0,0 +1,156 @@
+# Fichier: core/barcodes.py
+
+"""
+Recherche de produits par code-barres, avec leurs meilleurs prix actifs.
+
+Le résultat de chaque code (produit et prix le plus bas de chaque commerce
+parmi les rabais de circulaires en cours et les prix communautaires des 7
+derniers jours) est mis en cache sous la version des données de marché et
+l'heure courante, comme les réponses de core/market_cache.py : une écriture
+de prix invalide tout. Un code inconnu est aussi mis en cache.
+
+Un code-barres ajouté, modifié ou retiré d'un produit (admin) est oublié du
+cache de la version courante (forget_barcodes, signaux de core/models.py),
+sans invalider le reste des données de marché.
+
+Deux produits peuvent porter les deux écritures d'un même code (UPC-A et
+EAN-13 avec le 0 initial) : le code tel que demandé l'emporte, et la
+collision est journalisée pour être corrigée (dedupe_produits).
+
+Un lot de codes ne coûte qu'un aller-retour au cache ; les codes absents du
+cache sont résolus ensemble, en deux requêtes (l'index unique de
+Produit.code_barres, puis les prix actifs des produits trouvés).
+"""
+
+import logging
+import re
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from core.market_cache import CACHE_TIMEOUT, get_market_version
+from core.models import Prix, Produit
+
+MAX_CODES = 100
+COMMUNITY_WINDOW = timedelta(days=7)
+# Valeur en cache d'un code inconnu (None signifie « absent du cache »).
+_INCONNU = 'inconnu'
+
+_SEPARATEURS_RE = re.compile(r'[\s-]+')
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_barcode(code):
+    """ Retire espaces et tirets ; '' si le code n'est pas une suite de chiffres. """
+    code = _SEPARATEURS_RE.sub('', str(code or ''))
+    return code if code.isdigit() else ''
+
+
+def _variants(code):
+    """ Un UPC-A (12 chiffres) est aussi lu comme EAN-13 précédé d'un 0, et inversement. """
+    if len(code) == 12:
+        return [code, '0' + code]
+    if len(code) == 13 and code.startswith('0'):
+        return [code, code[1:]]
+    return [code]
+
+
+def _active_prices(produit_ids, today):
+    return Prix.objects.filter(produit_id__in=produit_ids).filter(
+        Q(circulaire__isnull=False, circulaire__date_debut__lte=today, circulaire__date_fin__gte=today)
+        | Q(circulaire__isnull=True, date_mise_a_jour__gte=timezone.now() - COMMUNITY_WINDOW)
+    ).values_list(
+        'id', 'produit_id', 'commerce_id', 'commerce__nom', 'circulaire_id',
+        'prix', 'details_prix', 'prix_unitaire', 'unite_mesure',
+    ).order_by('prix', 'id')
+
+
+def _resolve(codes):
+    """ {code: résultat ou _INCONNU} pour des codes normalisés. """
+    variants = {variant: code for code in codes for variant in _variants(code)}
+    produits = {}
+    for produit in Produit.objects.filter(code_barres__in=list(variants)).select_related('categorie'):
+        code = variants[produit.code_barres]
+        autre = produits.get(code)
+        if autre is not None:
+            logger.warning(
+                "Code-barres %s porté par deux produits : %s (%s) et %s (%s).",
+                code, autre.id, autre.code_barres, produit.id, produit.code_barres,
+            )
+        # Le code tel que demandé l'emporte sur sa variante UPC / EAN.
+        if autre is None or produit.code_barres == code:
+            produits[code] = produit
+
+    meilleurs = {}
+    for (price_id, produit_id, commerce_id, commerce_nom, circulaire_id,
+         prix, details_prix, prix_unitaire, unite) in _active_prices([p.id for p in produits.values()], timezone.now().date()):
+        par_commerce = meilleurs.setdefault(produit_id, {})
+        # Trié par prix : le premier prix vu pour un commerce est le plus bas.
+        if commerce_id not in par_commerce:
+            par_commerce[commerce_id] = {
+                "price_id": price_id,
+                "commerce_id": commerce_id,
+                "store": commerce_nom,
+                "type": 'rabais' if circulaire_id else 'communautaire',
+                "price": str(prix),
+                "details": details_prix,
+                "unit_price": str(prix_unitaire) if prix_unitaire is not None else None,
+                "unit": unite,
+            }
+
+    results = {}
+    for code in codes:
+        produit = produits.get(code)
+        if produit is None:
+            results[code] = _INCONNU
+            continue
+        results[code] = {
+            "code": code,
+            "produit": {
+                "id": produit.id,
+                "nom": produit.nom,
+                "marque": produit.marque,
+                "categorie": produit.categorie.nom if produit.categorie else None,
+                "code_barres": produit.code_barres,
+            },
+            "prices": list(meilleurs.get(produit.id, {}).values()),
+        }
+    return results
+
+
+def _cache_prefix():
+    return f"barcode:{get_market_version()}:{timezone.now().strftime('%Y-%m-%d-%H')}:"
+
+
+def forget_barcodes(codes):
+    """ Retire du cache les résultats des codes 'codes' et de leurs variantes UPC / EAN. """
+    normalises = {normalize_barcode(code) for code in codes} - {''}
+    if normalises:
+        prefix = _cache_prefix()
+        cache.delete_many([prefix + variant for code in normalises for variant in _variants(code)])
+
+
+def lookup_barcodes(codes):
+    """
+    Pour chaque code demandé (tel qu'envoyé), le produit et ses meilleurs prix
+    par commerce, du moins cher au plus cher ; None si le code est inconnu ou
+    invalide.
+    """
+    normalises = {code: normalize_barcode(code) for code in codes}
+    valides = sorted({code for code in normalises.values() if code})
+    prefix = _cache_prefix()
+
+    found = {key[len(prefix):]: value for key, value in cache.get_many([prefix + code for code in valides]).items()}
+    manquants = [code for code in valides if code not in found]
+    if manquants:
+        resolus = _resolve(manquants)
+        cache.set_many({prefix + code: value for code, value in resolus.items()}, CACHE_TIMEOUT)
+        found.update(resolus)
+
+    return {
+        code: (None if not normalise or found[normalise] == _INCONNU else found[normalise])
+        for code, normalise in normalises.items()
+    }
@@ -0,0 +1,235 @@
+# Fichier: core/basket.py
+
+"""
+Choix du panier le moins cher sur plusieurs magasins.
+
+Chaque article a des rabais candidats (ceux retournés par l'optimiseur) ; on
+choisit un ensemble de magasins S puis, pour chaque article, son rabais le
+moins cher dans S. Le coût à minimiser est :
+
+    somme des (prix × quantité) + store_penalty × (|S| - 1)
+
+avec |S| ≤ max_stores. Un article qu'aucun magasin de S ne couvre coûte
+MISSING_COST : on couvre d'abord le plus d'articles possible, puis on
+minimise le prix.
+
+- Si les ensembles d'au plus max_stores magasins sont au plus
+  EXACT_MAX_SUBSETS (p. ex. 10 magasins sans plafond, ou 15 magasins avec
+  max_stores=3) : énumération exacte, le coût d'un ensemble se déduisant de
+  celui de l'ensemble sans son dernier magasin.
+- Au-delà : glouton (ajout du meilleur magasin) puis recherche locale (ajout,
+  retrait, échange), relancés depuis chaque magasin de départ jusqu'à
+  épuisement du budget de temps.
+"""
+
+import math
+import re
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from core.catalog import active_prices
+
+EXACT_MAX_SUBSETS = 1024
+TIME_BUDGET = 0.05  # secondes, pour la recherche locale
+MISSING_COST = 1e6
+
+_QUANTITY_RE = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def parse_quantity(value):
+    """ '2', '1.5', '3 kg' → Decimal ; 1 si absente ou invalide. """
+    match = _QUANTITY_RE.search(str(value or ''))
+    if not match:
+        return Decimal(1)
+    try:
+        quantity = Decimal(match.group().replace(',', '.'))
+    except InvalidOperation:
+        return Decimal(1)
+    return quantity if quantity > 0 else Decimal(1)
+
+
+def _columns(costs, store_count):
+    """ columns[s][i] : coût de l'article i au magasin s (MISSING_COST s'il n'y est pas). """
+    return [[item_costs.get(store, MISSING_COST) for item_costs in costs] for store in range(store_count)]
+
+
+def _objective(costs, stores, store_penalty, columns=None):
+    if not stores:
+        return MISSING_COST * len(costs)
+    columns = columns or _columns(costs, max(stores) + 1)
+    per_item = map(min, *(columns[store] for store in stores)) if len(stores) > 1 else columns[stores[0]]
+    return sum(per_item) + store_penalty * (len(stores) - 1)
+
+
+def _subset_count(store_count, max_stores):
+    return sum(math.comb(store_count, size) for size in range(1, max_stores + 1))
+
+
+def _solve_exact(costs, store_count, max_stores, store_penalty):
+    """
+    Énumère en profondeur les ensembles d'au plus max_stores magasins ; le
+    coût par article d'un ensemble se déduit de celui de son parent.
+    """
+    columns = _columns(costs, store_count)
+    best = [None, None]  # (valeur, magasins)
+
+    def visit(stores, per_item, next_store):
+        for store in range(next_store, store_count):
+            chosen = stores + [store]
+            current = list(map(min, per_item, columns[store])) if per_item else columns[store]
+            value = sum(current) + store_penalty * (len(chosen) - 1)
+            # À égalité, le premier trouvé (donc le plus petit ensemble) est gardé.
+            if best[0] is None or value < best[0] - 1e-9:
+                best[:] = [value, chosen]
+            if len(chosen) < max_stores:
+                visit(chosen, current, store + 1)
+
+    visit([], None, 0)
+    return best[1]
+
+
+def _local_search(chosen, objective, store_count, max_stores, deadline):
+    """ Ajouts gloutons, puis première amélioration parmi retraits, ajouts et échanges. """
+    current = objective(chosen)
+    while len(chosen) < max_stores and time.monotonic() < deadline:
+        value, store = min((objective(chosen + [store]), store) for store in range(store_count) if store not in chosen)
+        if value >= current - 1e-9:
+            break
+        chosen, current = chosen + [store], value
+
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        others = [store for store in range(store_count) if store not in chosen]
+        moves = [[s for s in chosen if s != out] for out in chosen if len(chosen) > 1]
+        if len(chosen) < max_stores:
+            moves += [chosen + [new] for new in others]
+        moves += [[s for s in chosen if s != out] + [new] for out in chosen for new in others]
+        for stores in moves:
+            if time.monotonic() >= deadline:
+                break
+            value = objective(stores)
+            if value < current - 1e-9:
+                chosen, current, improved = stores, value, True
+                break
+    return chosen, current
+
+
+def _solve_heuristic(costs, store_count, max_stores, store_penalty, time_budget):
+    """
+    Recherche locale relancée depuis chaque magasin de départ (du meilleur au
+    moins bon seul) tant que le budget de temps le permet.
+    """
+    deadline = time.monotonic() + time_budget
+    columns = _columns(costs, store_count)
+    objective = lambda stores: _objective(costs, stores, store_penalty, columns)
+
+    starts = sorted(range(store_count), key=lambda store: objective([store]))
+    best, best_value = None, None
+    for start in starts:
+        chosen, value = _local_search([start], objective, store_count, max_stores, deadline)
+        if best_value is None or value < best_value - 1e-9:
+            best, best_value = chosen, value
+        if time.monotonic() >= deadline:
+            break
+    return sorted(best)
+
+
+def solve(costs, store_count, max_stores=None, store_penalty=0.0, time_budget=TIME_BUDGET):
+    """
+    'costs[i]' associe un indice de magasin au coût de l'article i dans ce
+    magasin. Retourne (indices des magasins retenus, 'exact' ou 'heuristique').
+    """
+    if not store_count:
+        return [], 'exact'
+    max_stores = min(max_stores or store_count, store_count)
+    if _subset_count(store_count, max_stores) <= EXACT_MAX_SUBSETS:
+        return _solve_exact(costs, store_count, max_stores, store_penalty), 'exact'
+    return _solve_heuristic(costs, store_count, max_stores, store_penalty, time_budget), 'heuristique'
+
+
+def check_items(items):
+    """ ValueError si 'items' n'a pas la forme attendue par solve_basket. """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("Paramètre 'items' invalide.")
+    for item in items:
+        deals = item.get('deals')
+        if deals is None:
+            continue
+        if not isinstance(deals, list) or not all(isinstance(deal, dict) for deal in deals):
+            raise ValueError("Paramètre 'items' invalide : 'deals' doit être une liste de rabais.")
+        for deal in deals:
+            price_id = deal.get('price_id')
+            if not isinstance(price_id, int) or isinstance(price_id, bool):
+                raise ValueError("Paramètre 'items' invalide : chaque rabais doit avoir un 'price_id' entier.")
+
+
+def solve_basket(items, max_stores=None, store_penalty=Decimal(0)):
+    """
+    'items' : liste de {"name", "quantity", "deals": [{"price_id": ...}, ...]}
+    telle que retournée par l'optimiseur, validée par check_items. Les prix
+    et magasins sont relus en base à partir des price_id (une seule
+    requête) ; un prix qui n'est plus actif (circulaire terminée, prix
+    communautaire de plus de 7 jours) est ignoré.
+    """
+    price_ids = {deal['price_id'] for item in items for deal in item.get('deals') or []}
+    prices = {
+        row[0]: row for row in
+        active_prices(timezone.now().date()).filter(id__in=price_ids).values_list('id', 'commerce_id', 'commerce__nom', 'prix')
+    }
+
+    store_index = {}
+    store_names = []
+    lines = []
+    costs = []
+    for item in items:
+        quantity = parse_quantity(item.get('quantity'))
+        best_by_store = {}
+        for deal in item.get('deals') or []:
+            row = prices.get(deal['price_id'])
+            if row is None:
+                continue
+            price_id, commerce_id, commerce_nom, prix = row
+            if commerce_id not in store_index:
+                store_index[commerce_id] = len(store_names)
+                store_names.append(commerce_nom)
+            store = store_index[commerce_id]
+            if store not in best_by_store or prix < best_by_store[store][1]:
+                best_by_store[store] = (price_id, prix)
+        lines.append((item.get('name', ''), quantity, best_by_store))
+        costs.append({store: float(prix * quantity) for store, (_, prix) in best_by_store.items()})
+
+    chosen, method = solve(costs, len(store_names), max_stores, float(store_penalty))
+
+    results = []
+    cout = Decimal(0)
+    for name, quantity, best_by_store in lines:
+        options = [(best_by_store[store][1], store) for store in chosen if store in best_by_store]
+        if not options:
+            results.append({"name": name, "quantity": str(quantity), "selectedDeal": None,
+                            "store": None, "price": None, "line_total": None})
+            continue
+        prix, store = min(options)
+        line_total = prix * quantity
+        cout += line_total
+        results.append({
+            "name": name,
+            "quantity": str(quantity),
+            "selectedDeal": best_by_store[store][0],
+            "store": store_names[store],
+            "price": str(prix),
+            "line_total": str(line_total),
+        })
+
+    penalite = store_penalty * max(len(chosen) - 1, 0)
+    return {
+        "items": results,
+        "stores": [store_names[store] for store in chosen],
+        "cost": str(cout),
+        "penalty": str(penalite),
+        "total": str(cout + penalite),
+        "method": method,
+        "unassigned": sum(1 for line in results if line["selectedDeal"] is None),
+    }
@@ -0,0 +1,359 @@
+# Fichier: core/catalog.py
+
+"""
+Catalogue chaud des prix actifs pour l'optimiseur de liste d'épicerie.
+
+Chaque processus garde en mémoire, par commerce, les prix actifs (rabais de
+circulaires en cours et prix communautaires des 7 derniers jours) déjà
+formatés pour la réponse, avec un TrigramIndex de leurs noms normalisés
+(Produit.nom_normalise). Les fragments sont construits paresseusement, au
+premier besoin de chaque commerce, par une requête sur commerce_id. Les noms de magasins envoyés par le client sont
+résolus en mémoire (alias CommerceAlias, puis sous-chaîne du nom).
+
+Le résultat de chaque article (par algorithme, ensemble de commerces et nom
+normalisé) est aussi gardé : relancer l'optimisation d'une liste presque
+identique ne recalcule que les articles nouveaux.
+
+Le match TF-IDF pondère les trigrammes par l'IDF de tous les noms actifs du
+catalogue (appris au premier besoin), et non de chaque commerce : les scores
+de fragments différents restent comparables.
+
+Le catalogue et ces résultats sont jetés quand la version des données de
+marché ou la date change. La version n'est relue en base qu'au plus toutes les
+VERSION_CHECK_INTERVAL secondes : une requête « chaude » ne fait aucun aller-
+retour à la base, au prix d'un léger délai avant de voir une nouvelle écriture.
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from core.market_cache import get_market_version
+from core.matching import TFIDF_AVAILABLE, TfidfMatcher, TfidfWeights, TrigramIndex
+from core.text import normalize_name
+from core.models import Commerce, CommerceAlias, Prix, ProduitAlias
+
+VERSION_CHECK_INTERVAL = 5  # secondes
+COMMUNITY_WINDOW = timedelta(days=7)
+MATCHERS = ('difflib', 'tfidf')
+# Nombre maximal de résultats d'articles gardés par processus.
+RESULT_CACHE_SIZE = 20000
+# Nombre d'utilisateurs distincts qui doivent avoir choisi un produit pour un
+# article avant que ce choix ne remonte ses prix pour tout le monde.
+ALIAS_MIN_USERS = 3
+
+
+def normalize_item_name(name):
+    """ Nom d'article tel qu'il sert de clé, normalisé comme Produit.nom_normalise. """
+    return normalize_name(name)
+
+
+def format_deal(price_id, deal_type, store, name, prix, details_prix, submitted_by_username, prix_unitaire=None, unite_mesure='unite'):
+    details = details_prix or f"{prix} $"
+    details = f"🔥 {details}" if deal_type == 'rabais' else f"👥 {details}"
+    return {
+        "type": deal_type,
+        "price_id": price_id,
+        "store": store,
+        "name": name,
+        "price": str(prix),
+        "unit_price": str(prix_unitaire) if prix_unitaire is not None else None,
+        "unit": unite_mesure,
+        "details": details,
+        "submitted_by_username": submitted_by_username,
+    }
+
+
+def active_prices(today):
+    """ Prix actifs le jour 'today' : rabais de circulaires en cours et prix communautaires des 7 derniers jours. """
+    return Prix.objects.filter(
+        Q(circulaire__isnull=False, circulaire__date_debut__lte=today, circulaire__date_fin__gte=today)
+        | Q(circulaire__isnull=True, date_mise_a_jour__gte=timezone.now() - COMMUNITY_WINDOW)
+    )
+
+
+class CatalogEntry:
+    """ Un prix actif. 'expires_at' est None pour un rabais (valide toute la journée). """
+    __slots__ = ('price_id', 'produit_id', 'expires_at', 'deal')
+
+    def __init__(self, price_id, produit_id, expires_at, deal):
+        self.price_id = price_id
+        self.produit_id = produit_id
+        self.expires_at = expires_at
+        self.deal = deal
+
+    def active(self, now):
+        return self.expires_at is None or self.expires_at >= now
+
+
+class CommerceShard:
+    """
+    Prix actifs d'un commerce ; entries[i] regroupe les prix du nom
+    index.names[i], by_produit les prix de chaque produit.
+    """
+    __slots__ = ('commerce_id', 'index', 'entries', 'by_produit', '_tfidf')
+
+    def __init__(self, commerce_id, today):
+        by_name = {}
+        by_produit = {}
+        rows = active_prices(today).filter(commerce_id=commerce_id).values_list(
+            'id', 'produit_id', 'circulaire_id', 'date_mise_a_jour', 'commerce__nom', 'produit__nom',
+            'produit__nom_normalise', 'prix', 'details_prix', 'submitted_by__username', 'prix_unitaire', 'unite_mesure',
+        ).order_by('id')
+        for (price_id, produit_id, circulaire_id, date_mise_a_jour, store, name, nom_normalise,
+             prix, details_prix, username, prix_unitaire, unite) in rows:
+            deal_type = 'rabais' if circulaire_id else 'communautaire'
+            expires_at = None if circulaire_id else date_mise_a_jour + COMMUNITY_WINDOW
+            deal = format_deal(price_id, deal_type, store, name, prix, details_prix, username, prix_unitaire, unite)
+            entry = CatalogEntry(price_id, produit_id, expires_at, deal)
+            # nom_normalise est vide pour un produit pas encore rattrapé par backfill_nom_normalise.
+            by_name.setdefault(nom_normalise or normalize_name(name), []).append(entry)
+            by_produit.setdefault(produit_id, []).append(entry)
+
+        self.commerce_id = commerce_id
+        self.index = TrigramIndex(by_name)
+        self.entries = [tuple(by_name[name]) for name in self.index.names]
+        self.by_produit = {produit_id: tuple(entries) for produit_id, entries in by_produit.items()}
+        self._tfidf = None
+
+    def tfidf(self, weights):
+        """ Matrice TF-IDF des noms (IDF de tout le catalogue), construite au premier match 'tfidf'. """
+        if self._tfidf is None:
+            self._tfidf = TfidfMatcher(self.index.names, weights)
+        return self._tfidf
+
+
+class _State:
+    __slots__ = ('key', 'commerces', 'aliases', 'produit_aliases', 'shards', 'results', 'tfidf_weights')
+
+    def __init__(self, key):
+        self.key = key
+        self.commerces = tuple((cid, nom.lower()) for cid, nom in Commerce.objects.values_list('id', 'nom'))
+        self.aliases = dict(CommerceAlias.objects.values_list('alias', 'commerce_id'))
+        # Nom d'article → produits choisis par au moins ALIAS_MIN_USERS utilisateurs, du plus au moins choisi.
+        self.produit_aliases = {}
+        aliases = ProduitAlias.objects.filter(selections__gte=ALIAS_MIN_USERS).order_by('terme', '-selections', 'produit_id')
+        for terme, produit_id in aliases.values_list('terme', 'produit_id'):
+            self.produit_aliases.setdefault(terme, []).append(produit_id)
+        self.shards = {}
+        # (matcher, commerces, article) → (rabais, valide jusqu'à), du plus ancien au plus récent usage.
+        self.results = OrderedDict()
+        # IDF des noms de tous les commerces, pour des scores TF-IDF comparables d'un fragment à l'autre.
+        self.tfidf_weights = None
+
+    def commerce_ids(self, store_names):
+        """
+        Identifiants des commerces désignés par 'store_names' : alias exact,
+        sinon nom de commerce contenant le texte ("IGA" trouve "IGA Extra").
+        Tous les commerces si la liste est vide.
+        """
+        wanted = [str(store).strip().lower() for store in store_names]
+        if not wanted:
+            return [cid for cid, _ in self.commerces]
+        ids = {self.aliases[store] for store in wanted if store in self.aliases}
+        restants = [store for store in wanted if store not in self.aliases]
+        if restants:
+            ids.update(cid for cid, nom in self.commerces if any(store in nom for store in restants))
+        return [cid for cid, _ in self.commerces if cid in ids]
+
+
+class WarmCatalog:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._state = None
+        self._checked_at = 0.0
+
+    def _current(self):
+        today = timezone.now().date()
+        state = self._state
+        if state is not None and state.key[1] == today and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL:
+            return state
+
+        key = (get_market_version(), today)
+        with self._lock:
+            state = self._state
+            if state is None or state.key != key:
+                state = _State(key)
+                self._state = state
+            self._checked_at = time.monotonic()
+        return state
+
+    def _shards(self, state, commerce_ids):
+        shards = []
+        for commerce_id in commerce_ids:
+            shard = state.shards.get(commerce_id)
+            if shard is None:
+                with self._lock:
+                    shard = state.shards.get(commerce_id)
+                    if shard is None:
+                        shard = state.shards[commerce_id] = CommerceShard(commerce_id, state.key[1])
+            shards.append(shard)
+        return shards
+
+    def _tfidf_weights(self, state):
+        if state.tfidf_weights is None:
+            with self._lock:
+                if state.tfidf_weights is None:
+                    noms = active_prices(state.key[1]).values_list('produit__nom_normalise', 'produit__nom').distinct()
+                    state.tfidf_weights = TfidfWeights({nom_normalise or normalize_name(nom) for nom_normalise, nom in noms})
+        return state.tfidf_weights
+
+    def shards(self, store_names):
+        """ Fragments des commerces désignés par 'store_names' (voir _State.commerce_ids). """
+        state = self._current()
+        return self._shards(state, state.commerce_ids(store_names))
+
+    def find_deals(self, store_names, item_norms, now, matcher='difflib'):
+        """
+        Rabais (déjà formatés) de chaque article dans les magasins choisis.
+        Le résultat de chaque article est gardé pour la version courante des
+        données : seuls les articles absents du cache sont recalculés.
+        Retourne (rabais par article, nombre d'articles servis par le cache).
+        """
+        state = self._current()
+        commerce_ids = tuple(state.commerce_ids(store_names))
+        keys = [(matcher, commerce_ids, item_norm) for item_norm in item_norms]
+
+        results = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = state.results.get(key)
+                # Un prix communautaire qui expire peut changer le résultat.
+                if cached is not None and (cached[1] is None or cached[1] >= now):
+                    state.results.move_to_end(key)
+                    results[i] = cached[0]
+        hits = sum(1 for deals in results if deals is not None)
+
+        missing = [i for i, deals in enumerate(results) if deals is None]
+        if missing:
+            shards = self._shards(state, commerce_ids)
+            queries = list(dict.fromkeys(item_norms[i] for i in missing))
+            weights = self._tfidf_weights(state) if matcher == 'tfidf' else None
+            computed = dict(zip(queries, match_entries(shards, queries, now, matcher, state.produit_aliases, tfidf_weights=weights)))
+            with self._lock:
+                for item_norm, entries in computed.items():
+                    expirations = [entry.expires_at for entry in entries if entry.expires_at is not None]
+                    state.results[(matcher, commerce_ids, item_norm)] = (
+                        [entry.deal for entry in entries], min(expirations, default=None),
+                    )
+                while len(state.results) > RESULT_CACHE_SIZE:
+                    state.results.popitem(last=False)
+            for i in missing:
+                results[i] = [entry.deal for entry in computed[item_norms[i]]]
+        return results, hits
+
+    def learn_alias(self, terme):
+        """
+        Relit en base les produits associés à 'terme' après un nouveau choix et
+        oublie les résultats en cache de cet article (dans ce processus ; les
+        autres le verront au prochain changement de version des données).
+        """
+        state = self._current()
+        produit_ids = list(
+            ProduitAlias.objects.filter(terme=terme, selections__gte=ALIAS_MIN_USERS)
+            .order_by('-selections', 'produit_id').values_list('produit_id', flat=True)
+        )
+        with self._lock:
+            state.produit_aliases[terme] = produit_ids
+            for key in [key for key in state.results if key[2] == terme]:
+                del state.results[key]
+
+
+catalog = WarmCatalog()
+
+
+def resolve_matcher(requested):
+    """
+    Algorithme de match flou effectivement utilisé : 'tfidf' retombe sur
+    'difflib' si NumPy/SciPy ne sont pas installés. ValueError si inconnu.
+    """
+    requested = requested or 'difflib'
+    if requested not in MATCHERS:
+        raise ValueError(f"Paramètre 'matcher' invalide (valeurs permises : {', '.join(MATCHERS)}).")
+    return requested if requested != 'tfidf' or TFIDF_AVAILABLE else 'difflib'
+
+
+def _fuzzy_scores(shards, queries, matcher, n, cutoff, tfidf_weights=None):
+    """
+    Pour chaque requête : {nom: (score, [entrées])}, sur tous les fragments.
+    En TF-IDF, 'tfidf_weights' (IDF de tout le catalogue) est commun aux
+    fragments ; sans lui, il est appris sur les noms des fragments demandés.
+    """
+    if matcher == 'tfidf' and tfidf_weights is None:
+        tfidf_weights = TfidfWeights({name for shard in shards for name in shard.index.names})
+    results = [{} for _ in queries]
+    for shard in shards:
+        if not shard.index.names:
+            continue
+        if matcher == 'tfidf':
+            scored = shard.tfidf(tfidf_weights).scored_matches(queries, n)
+        else:
+            scored = [shard.index.scored_matches(query, cutoff) for query in queries]
+        for matches, pairs in zip(results, scored):
+            for score, position in pairs:
+                # Un même nom peut exister dans plusieurs commerces : on garde son meilleur score.
+                name = shard.index.names[position]
+                best, entries = matches.get(name, (score, []))
+                matches[name] = (max(best, score), entries + list(shard.entries[position]))
+    return results
+
+
+def _aliased_entries(shards, produit_ids, now):
+    found = []
+    for produit_id in produit_ids:
+        entries = [entry for shard in shards for entry in shard.by_produit.get(produit_id, ()) if entry.active(now)]
+        found.extend(sorted(entries, key=lambda entry: entry.price_id))
+    return found
+
+
+def match_entries(shards, item_norms, now, matcher='difflib', produit_aliases=None, n=5, cutoff=0.5, tfidf_weights=None):
+    """
+    Prix actifs correspondant à chaque article : les prix dont le nom contient
+    l'article (par identifiant de prix), complétés s'il y en a moins de 3 par
+    les prix des n noms les plus proches, sans doublon. Le match flou se fait
+    par difflib, ou par TF-IDF pour toute la liste d'un coup. Les prix des
+    produits que les utilisateurs ont associés à l'article (produit_aliases)
+    passent en tête et comptent parmi les 3 : un article qui en a assez
+    ne passe ni par la recherche de sous-chaîne ni par le match flou.
+    """
+    produit_aliases = produit_aliases or {}
+    results = []
+    exact_counts = []
+    for item_norm in item_norms:
+        found = _aliased_entries(shards, produit_aliases.get(item_norm, ()), now)
+        if len(found) >= 3:
+            results.append(found)
+            exact_counts.append(len(found))
+            continue
+        seen = {entry.price_id for entry in found}
+        exact = []
+        for shard in shards:
+            for position in shard.index.substring_matches(item_norm):
+                exact.extend(entry for entry in shard.entries[position] if entry.active(now) and entry.price_id not in seen)
+        exact.sort(key=lambda entry: entry.price_id)
+        results.append(found + exact)
+        exact_counts.append(len(found) + len(exact))
+
+    pending = [i for i, count in enumerate(exact_counts) if count < 3]
+    if not pending:
+        return results
+
+    fuzzy = _fuzzy_scores(shards, [item_norms[i] for i in pending], matcher, n, cutoff, tfidf_weights)
+    for i, matches in zip(pending, fuzzy):
+        found = results[i]
+        seen = {entry.price_id for entry in found}
+        for name in heapq.nlargest(n, matches, key=lambda name: (matches[name][0], name)):
+            for entry in sorted(matches[name][1], key=lambda entry: entry.price_id):
+                if entry.active(now) and entry.price_id not in seen:
+                    seen.add(entry.price_id)
+                    found.append(entry)
+    return results
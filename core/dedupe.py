@@ -0,0 +1,181 @@
+# Fichier: core/dedupe.py
+
+"""
+Regroupement des produits en double ("Lait 2% Natrel 2L" et "Natrel lait 2 %
+2 L") et fusion sur un produit canonique.
+
+Chaque produit est réduit à l'ensemble des mots de son nom normalisé et de sa
+marque (core/text.py). Deux produits sont des doublons si :
+- leurs ensembles ont une similarité de Jaccard d'au moins 'threshold' ;
+- leurs mots contenant des chiffres ("2%", "2l") sont identiques : un
+  format différent est un autre produit ;
+- leurs marques ne se contredisent pas (l'une est vide, ou elles sont égales).
+
+Pour ne pas comparer toutes les paires, la jointure par similarité filtre
+par préfixe : les mots de chaque produit sont triés du plus rare au plus
+fréquent, et deux produits ne sont comparés que s'ils partagent l'un des
+premiers mots de cet ordre (le nombre nécessaire découle du seuil) et si
+leurs tailles sont compatibles. Un mot partagé par plus de 'max_block'
+produits ne sert pas de bloc. Les paires retenues sont réunies par
+union-find, sans jamais réunir deux marques différentes.
+
+Le produit canonique d'un groupe est celui qui a le plus de prix, puis le
+plus ancien. La fusion déplace prix, lignes de l'instantané des rabais actifs
+et alias appris, reprend le code-barres s'il manque, enregistre une
+ProduitRedirection par doublon puis supprime les doublons ; un groupe est
+fusionné par transaction, sans qu'un rabais ne disparaisse de l'instantané.
+"""
+
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from core.active_deals import rebuild_active_deals
+from core.market_cache import bump_market_version
+from core.models import ActiveDeal, Prix, Produit, ProduitAlias, ProduitRedirection
+from core.text import normalize_name
+
+THRESHOLD = 0.8
+MAX_BLOCK = 1000
+BATCH_SIZE = 2000
+
+
+class _UnionFind:
+    """ Union-find sur des indices, qui garde la marque (non vide) de chaque groupe. """
+
+    def __init__(self, marques):
+        self.parent = list(range(len(marques)))
+        self.marques = list(marques)
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.marques[a] and self.marques[b] and self.marques[a] != self.marques[b]:
+            return
+        self.parent[b] = a
+        self.marques[a] = self.marques[a] or self.marques[b]
+
+
+def _tokens(rows):
+    """ (identifiants, ensembles de mots, marques normalisées), produits sans mot exclus. """
+    marques = {}
+    ids, tokens, brands = [], [], []
+    for produit_id, nom, marque, nom_normalise in rows:
+        if marque not in marques:
+            marques[marque] = normalize_name(marque)
+        mots = frozenset((nom_normalise or normalize_name(nom)).split()) | frozenset(marques[marque].split())
+        if mots:
+            ids.append(produit_id)
+            tokens.append(mots)
+            brands.append(marques[marque])
+    return ids, tokens, brands
+
+
+def find_duplicates(rows, threshold=THRESHOLD, max_block=MAX_BLOCK):
+    """
+    'rows' : (id, nom, marque, nom_normalise) de chaque produit. Retourne
+    (groupes d'identifiants d'au moins deux produits, nombre de mots trop
+    fréquents ignorés comme blocs).
+    """
+    ids, tokens, brands = _tokens(rows)
+    frequence = Counter(mot for mots in tokens for mot in mots)
+    formats = [frozenset(mot for mot in mots if any(c.isdigit() for c in mot)) for mots in tokens]
+
+    # Du plus petit au plus grand ensemble : un produit n'est comparé qu'aux
+    # précédents, qui ne sont jamais plus grands.
+    ordre = sorted(range(len(ids)), key=lambda i: (len(tokens[i]), ids[i]))
+    union = _UnionFind(brands)
+    blocs = defaultdict(list)
+    ignores = set()
+    for i in ordre:
+        x, format_x, marque_x = tokens[i], formats[i], brands[i]
+        taille_min = threshold * len(x)
+        prefixe = sorted(x, key=lambda mot: (frequence[mot], mot))[:len(x) - math.ceil(taille_min) + 1]
+        vus = set()
+        for mot in prefixe:
+            bloc = blocs[mot]
+            if len(bloc) >= max_block:
+                ignores.add(mot)
+                continue
+            for j in bloc:
+                if j in vus:
+                    continue
+                vus.add(j)
+                y = tokens[j]
+                if len(y) < taille_min or formats[j] != format_x or (marque_x and brands[j] and brands[j] != marque_x):
+                    continue
+                commun = len(x & y)
+                if commun >= threshold * (len(x) + len(y) - commun):
+                    union.union(j, i)
+            bloc.append(i)
+
+    groupes = defaultdict(list)
+    for i in range(len(ids)):
+        groupes[union.find(i)].append(ids[i])
+    return [sorted(groupe) for groupe in groupes.values() if len(groupe) > 1], len(ignores)
+
+
+def canonical_choices(groupes):
+    """ [(canonique, [doublons])] : le produit du groupe qui a le plus de prix, puis le plus ancien. """
+    produit_ids = [produit_id for groupe in groupes for produit_id in groupe]
+    nombres = {}
+    for start in range(0, len(produit_ids), BATCH_SIZE):
+        chunk = produit_ids[start:start + BATCH_SIZE]
+        nombres.update(
+            Prix.objects.filter(produit_id__in=chunk).values('produit_id').annotate(n=Count('id')).values_list('produit_id', 'n')
+        )
+    choix = []
+    for groupe in groupes:
+        canonique = min(groupe, key=lambda produit_id: (-nombres.get(produit_id, 0), produit_id))
+        choix.append((canonique, [produit_id for produit_id in groupe if produit_id != canonique]))
+    return choix
+
+
+def merge_products(canonique, doublons):
+    """ Fusionne 'doublons' dans 'canonique' (voir la docstring du module). Retourne le nombre de prix déplacés. """
+    with transaction.atomic():
+        anciens = list(Produit.objects.filter(id__in=doublons).values_list('id', 'nom', 'marque', 'code_barres'))
+        deplaces = Prix.objects.filter(produit_id__in=doublons).update(produit_id=canonique)
+        # Sans cela, la suppression des doublons emporterait leurs rabais actifs jusqu'à finish_merges.
+        nom, marque, categorie_nom = Produit.objects.filter(id=canonique).values_list('nom', 'marque', 'categorie__nom').get()
+        ActiveDeal.objects.filter(produit_id__in=doublons).update(
+            produit_id=canonique, produit_nom=nom, marque=marque, categorie_nom=categorie_nom,
+        )
+
+        for alias in ProduitAlias.objects.filter(produit_id__in=doublons).prefetch_related('selectionne_par'):
+            cible, _ = ProduitAlias.objects.get_or_create(terme=alias.terme, produit_id=canonique)
+            cible.selectionne_par.add(*alias.selectionne_par.all())
+            cible.selections = cible.selectionne_par.count()
+            cible.save(update_fields=['selections', 'date_mise_a_jour'])
+
+        ProduitRedirection.objects.filter(produit_id__in=doublons).update(produit_id=canonique)
+        ProduitRedirection.objects.bulk_create([
+            ProduitRedirection(ancien_id=produit_id, ancien_nom=nom, ancien_marque=marque or '', produit_id=canonique)
+            for produit_id, nom, marque, _ in anciens
+        ])
+        code_barres = next((code for _, _, _, code in anciens if code), None)
+        # Les doublons (et leurs alias, déjà copiés) sont supprimés avant de reprendre leur code-barres unique.
+        Produit.objects.filter(id__in=doublons).delete()
+        if code_barres:
+            Produit.objects.filter(id=canonique, code_barres__isnull=True).update(code_barres=code_barres)
+    return deplaces
+
+
+def product_rows():
+    return Produit.objects.order_by('id').values_list('id', 'nom', 'marque', 'nom_normalise').iterator(chunk_size=BATCH_SIZE)
+
+
+def finish_merges(canoniques):
+    """ Après les fusions : instantané des rabais des produits canoniques et version des données. """
+    with transaction.atomic():
+        rebuild_active_deals(produit_ids=list(canoniques))
+        bump_market_version()
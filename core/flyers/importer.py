@@ -0,0 +1,413 @@
+# Fichier: core/flyers/importer.py
+
+"""
+Moteur d'importation des circulaires.
+
+Au lieu d'un get_or_create par catégorie et par produit, les catégories et
+produits d'un lot d'articles sont résolus en quelques requêtes ensemblistes,
+les manquants sont créés avec bulk_create et les prix sont insérés par lots.
+
+Chaque circulaire importée garde une empreinte de son contenu : renvoyer la
+même circulaire (même commerce, mêmes dates) ne fait rien, et une circulaire
+réémise avec des différences n'applique que les articles modifiés.
+"""
+
+import time
+from collections import defaultdict
+
+from django.db import transaction
+
+from core.models import Commerce, Categorie, Produit, ProduitRedirection, Circulaire, Prix
+from core.active_deals import rebuild_active_deals
+from core.market_cache import bump_market_version
+from core.flyers.parsing import parse_header, parse_item, iter_items, FlyerHasher, flyer_hash
+from core.flyers.stream import iter_flyer_events
+from core.pricing import unit_price_fields
+from core.text import normalize_name
+
+# Taille des lots pour les requêtes IN (...) et les bulk_create.
+# SQLite limite le nombre de paramètres par requête.
+BATCH_SIZE = 500
+
+# Colonnes réécrites quand un article change dans une circulaire réémise.
+PRICE_FIELDS = ['prix', 'details_prix', 'prix_unitaire', 'quantite_lot', 'unite_mesure']
+
+# Nombre d'articles validés par transaction en mode flux.
+STREAM_CHUNK_SIZE = 1000
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class FlyerImporter:
+    """
+    Écrit une circulaire en base, lot par lot.
+
+    start() prépare le commerce et la circulaire, import_items() peut être
+    appelé une ou plusieurs fois avec des FlyerItem, puis finish() enregistre
+    l'empreinte du contenu. Les durées de chaque étape sont cumulées dans
+    'timings' (en secondes).
+
+    Si une circulaire existe déjà pour ce commerce et ces dates :
+    - avec la même empreinte ('content_hash' connu d'avance), rien n'est écrit ;
+    - sinon, les prix de circulaire existants sont comparés aux articles reçus
+      (mis à jour, conservés ou supprimés) au lieu d'insérer un doublon.
+    Les rabais soumis par les utilisateurs sur cette circulaire ne sont pas touchés.
+
+    Mémoire : hors mode différentiel, seul le lot courant est gardé. En mode
+    différentiel, l'importateur garde en plus, jusqu'à finish(), l'identifiant
+    de chaque prix existant déjà associé et les prix pas encore associés des
+    produits vus : une mémoire proportionnelle à la taille de la circulaire,
+    même en flux.
+    """
+
+    def __init__(self, header, content_hash=None):
+        self.header = header
+        self.content_hash = content_hash
+        self.commerce = None
+        self.circulaire = None
+        self.statut = None  # 'nouvelle', 'identique' ou 'modifiee'
+        self.items_imported = 0
+        self.counts = defaultdict(int)
+        self.timings = defaultdict(float)
+        self._hasher = FlyerHasher(header)
+        self._categories = {}  # nom -> id, conservé entre les lots (peu de catégories)
+        # Mode différentiel : prix existants pas encore associés à un article.
+        self._restants = {}
+        self._conserves = set()
+        self._max_existing_id = None
+        # Produits existants dont la catégorie a changé (à rafraîchir dans l'instantané).
+        self._recategorises = set()
+
+    def _timed(self, stage, started):
+        self.timings[stage] += time.perf_counter() - started
+
+    def start(self):
+        started = time.perf_counter()
+        header = self.header
+        commerce, created = Commerce.objects.get_or_create(
+            nom=header.store,
+            defaults={
+                "adresse": header.coordonnees.get("adresse", ""),
+                "site_web": header.coordonnees.get("site_web", ""),
+            },
+        )
+        self.commerce = commerce
+
+        existante = None
+        if not created:
+            existante = Circulaire.objects.filter(
+                commerce=commerce, date_debut=header.date_debut, date_fin=header.date_fin,
+            ).order_by('-id').first()
+
+        if existante and self.content_hash and existante.content_hash == self.content_hash:
+            self.circulaire = existante
+            self.statut = 'identique'
+            self._timed('commerce', started)
+            return
+
+        if not created and header.coordonnees:
+            for field, value in header.coordonnees.items():
+                setattr(commerce, field, value)
+            commerce.save(update_fields=list(header.coordonnees))
+
+        if existante:
+            self.circulaire = existante
+            self.statut = 'modifiee'
+            self._max_existing_id = self._flyer_prices().order_by('-id').values_list('id', flat=True).first() or 0
+        else:
+            self.circulaire = Circulaire.objects.create(
+                commerce=commerce,
+                date_debut=header.date_debut,
+                date_fin=header.date_fin,
+            )
+            self.statut = 'nouvelle'
+        self._timed('commerce', started)
+
+    def _flyer_prices(self):
+        return Prix.objects.filter(circulaire=self.circulaire, submitted_by__isnull=True)
+
+    def import_items(self, items):
+        """ Importe un lot de FlyerItem. Retourne le nombre d'articles traités. """
+        if not items or self.statut == 'identique':
+            return len(items)
+
+        for item in items:
+            self._hasher.add(item)
+
+        started = time.perf_counter()
+        categorie_ids = self._resolve_categories({item.categorie for item in items})
+        self._timed('categories', started)
+
+        started = time.perf_counter()
+        produit_ids = self._resolve_products(items, categorie_ids)
+        self._timed('produits', started)
+
+        started = time.perf_counter()
+        if self.statut == 'modifiee':
+            a_creer = self._apply_diff(items, produit_ids)
+        else:
+            a_creer = items
+        Prix.objects.bulk_create(
+            [
+                Prix(
+                    produit_id=produit_ids[item.nom],
+                    commerce=self.commerce,
+                    circulaire=self.circulaire,
+                    prix=item.prix,
+                    details_prix=item.details,
+                    **unit_price_fields(item.details, item.prix),
+                )
+                for item in a_creer
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        self.counts['crees'] += len(a_creer)
+        self._timed('prix', started)
+
+        self.items_imported += len(items)
+        return len(items)
+
+    def _apply_diff(self, items, produit_ids):
+        """
+        Associe chaque article à un prix existant du même produit. Retourne
+        les articles sans correspondance, à créer.
+        """
+        nouveaux_ids = {produit_ids[item.nom] for item in items} - self._restants.keys()
+        for produit_id in nouveaux_ids:
+            self._restants[produit_id] = []
+        for chunk in _chunks(nouveaux_ids):
+            existants = self._flyer_prices().filter(produit_id__in=chunk, id__lte=self._max_existing_id).order_by('id')
+            for prix_obj in existants.only('id', 'produit_id', 'prix', 'details_prix'):
+                self._restants[prix_obj.produit_id].append(prix_obj)
+
+        a_creer = []
+        a_modifier = []
+        for item in items:
+            restants = self._restants[produit_ids[item.nom]]
+            if not restants:
+                a_creer.append(item)
+                continue
+            prix_obj = restants.pop(0)
+            self._conserves.add(prix_obj.id)
+            if prix_obj.prix != item.prix or (prix_obj.details_prix or '') != (item.details or ''):
+                prix_obj.prix = item.prix
+                prix_obj.details_prix = item.details
+                for champ, valeur in unit_price_fields(item.details, item.prix).items():
+                    setattr(prix_obj, champ, valeur)
+                a_modifier.append(prix_obj)
+            else:
+                self.counts['inchanges'] += 1
+        if a_modifier:
+            Prix.objects.bulk_update(a_modifier, PRICE_FIELDS, batch_size=BATCH_SIZE)
+            self.counts['modifies'] += len(a_modifier)
+        return a_creer
+
+    def finish(self):
+        """
+        Supprime les prix disparus (mode différentiel), enregistre l'empreinte
+        et met à jour l'instantané des rabais actifs.
+        """
+        if self.statut == 'identique':
+            return
+        started = time.perf_counter()
+        if self.statut == 'modifiee':
+            disparus = [
+                prix_id
+                for prix_id in self._flyer_prices().filter(id__lte=self._max_existing_id).values_list('id', flat=True).iterator()
+                if prix_id not in self._conserves
+            ]
+            for chunk in _chunks(disparus):
+                Prix.objects.filter(id__in=chunk).delete()
+            self.counts['supprimes'] += len(disparus)
+
+        self.content_hash = self._hasher.hexdigest()
+        Circulaire.objects.filter(id=self.circulaire.id).update(content_hash=self.content_hash)
+        self._timed('prix', started)
+
+        started = time.perf_counter()
+        rebuild_active_deals(circulaire_ids=[self.circulaire.id], produit_ids=self._recategorises)
+        bump_market_version()
+        self._timed('instantane', started)
+
+    def _resolve_categories(self, noms):
+        manquants = [nom for nom in noms if nom not in self._categories]
+        if manquants:
+            for chunk in _chunks(manquants):
+                for categorie_id, nom in Categorie.objects.filter(nom__in=chunk).values_list('id', 'nom'):
+                    self._categories[nom] = categorie_id
+
+            a_creer = [Categorie(nom=nom) for nom in manquants if nom not in self._categories]
+            if a_creer:
+                Categorie.objects.bulk_create(a_creer, batch_size=BATCH_SIZE, ignore_conflicts=True)
+                # ignore_conflicts ne renvoie pas les clés : on relit les noms créés.
+                for chunk in _chunks([c.nom for c in a_creer]):
+                    for categorie_id, nom in Categorie.objects.filter(nom__in=chunk).values_list('id', 'nom'):
+                        self._categories[nom] = categorie_id
+        return self._categories
+
+    def _resolve_products(self, items, categorie_ids):
+        """
+        Retourne {nom: produit_id} pour les articles du lot. Comme l'ancien
+        get_or_create, un produit existant prend la catégorie du dernier
+        article qui le mentionne, et un nouveau produit prend la marque du
+        premier.
+        """
+        voulus = {}
+        for item in items:
+            categorie_id = categorie_ids[item.categorie]
+            if item.nom in voulus:
+                voulus[item.nom]['categorie_id'] = categorie_id
+            else:
+                voulus[item.nom] = {'marque': item.marque, 'categorie_id': categorie_id}
+
+        produit_ids = {}
+        a_modifier = []
+        for chunk in _chunks(voulus):
+            existants = Produit.objects.filter(nom__in=chunk).only('id', 'nom', 'categorie_id').order_by('id')
+            for produit in existants:
+                if produit.nom in produit_ids:
+                    continue
+                produit_ids[produit.nom] = produit.id
+                categorie_id = voulus[produit.nom]['categorie_id']
+                if produit.categorie_id != categorie_id:
+                    produit.categorie_id = categorie_id
+                    a_modifier.append(produit)
+        if a_modifier:
+            Produit.objects.bulk_update(a_modifier, ['categorie'], batch_size=BATCH_SIZE)
+            self._recategorises.update(produit.id for produit in a_modifier)
+
+        # Un nom fusionné par dedupe_produits désigne son produit canonique.
+        for chunk in _chunks([nom for nom in voulus if nom not in produit_ids]):
+            for nom, produit_id in ProduitRedirection.objects.filter(ancien_nom__in=chunk).order_by('id').values_list('ancien_nom', 'produit_id'):
+                produit_ids.setdefault(nom, produit_id)
+
+        a_creer = [
+            Produit(nom=nom, nom_normalise=normalize_name(nom), marque=valeurs['marque'], categorie_id=valeurs['categorie_id'])
+            for nom, valeurs in voulus.items() if nom not in produit_ids
+        ]
+        if a_creer:
+            Produit.objects.bulk_create(a_creer, batch_size=BATCH_SIZE)
+            sans_cle = []
+            for produit in a_creer:
+                if produit.pk is None:
+                    sans_cle.append(produit.nom)
+                else:
+                    produit_ids[produit.nom] = produit.pk
+            # Bases qui ne renvoient pas les clés après un INSERT groupé.
+            for chunk in _chunks(sans_cle):
+                for produit_id, nom in Produit.objects.filter(nom__in=chunk).order_by('id').values_list('id', 'nom'):
+                    produit_ids[nom] = produit_id
+        return produit_ids
+
+    def summary(self):
+        timings = dict(self.timings)
+        timings['total'] = sum(self.timings.values())
+        return {
+            "commerce": self.commerce.nom if self.commerce else self.header.store,
+            "circulaire_id": self.circulaire.id if self.circulaire else None,
+            "statut": self.statut,
+            "articles_importes": self.items_imported,
+            "prix": {
+                key: self.counts[key] for key in ('crees', 'modifies', 'inchanges', 'supprimes')
+            },
+            "durees_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()},
+        }
+
+
+def import_flyer(data):
+    """
+    Importe une circulaire complète (déjà décodée) dans une seule transaction.
+    Retourne le résumé de FlyerImporter.summary().
+    """
+    started = time.perf_counter()
+    header = parse_header(data)
+    items = list(iter_items(data))
+    content_hash = flyer_hash(header, items)
+    return import_parsed_flyer(header, items, content_hash, lecture=time.perf_counter() - started)
+
+
+def import_parsed_flyer(header, items, content_hash=None, lecture=None):
+    """ Écrit une circulaire déjà lue et normalisée, dans une seule transaction. """
+    importer = FlyerImporter(header, content_hash=content_hash)
+    if lecture is not None:
+        importer.timings['lecture'] = lecture
+    with transaction.atomic():
+        importer.start()
+        importer.import_items(items)
+        importer.finish()
+    return importer.summary()
+
+
+def _stream_hashes(fp):
+    """ Première passe sur un fichier : empreinte de chaque circulaire du document. """
+    empreintes = []
+    hasher = None
+    for event in iter_flyer_events(fp):
+        kind = event[0]
+        if kind == 'article':
+            hasher.add(parse_item(event[1], event[2]))
+        elif kind == 'debut':
+            hasher = FlyerHasher(parse_header(event[1]))
+        else:
+            empreintes.append(hasher.hexdigest())
+    return empreintes
+
+
+def import_flyer_stream(fp, chunk_size=STREAM_CHUNK_SIZE, on_progress=None):
+    """
+    Importe une ou plusieurs circulaires depuis un flux binaire JSON sans le
+    charger en mémoire. Les articles sont validés par lots de 'chunk_size',
+    chacun dans sa propre transaction : en cas d'erreur, les lots déjà
+    validés restent en base. Une circulaire réémise avec des différences
+    (mode différentiel de FlyerImporter) garde toutefois un état
+    proportionnel à sa taille.
+
+    Si le flux peut être relu (fichier), une première passe calcule
+    l'empreinte de chaque circulaire pour ignorer d'emblée celles déjà
+    importées à l'identique.
+
+    'on_progress', s'il est fourni, est appelé avec le nombre total
+    d'articles importés après chaque lot. Retourne la liste des résumés.
+    """
+    empreintes = []
+    seekable = getattr(fp, 'seekable', None)
+    if seekable and seekable():
+        debut = fp.tell()
+        empreintes = _stream_hashes(fp)
+        fp.seek(debut)
+
+    resumes = []
+    total = 0
+    importer = None
+    lot = []
+
+    def flush():
+        nonlocal total
+        if lot:
+            with transaction.atomic():
+                total += importer.import_items(lot)
+            lot.clear()
+            if on_progress:
+                on_progress(total)
+
+    for event in iter_flyer_events(fp):
+        kind = event[0]
+        if kind == 'article':
+            lot.append(parse_item(event[1], event[2]))
+            if len(lot) >= chunk_size:
+                flush()
+        elif kind == 'debut':
+            content_hash = empreintes[len(resumes)] if empreintes else None
+            importer = FlyerImporter(parse_header(event[1]), content_hash=content_hash)
+            with transaction.atomic():
+                importer.start()
+        else:
+            flush()
+            with transaction.atomic():
+                importer.finish()
+            resumes.append(importer.summary())
+    return resumes
@@ -0,0 +1,131 @@
+# Fichier: core/flyers/jobs.py
+
+"""
+File d'attente des importations de circulaires, sans courtier : la table
+ImportJob sert de file et la commande run_import_worker la consomme.
+
+Un worker arrêté en pleine importation laisse sa tâche RUNNING : sans signe
+de vie (progression) depuis JOB_TIMEOUT, elle est remise en attente, ou
+marquée en échec après MAX_ATTEMPTS réservations. Réimporter une circulaire
+est sans danger (les lots déjà validés sont retrouvés par le diff de
+l'importateur). Le document sur disque est supprimé quand la tâche se
+termine, qu'elle réussisse ou non.
+"""
+
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import ImportJob
+from core.flyers.importer import import_flyer_stream
+
+COPY_SIZE = 64 * 1024
+JOB_TIMEOUT = timedelta(minutes=15)
+MAX_ATTEMPTS = 3
+
+
+def enqueue_import(stream, user=None):
+    """ Copie le document reçu sur disque (par morceaux) et crée la tâche. """
+    os.makedirs(settings.FLYER_IMPORT_DIR, exist_ok=True)
+    chemin = os.path.join(settings.FLYER_IMPORT_DIR, f"{uuid.uuid4().hex}.json")
+    with open(chemin, 'wb') as destination:
+        while True:
+            chunk = stream.read(COPY_SIZE)
+            if not chunk:
+                break
+            destination.write(chunk)
+    return ImportJob.objects.create(fichier=chemin, submitted_by=user)
+
+
+def _discard_file(job):
+    try:
+        os.remove(job.fichier)
+    except FileNotFoundError:
+        pass
+
+
+def reclaim_stale_jobs(now=None):
+    """
+    Remet en attente les tâches RUNNING sans progression depuis JOB_TIMEOUT ;
+    celles déjà réservées MAX_ATTEMPTS fois passent en échec. Retourne le
+    nombre de tâches remises en attente.
+    """
+    now = now or timezone.now()
+    limite = now - JOB_TIMEOUT
+    stale = ImportJob.objects.filter(status='RUNNING').filter(
+        Q(date_progress__lt=limite) | Q(date_progress__isnull=True, date_started__lt=limite)
+    )
+    reprises = 0
+    for job in stale:
+        # Même condition que la sélection : un worker qui vient de progresser garde sa tâche.
+        encore = ImportJob.objects.filter(id=job.id, status='RUNNING', date_progress=job.date_progress)
+        if job.attempts < MAX_ATTEMPTS:
+            reprises += encore.update(status='PENDING')
+        elif encore.update(
+            status='FAILED', date_finished=now,
+            errors=job.errors + [f"Importation interrompue {job.attempts} fois (worker arrêté ?)."],
+        ):
+            _discard_file(job)
+    return reprises
+
+
+def claim_next_job():
+    """
+    Réserve la plus ancienne tâche en attente, après avoir repris les tâches
+    abandonnées. La mise à jour conditionnelle sur le statut garantit qu'une
+    tâche n'est prise que par un seul worker.
+    """
+    reclaim_stale_jobs()
+    while True:
+        job = ImportJob.objects.filter(status='PENDING').order_by('id').first()
+        if job is None:
+            return None
+        started = timezone.now()
+        claimed = ImportJob.objects.filter(id=job.id, status='PENDING').update(
+            status='RUNNING', date_started=started, date_progress=started, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db(fields=['status', 'date_started', 'date_progress', 'attempts'])
+            return job
+
+
+def run_job(job):
+    """ Exécute une tâche réservée et enregistre sa progression et son résultat. """
+    def progression(total):
+        ImportJob.objects.filter(id=job.id).update(items_processed=total, date_progress=timezone.now())
+
+    try:
+        with open(job.fichier, 'rb') as fp:
+            resumes = import_flyer_stream(fp, on_progress=progression)
+    except Exception as e:
+        # Les lots déjà validés restent en base : on garde leur compte.
+        job.refresh_from_db(fields=['items_processed'])
+        job.status = 'FAILED'
+        job.errors = job.errors + [str(e)]
+    else:
+        job.status = 'DONE'
+        job.result = {"circulaires": resumes}
+        job.items_processed = sum(resume['articles_importes'] for resume in resumes)
+    _discard_file(job)
+    job.date_finished = timezone.now()
+    job.save(update_fields=['status', 'errors', 'result', 'items_processed', 'date_finished'])
+    return job
+
+
+def job_status(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "items_processed": job.items_processed,
+        "attempts": job.attempts,
+        "errors": job.errors,
+        "duration": job.duration,
+        "date_created": job.date_created,
+        "date_started": job.date_started,
+        "date_finished": job.date_finished,
+        "result": job.result,
+    }
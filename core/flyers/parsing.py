@@ -0,0 +1,141 @@
+# Fichier: core/flyers/parsing.py
+
+"""
+Règles de lecture d'une circulaire JSON (store / date_debut / date_fin /
+categories[].items[]).
+
+Ce module n'importe aucun modèle Django : il peut être utilisé hors d'une
+requête, par exemple dans des processus de travail séparés.
+"""
+
+import hashlib
+import json
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+CATEGORIE_PAR_DEFAUT = "Divers"
+# Clés de l'en-tête lues par parse_header ; les autres clés d'une circulaire sont ignorées.
+HEADER_KEYS = frozenset({'store', 'date_debut', 'date_fin', 'address', 'website'})
+
+FlyerHeader = namedtuple('FlyerHeader', ['store', 'date_debut', 'date_fin', 'coordonnees'])
+FlyerItem = namedtuple('FlyerItem', ['categorie', 'nom', 'marque', 'prix', 'details'])
+
+
+def parse_header(data):
+    """
+    Valide l'en-tête d'une circulaire et retourne un FlyerHeader.
+    'coordonnees' ne contient que les champs du commerce réellement fournis,
+    pour ne pas écraser l'adresse ou le site web existants.
+    """
+    nom_commerce = data.get("store")
+    if not nom_commerce:
+        raise ValueError("Le nom du magasin ('store') est manquant dans le JSON.")
+
+    date_debut_str = data.get("date_debut")
+    date_fin_str = data.get("date_fin")
+    if not date_debut_str or not date_fin_str:
+        raise ValueError("Les clés 'date_debut' et 'date_fin' sont manquantes.")
+
+    coordonnees = {}
+    if "address" in data:
+        coordonnees["adresse"] = data["address"]
+    if "website" in data:
+        coordonnees["site_web"] = data["website"]
+
+    return FlyerHeader(
+        store=nom_commerce,
+        date_debut=datetime.strptime(date_debut_str, "%Y-%m-%d").date(),
+        date_fin=datetime.strptime(date_fin_str, "%Y-%m-%d").date(),
+        coordonnees=coordonnees,
+    )
+
+
+def parse_category_name(categorie):
+    return categorie.get("category_name", CATEGORIE_PAR_DEFAUT) or CATEGORIE_PAR_DEFAUT
+
+
+def parse_item(categorie_nom, item):
+    """ Normalise un article de circulaire en FlyerItem. """
+    nom = item.get("name")
+    if not nom:
+        raise ValueError(f"Un article de la catégorie '{categorie_nom}' n'a pas de nom ('name').")
+
+    prix_value = item.get("single_price")
+    if prix_value is None or prix_value == '':
+        prix_value = 0
+    try:
+        prix = Decimal(str(prix_value))
+        # quantize laisse passer NaN et Infinity sans erreur.
+        if not prix.is_finite():
+            raise InvalidOperation
+        prix = prix.quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"Prix invalide pour '{nom}' : {prix_value!r}")
+
+    return FlyerItem(
+        categorie=categorie_nom,
+        nom=nom,
+        marque=item.get("brand", ""),
+        prix=prix,
+        details=item.get("price", ""),
+    )
+
+
+def iter_items(data):
+    """ Parcourt categories[].items[] et produit des FlyerItem. """
+    for categorie in data.get("categories", []):
+        categorie_nom = parse_category_name(categorie)
+        for item in categorie.get("items", []):
+            yield parse_item(categorie_nom, item)
+
+
+class FlyerHasher:
+    """
+    Empreinte canonique d'une circulaire : l'en-tête plus la somme (modulo
+    2**256) des empreintes de chaque article. La somme ne dépend pas de
+    l'ordre des articles et se calcule au fil de l'eau, en mode flux comme
+    en mémoire.
+    """
+    _MODULO = 2 ** 256
+
+    def __init__(self, header):
+        self._header = json.dumps(
+            [header.store, header.date_debut.isoformat(), header.date_fin.isoformat(), sorted(header.coordonnees.items())],
+            ensure_ascii=False,
+        )
+        self._total = 0
+        self._count = 0
+
+    def add(self, item):
+        encoded = json.dumps([item.categorie, item.nom, item.marque, str(item.prix), item.details], ensure_ascii=False)
+        self._total = (self._total + int(hashlib.sha256(encoded.encode('utf-8')).hexdigest(), 16)) % self._MODULO
+        self._count += 1
+
+    def hexdigest(self):
+        return hashlib.sha256(f"{self._header}|{self._count}|{self._total:064x}".encode('utf-8')).hexdigest()
+
+
+def flyer_hash(header, items):
+    hasher = FlyerHasher(header)
+    for item in items:
+        hasher.add(item)
+    return hasher.hexdigest()
+
+
+def parse_flyer_file(chemin):
+    """
+    Lit et normalise un fichier de circulaire(s) sans toucher à la base.
+    Retourne une liste de (FlyerHeader, [FlyerItem], empreinte), une entrée
+    par circulaire du fichier (un fichier peut contenir un tableau).
+    """
+    with open(chemin, 'rb') as fp:
+        data = json.load(fp)
+    documents = data if isinstance(data, list) else [data]
+
+    circulaires = []
+    for document in documents:
+        header = parse_header(document)
+        items = list(iter_items(document))
+        circulaires.append((header, items, flyer_hash(header, items)))
+    return circulaires
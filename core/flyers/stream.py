@@ -0,0 +1,188 @@
+# Fichier: core/flyers/stream.py
+
+"""
+Lecture incrémentale d'un document de circulaire JSON.
+
+Le document n'est jamais chargé en entier : seuls les articles (petits objets)
+sont décodés un à un, ce qui garde la mémoire constante quelle que soit la
+taille du fichier. Un document peut être une circulaire unique ou un tableau
+de circulaires (fusion de plusieurs magasins).
+
+Contrainte du mode flux : les clés d'en-tête (HEADER_KEYS : store,
+date_debut, date_fin...) doivent précéder 'categories' dans chaque
+circulaire, ce que produit notre extracteur. Les autres clés (scraped_at...)
+peuvent venir après : elles sont lues et ignorées, comme par l'importation
+synchrone.
+"""
+
+import codecs
+import json
+
+from core.flyers.parsing import CATEGORIE_PAR_DEFAUT, HEADER_KEYS
+
+READ_SIZE = 64 * 1024
+# Garde-fou : au-delà, une « valeur » est soit invalide, soit anormalement grosse.
+MAX_VALUE_SIZE = 8 * 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+# Caractères qui peuvent prolonger un nombre JSON.
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+
+class JsonStreamReader:
+    """ Tampon minimal au-dessus d'un flux binaire UTF-8. """
+
+    def __init__(self, fp, read_size=READ_SIZE):
+        self._fp = fp
+        self._read_size = read_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        chunk = self._fp.read(self._read_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        final = not chunk
+        text = self._decoder.decode(chunk or b'', final=final)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        if final:
+            self._eof = True
+        elif len(self._buf) > MAX_VALUE_SIZE:
+            raise ValueError("Valeur JSON invalide ou trop volumineuse dans la circulaire.")
+        return True
+
+    def peek(self):
+        """ Retourne le prochain caractère significatif ('' en fin de flux). """
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON invalide : '{char}' attendu, '{found or 'fin du fichier'}' trouvé.")
+        self._pos += 1
+
+    def consume_if(self, char):
+        if self.peek() == char:
+            self._pos += 1
+            return True
+        return False
+
+    def read_value(self):
+        """ Décode la prochaine valeur JSON complète (objet, chaîne, nombre...). """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Un nombre coupé en fin de tampon se décode aussi : « 12 » de « 123 »,
+            # ou « 12 » de « 12. » (raw_decode s'arrête avant le point).
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and all(c in _NUMBER_CHARS for c in self._buf[end:]) and self._fill()):
+                continue
+            self._pos = end
+            return value
+
+    def read_key(self):
+        key = self.read_value()
+        if not isinstance(key, str):
+            raise ValueError("JSON invalide : clé d'objet attendue.")
+        self.expect(':')
+        return key
+
+    def iter_array(self):
+        """ Avance dans un tableau ; chaque itération laisse le curseur sur un élément. """
+        self.expect('[')
+        if self.consume_if(']'):
+            return
+        while True:
+            yield
+            if self.consume_if(']'):
+                return
+            self.expect(',')
+
+    def iter_object(self):
+        """ Avance dans un objet ; produit chaque clé, la valeur reste à lire. """
+        self.expect('{')
+        if self.consume_if('}'):
+            return
+        while True:
+            yield self.read_key()
+            if self.consume_if('}'):
+                return
+            self.expect(',')
+
+
+def iter_flyer_events(fp, read_size=READ_SIZE):
+    """
+    Parcourt un document de circulaire(s) et produit des événements :
+
+    - ('debut', entete)                  : en-tête lu, avant le premier article
+    - ('article', categorie_nom, item)  : un article brut (dict)
+    - ('fin', entete)                    : fin d'une circulaire
+    """
+    reader = JsonStreamReader(fp, read_size)
+    if reader.peek() == '[':
+        for _ in reader.iter_array():
+            yield from _iter_flyer(reader)
+    else:
+        yield from _iter_flyer(reader)
+    if reader.peek() != '':
+        raise ValueError("JSON invalide : contenu inattendu après la circulaire.")
+
+
+def _iter_flyer(reader):
+    entete = {}
+    started = False
+    for key in reader.iter_object():
+        if key == 'categories':
+            if not started:
+                started = True
+                yield ('debut', dict(entete))
+            for _ in reader.iter_array():
+                yield from _iter_category(reader)
+        elif started and key in HEADER_KEYS:
+            raise ValueError(f"Mode flux : la clé '{key}' doit précéder 'categories' dans la circulaire.")
+        elif started:
+            reader.read_value()
+        else:
+            entete[key] = reader.read_value()
+    if not started:
+        yield ('debut', dict(entete))
+    yield ('fin', entete)
+
+
+def _iter_category(reader):
+    categorie_nom = None
+    en_attente = []  # articles lus avant 'category_name', le cas échéant
+    for key in reader.iter_object():
+        if key == 'category_name':
+            categorie_nom = reader.read_value() or CATEGORIE_PAR_DEFAUT
+            for item in en_attente:
+                yield ('article', categorie_nom, item)
+            en_attente = []
+        elif key == 'items':
+            for _ in reader.iter_array():
+                item = reader.read_value()
+                if categorie_nom is None:
+                    en_attente.append(item)
+                else:
+                    yield ('article', categorie_nom, item)
+        else:
+            reader.read_value()
+    for item in en_attente:
+        yield ('article', CATEGORIE_PAR_DEFAUT, item)
@@ -0,0 +1,43 @@
+# Fichier: core/management/commands/backfill_nom_normalise.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.market_cache import bump_market_version
+from core.models import Produit
+from core.text import normalize_name
+
+
+class Command(BaseCommand):
+    help = "Calcule Produit.nom_normalise pour les produits existants (après un changement des règles de normalisation)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Nombre de produits mis à jour par transaction.")
+
+    def handle(self, *args, **options):
+        dernier_id = 0
+        total = 0
+        modifies = 0
+        while True:
+            lot = list(Produit.objects.filter(id__gt=dernier_id).order_by('id').only('id', 'nom', 'nom_normalise')[:options['batch_size']])
+            if not lot:
+                break
+            dernier_id = lot[-1].id
+            total += len(lot)
+
+            a_modifier = []
+            for produit in lot:
+                nom_normalise = normalize_name(produit.nom)
+                if produit.nom_normalise != nom_normalise:
+                    produit.nom_normalise = nom_normalise
+                    a_modifier.append(produit)
+            with transaction.atomic():
+                Produit.objects.bulk_update(a_modifier, ['nom_normalise'], batch_size=500)
+            modifies += len(a_modifier)
+            self.stdout.write(f"{total} produits lus, {modifies} mis à jour...")
+
+        if modifies:
+            # Le catalogue de l'optimiseur indexe ces noms : on l'invalide.
+            with transaction.atomic():
+                bump_market_version()
+        self.stdout.write(self.style.SUCCESS(f"{modifies} produits mis à jour sur {total}."))
@@ -0,0 +1,52 @@
+# Fichier: core/management/commands/backfill_prix_unitaire.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.active_deals import rebuild_active_deals
+from core.market_cache import bump_market_version
+from core.models import Prix
+from core.pricing import unit_price_fields
+
+FIELDS = ['prix_unitaire', 'quantite_lot', 'unite_mesure']
+
+
+class Command(BaseCommand):
+    help = "Calcule prix_unitaire, quantite_lot et unite_mesure des prix existants à partir de details_prix."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Nombre de prix mis à jour par transaction.")
+        parser.add_argument('--missing-only', action='store_true', help="Ne traiter que les prix sans prix unitaire.")
+
+    def handle(self, *args, **options):
+        prix = Prix.objects.order_by('id')
+        if options['missing_only']:
+            prix = prix.filter(prix_unitaire__isnull=True)
+
+        dernier_id = 0
+        total = 0
+        modifies = 0
+        while True:
+            lot = list(prix.filter(id__gt=dernier_id).only('id', 'prix', 'details_prix', *FIELDS)[:options['batch_size']])
+            if not lot:
+                break
+            dernier_id = lot[-1].id
+            total += len(lot)
+
+            a_modifier = []
+            for prix_obj in lot:
+                valeurs = unit_price_fields(prix_obj.details_prix, prix_obj.prix)
+                if any(getattr(prix_obj, champ) != valeur for champ, valeur in valeurs.items()):
+                    for champ, valeur in valeurs.items():
+                        setattr(prix_obj, champ, valeur)
+                    a_modifier.append(prix_obj)
+            with transaction.atomic():
+                Prix.objects.bulk_update(a_modifier, FIELDS, batch_size=500)
+            modifies += len(a_modifier)
+            self.stdout.write(f"{total} prix lus, {modifies} mis à jour...")
+
+        if modifies:
+            with transaction.atomic():
+                rebuild_active_deals()
+                bump_market_version()
+        self.stdout.write(self.style.SUCCESS(f"{modifies} prix mis à jour sur {total}."))
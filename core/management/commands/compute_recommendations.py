@@ -0,0 +1,24 @@
+# Fichier: core/management/commands/compute_recommendations.py
+
+from django.core.management.base import BaseCommand
+
+from core.recommendations import USER_CHUNK_SIZE, TOP_DEALS, compute_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Précalcule les rabais recommandés pour les articles de toutes les listes d'épicerie "
+        "(à planifier chaque nuit, après rebuild_active_deals)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=USER_CHUNK_SIZE, help="Nombre d'utilisateurs traités à la fois.")
+        parser.add_argument('--top', type=int, default=TOP_DEALS, help="Nombre de rabais gardés par article.")
+
+    def handle(self, *args, **options):
+        utilisateurs, articles = compute_recommendations(
+            chunk_size=max(1, options['chunk_size']),
+            top=max(1, options['top']),
+            on_progress=lambda u, a: self.stdout.write(f"{u} utilisateurs, {a} articles..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Recommandations calculées pour {articles} articles de {utilisateurs} utilisateurs."))
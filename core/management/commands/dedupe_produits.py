@@ -0,0 +1,54 @@
+# Fichier: core/management/commands/dedupe_produits.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.dedupe import MAX_BLOCK, THRESHOLD, canonical_choices, find_duplicates, finish_merges, merge_products, product_rows
+from core.models import Produit
+
+
+class Command(BaseCommand):
+    help = (
+        "Regroupe les produits en double (mêmes mots, même format, marques compatibles) et fusionne "
+        "leurs prix sur un produit canonique, en gardant une redirection pour chaque doublon."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Afficher les groupes sans rien modifier.")
+        parser.add_argument(
+            '--threshold', type=float, default=THRESHOLD,
+            help=f"Similarité de Jaccard minimale entre les mots de deux produits (défaut : {THRESHOLD}).",
+        )
+        parser.add_argument(
+            '--max-block', type=int, default=MAX_BLOCK,
+            help=f"Un mot partagé par plus de produits n'est pas utilisé comme bloc (défaut : {MAX_BLOCK}).",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError("--threshold doit être compris entre 0 et 1.")
+
+        started = time.perf_counter()
+        groupes, ignores = find_duplicates(product_rows(), options['threshold'], max(1, options['max_block']))
+        choix = canonical_choices(groupes)
+        doublons = sum(len(ids) for _, ids in choix)
+        self.stdout.write(
+            f"{len(choix)} groupe(s), {doublons} doublon(s) trouvés en {time.perf_counter() - started:.1f} s"
+            f" ({ignores} mot(s) trop fréquent(s) ignoré(s) comme blocs)."
+        )
+
+        if options['dry_run']:
+            for canonique, ids in choix:
+                noms = dict(Produit.objects.filter(id__in=[canonique, *ids]).values_list('id', 'nom'))
+                self.stdout.write(f"#{canonique} {noms.get(canonique)} ← " + ", ".join(f"#{i} {noms.get(i)}" for i in ids))
+            return
+
+        deplaces = 0
+        for numero, (canonique, ids) in enumerate(choix, start=1):
+            deplaces += merge_products(canonique, ids)
+            if options['verbosity'] > 1 or numero % 1000 == 0:
+                self.stdout.write(f"  {numero}/{len(choix)} groupes fusionnés...")
+        if choix:
+            finish_merges(canonique for canonique, _ in choix)
+        self.stdout.write(self.style.SUCCESS(f"{doublons} produit(s) fusionné(s), {deplaces} prix déplacé(s)."))
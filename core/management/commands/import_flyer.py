@@ -0,0 +1,43 @@
+# Fichier: core/management/commands/import_flyer.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.flyers.importer import import_flyer_stream, STREAM_CHUNK_SIZE
+from core.recommendations import compute_recommendations
+
+
+class Command(BaseCommand):
+    help = "Importe un fichier de circulaire(s) JSON en flux, par lots, sans le charger en mémoire."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Chemin du fichier JSON (circulaire ou tableau de circulaires)")
+        parser.add_argument(
+            '--chunk-size', type=int, default=STREAM_CHUNK_SIZE,
+            help=f"Nombre d'articles validés par transaction (défaut : {STREAM_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            '--skip-recommendations', action='store_true',
+            help="Ne pas recalculer les rabais recommandés des listes d'épicerie après l'importation",
+        )
+
+    def handle(self, *args, **options):
+        def progression(total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {total} articles importés...")
+
+        try:
+            with open(options['fichier'], 'rb') as fp:
+                resumes = import_flyer_stream(fp, chunk_size=options['chunk_size'], on_progress=progression)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for resume in resumes:
+            self.stdout.write(
+                f"{resume['commerce']} ({resume['statut']}) : {resume['articles_importes']} articles "
+                f"({resume['durees_ms']['total']} ms)"
+            )
+        if any(resume['statut'] != 'identique' for resume in resumes) and not options['skip_recommendations']:
+            utilisateurs, articles = compute_recommendations()
+            self.stdout.write(f"Recommandations recalculées : {articles} articles de {utilisateurs} utilisateurs.")
+        total = sum(resume['articles_importes'] for resume in resumes)
+        self.stdout.write(self.style.SUCCESS(f"{total} articles importés pour {len(resumes)} circulaire(s)."))
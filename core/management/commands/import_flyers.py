@@ -0,0 +1,84 @@
+# Fichier: core/management/commands/import_flyers.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.flyers.importer import import_parsed_flyer
+from core.flyers.parsing import parse_flyer_file
+from core.recommendations import compute_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe tous les fichiers de circulaires JSON d'un dossier. La lecture et la "
+        "normalisation se font en parallèle ; les écritures passent par un seul processus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dossier', help="Dossier contenant les fichiers *.json")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Nombre de processus de lecture (défaut : nombre de processeurs)",
+        )
+        parser.add_argument(
+            '--skip-recommendations', action='store_true',
+            help="Ne pas recalculer les rabais recommandés des listes d'épicerie après l'importation",
+        )
+
+    def handle(self, *args, **options):
+        dossier = options['dossier']
+        if not os.path.isdir(dossier):
+            raise CommandError(f"Dossier introuvable : {dossier}")
+        fichiers = sorted(
+            os.path.join(dossier, nom) for nom in os.listdir(dossier) if nom.lower().endswith('.json')
+        )
+        if not fichiers:
+            self.stdout.write("Aucun fichier .json à importer.")
+            return
+
+        # Les processus de lecture n'utilisent pas la base : on ne leur lègue pas de connexion ouverte.
+        connections.close_all()
+
+        total = 0
+        echecs = 0
+        # Fichiers à plusieurs circulaires dont les premières sont validées avant l'erreur.
+        partiels = 0
+        modifiees = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {pool.submit(parse_flyer_file, chemin): chemin for chemin in fichiers}
+            # Seul ce processus écrit, au fur et à mesure que les fichiers sont prêts.
+            for future in as_completed(futures):
+                nom = os.path.basename(futures[future])
+                importees = 0
+                try:
+                    for header, items, content_hash in future.result():
+                        resume = import_parsed_flyer(header, items, content_hash)
+                        importees += 1
+                        total += resume['articles_importes']
+                        modifiees += resume['statut'] != 'identique'
+                        self.stdout.write(
+                            f"{nom} — {resume['commerce']} ({resume['statut']}) : "
+                            f"{resume['articles_importes']} articles ({resume['durees_ms']['total']} ms)"
+                        )
+                except Exception as e:
+                    if importees:
+                        partiels += 1
+                        self.stderr.write(self.style.ERROR(
+                            f"{nom} : échec après {importees} circulaire(s) importée(s) ({e})"
+                        ))
+                    else:
+                        echecs += 1
+                        self.stderr.write(self.style.ERROR(f"{nom} : échec ({e})"))
+
+        if modifiees and not options['skip_recommendations']:
+            utilisateurs, articles = compute_recommendations()
+            self.stdout.write(f"Recommandations recalculées : {articles} articles de {utilisateurs} utilisateurs.")
+
+        message = f"{total} articles importés depuis {len(fichiers) - echecs - partiels}/{len(fichiers)} fichier(s)"
+        if partiels:
+            message += f", et en partie depuis {partiels} fichier(s)"
+        message += "."
+        self.stdout.write(self.style.SUCCESS(message) if not (echecs or partiels) else self.style.WARNING(message))
@@ -0,0 +1,13 @@
+# Fichier: core/management/commands/rebuild_active_deals.py
+
+from django.core.management.base import BaseCommand
+
+from core.active_deals import rebuild_active_deals
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'instantané des rabais actifs (à planifier juste après minuit)."
+
+    def handle(self, *args, **options):
+        total = rebuild_active_deals()
+        self.stdout.write(self.style.SUCCESS(f"{total} rabais actifs dans l'instantané."))
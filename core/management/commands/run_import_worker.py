@@ -0,0 +1,50 @@
+# Fichier: core/management/commands/run_import_worker.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.flyers.jobs import claim_next_job, run_job
+from core.recommendations import compute_recommendations
+
+
+class Command(BaseCommand):
+    help = "Traite les importations de circulaires en attente (table ImportJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vide la file d'attente puis s'arrête")
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help="Secondes d'attente entre deux vérifications de la file (défaut : 5)",
+        )
+        parser.add_argument(
+            '--skip-recommendations', action='store_true',
+            help="Ne pas recalculer les rabais recommandés des listes d'épicerie quand la file est vidée",
+        )
+
+    def handle(self, *args, **options):
+        # Les recommandations sont recalculées une fois la file vidée, pas après chaque tâche.
+        a_recalculer = False
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if a_recalculer:
+                    utilisateurs, articles = compute_recommendations()
+                    self.stdout.write(f"Recommandations recalculées : {articles} articles de {utilisateurs} utilisateurs.")
+                    a_recalculer = False
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"Importation #{job.id} : démarrage...")
+            job = run_job(job)
+            # Une tâche en échec a pu valider des lots avant l'erreur.
+            if job.items_processed and not options['skip_recommendations']:
+                a_recalculer = True
+            if job.status == 'DONE':
+                self.stdout.write(self.style.SUCCESS(
+                    f"Importation #{job.id} : {job.items_processed} articles en {job.duration:.1f} s."
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"Importation #{job.id} : échec ({'; '.join(job.errors)})"))
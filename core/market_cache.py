@@ -0,0 +1,164 @@
+# Fichier: core/market_cache.py
+
+"""
+Cache des réponses publiques du marché, indexé sur une version globale.
+
+Chaque écriture de données de marché (import de circulaire, rabais soumis,
+prix communautaire, confirmation) incrémente MarketDataVersion une fois la
+transaction validée. Les endpoints publics décorés par @versioned_response
+mettent leur réponse en cache sous cette version et émettent un ETag fort :
+un client qui renvoie If-None-Match reçoit un 304 sans aucun calcul.
+
+La version vit en base : tous les processus gunicorn la voient, même si
+chacun a son propre cache local.
+
+Une vue peut retourner une Response de DRF : elle est rendue dans le format
+négocié (qui fait partie de la clé), sauf pour l'API explorable (HTML),
+propre à l'utilisateur connecté et jamais mise en cache.
+
+Avec precompress=True, la réponse est aussi compressée (gzip, et brotli si le
+module est installé) une seule fois par version, puis servie telle quelle
+selon l'en-tête Accept-Encoding du client.
+"""
+
+import functools
+import gzip
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from rest_framework.response import Response
+
+from core.models import MarketDataVersion
+
+try:
+    import brotli
+except ImportError:  # Dépendance optionnelle : on se limite alors à gzip.
+    brotli = None
+
+CACHE_TIMEOUT = 60 * 60 * 24
+# Brotli 11 est environ 100 fois plus lent que 9 pour un gain marginal :
+# la compression est faite dans le cycle de la requête qui remplit le cache.
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+def get_market_version():
+    version = MarketDataVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+    return version or 0
+
+
+def _bump():
+    if not MarketDataVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        MarketDataVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def bump_market_version():
+    """
+    Invalide toutes les réponses en cache. Appelé après validation de la
+    transaction, pour qu'aucun processus ne mette en cache un état non validé
+    sous la nouvelle version.
+    """
+    transaction.on_commit(_bump)
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def _compress(content):
+    variants = {'identity': content, 'gzip': gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=BROTLI_QUALITY)
+    return variants
+
+
+def _negotiate(request, available):
+    """ Choisit le codage préféré disponible parmi br, gzip, identity. """
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    for coding in ('br', 'gzip'):
+        if coding in available and accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return 'identity'
+
+
+def _render(response, request, args, kwargs):
+    """ Rend une Response de DRF dans le format négocié, comme APIView.finalize_response. """
+    response.accepted_renderer = request.accepted_renderer
+    response.accepted_media_type = request.accepted_media_type
+    response.renderer_context = {'view': request.parser_context['view'], 'args': args, 'kwargs': kwargs, 'request': request}
+    response.render()
+
+
+def versioned_response(name, precompress=False):
+    """
+    Décorateur pour les endpoints GET publics dont la réponse ne dépend que
+    des données de marché, des paramètres de la requête et de l'heure
+    courante (les fenêtres « actif aujourd'hui » / « 7 derniers jours »).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            version = get_market_version()
+            params = '&'.join(sorted(f"{k}={v}" for k, values in request.GET.lists() for v in values))
+            periode = timezone.now().strftime('%Y-%m-%d-%H')
+            media_type = getattr(request, 'accepted_media_type', '')
+            key = f"market:{name}:{version}:{periode}:{media_type}:{params}"
+            etag_base = f"{version}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+            coding = 'identity'
+            # Le mode ?stream=1 n'est jamais matérialisé, donc jamais précompressé.
+            if precompress and request.GET.get('stream') != '1':
+                coding = _negotiate(request, ('br', 'gzip') if brotli is not None else ('gzip',))
+            # Un ETag fort par représentation : les octets diffèrent selon le codage.
+            etag = f'"{etag_base}"' if coding == 'identity' else f'"{etag_base}-{coding}"'
+
+            if _etag_matches(request, etag):
+                response = HttpResponseNotModified()
+            else:
+                cached = cache.get(key)
+                if cached is None:
+                    rendered = view(request, *args, **kwargs)
+                    if rendered.status_code != 200:
+                        return rendered
+                    if isinstance(rendered, Response):
+                        if media_type.startswith('text/html'):
+                            return rendered
+                        _render(rendered, request, args, kwargs)
+                    if rendered.streaming:
+                        # Réponse en flux : jamais matérialisée, donc pas mise en cache.
+                        rendered['ETag'] = etag
+                        rendered['Cache-Control'] = 'public, no-cache'
+                        return rendered
+                    variants = _compress(rendered.content) if precompress else {'identity': rendered.content}
+                    cached = (variants, rendered['Content-Type'])
+                    cache.set(key, cached, CACHE_TIMEOUT)
+                variants, content_type = cached
+                response = HttpResponse(variants[coding], content_type=content_type)
+                if coding != 'identity':
+                    response['Content-Encoding'] = coding
+
+            response['ETag'] = etag
+            response['Cache-Control'] = 'public, no-cache'
+            if precompress:
+                response['Vary'] = 'Accept-Encoding'
+            return response
+        return wrapper
+    return decorator
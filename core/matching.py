@@ -0,0 +1,198 @@
+# Fichier: core/matching.py
+
+"""
+Index inversé de n-grammes de caractères pour associer les articles d'une
+liste d'épicerie aux noms de produits en rabais.
+
+Il remplace le balayage de tous les prix (« item in nom ») suivi d'un
+difflib.get_close_matches sur toute la liste de noms : seuls les noms qui
+partagent des n-grammes avec l'article sont examinés.
+
+- Sous-chaîne : un nom qui contient l'article contient tous ses trigrammes ;
+  on intersecte leurs listes puis on vérifie.
+- Flou : difflib peut accepter un nom qui ne partage aucun trigramme avec
+  l'article (« pome » / « fromage »). Les candidats sont donc présélectionnés
+  sur les bigrammes, plus permissifs, puis notés par difflib.
+
+TfidfMatcher est une alternative au match flou par difflib : similarité
+cosinus TF-IDF sur les trigrammes de caractères, calculée pour toute la liste
+d'épicerie en un seul produit de matrices creuses. Il demande NumPy et SciPy
+(requirements.txt) ; TFIDF_AVAILABLE indique s'ils sont installés, sans quoi
+le match 'tfidf' retombe sur difflib.
+"""
+
+import difflib
+import heapq
+from collections import defaultdict
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # Dépendances optionnelles : seul le match difflib est alors offert.
+    np = sparse = None
+
+TFIDF_AVAILABLE = np is not None
+# Similarité cosinus minimale, l'équivalent du seuil 0.5 de difflib.
+TFIDF_CUTOFF = 0.3
+
+# Nombre de noms candidats (par bigrammes communs) passés à difflib pour le match flou.
+FUZZY_CANDIDATES = 100
+
+
+def _grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _bigrams(text):
+    # Le bourrage donne des bigrammes aux noms d'une lettre et favorise les débuts et fins.
+    text = f" {text} "
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class TrigramIndex:
+    """
+    Index des noms (déjà normalisés) d'un catalogue. Chaque nom n'est indexé
+    qu'une fois ; les positions retournées renvoient à 'names'.
+    """
+    __slots__ = ('names', '_postings', '_bigram_postings', '_bigram_sizes')
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._postings = defaultdict(list)
+        self._bigram_postings = defaultdict(list)
+        self._bigram_sizes = []
+        for position, name in enumerate(self.names):
+            for gram in _grams(name):
+                self._postings[gram].append(position)
+            bigrams = _bigrams(name)
+            for gram in bigrams:
+                self._bigram_postings[gram].append(position)
+            self._bigram_sizes.append(len(bigrams))
+
+    def substring_matches(self, query):
+        """ Positions des noms qui contiennent 'query', en ordre croissant. """
+        if len(query) < 3:
+            # Trop court pour un trigramme : balayage simple (rare et bon marché).
+            return [position for position, name in enumerate(self.names) if query in name]
+
+        postings = sorted((self._postings.get(gram, ()) for gram in _grams(query)), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return sorted(position for position in candidates if query in self.names[position])
+
+    def scored_matches(self, query, cutoff=0.5):
+        """
+        Paires (score difflib, position) d'au moins 'cutoff', parmi les noms
+        qui partagent le plus de bigrammes avec 'query'. Non triées.
+        """
+        grams = _bigrams(query)
+        shared = defaultdict(int)
+        for gram in grams:
+            for position in self._bigram_postings.get(gram, ()):
+                shared[position] += 1
+        if not shared:
+            return []
+
+        # Coefficient de Dice sur les bigrammes pour présélectionner les candidats.
+        size = len(grams)
+        candidates = heapq.nlargest(
+            FUZZY_CANDIDATES, shared,
+            key=lambda position: 2 * shared[position] / (size + self._bigram_sizes[position]),
+        )
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for position in candidates:
+            matcher.set_seq1(self.names[position])
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff and matcher.ratio() >= cutoff:
+                scored.append((matcher.ratio(), position))
+        return scored
+
+
+def _tfidf_grams(text):
+    return _grams(f" {text} ")
+
+
+class TfidfWeights:
+    """
+    Vocabulaire de trigrammes et IDF lissé appris sur un ensemble de noms.
+    Partagé par plusieurs TfidfMatcher, il rend leurs scores comparables.
+    """
+    __slots__ = ('vocabulary', 'idf')
+
+    def __init__(self, names):
+        self.vocabulary = {}
+        cols = []
+        count = 0
+        for name in names:
+            count += 1
+            for gram in _tfidf_grams(name):
+                cols.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+        df = np.bincount(np.asarray(cols, dtype=np.int64), minlength=len(self.vocabulary))
+        self.idf = np.log((1 + count) / (1 + df)) + 1
+
+
+class TfidfMatcher:
+    """
+    Vecteurs TF-IDF (trigrammes binaires, IDF lissé, normes L2) des noms d'un
+    catalogue. L'IDF vient de 'weights' (appris sur ces seuls noms par
+    défaut) ; les trigrammes absents de son vocabulaire sont ignorés.
+    """
+    __slots__ = ('_vocabulary', '_idf', '_matrix')
+
+    def __init__(self, names, weights=None):
+        names = list(names)
+        weights = weights or TfidfWeights(names)
+        self._vocabulary = weights.vocabulary
+        self._idf = weights.idf
+        rows, cols = [], []
+        for position, name in enumerate(names):
+            for gram in _tfidf_grams(name):
+                col = self._vocabulary.get(gram)
+                if col is not None:
+                    rows.append(position)
+                    cols.append(col)
+        self._matrix = self._normalized(rows, cols, len(names)).T.tocsr()
+
+    def _normalized(self, rows, cols, count):
+        cols = np.asarray(cols, dtype=np.int64)
+        matrix = sparse.csr_matrix(
+            (self._idf[cols], (np.asarray(rows, dtype=np.int64), cols)),
+            shape=(count, len(self._vocabulary)),
+        )
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ matrix
+
+    def scored_matches(self, queries, n=5, cutoff=TFIDF_CUTOFF):
+        """
+        Pour chaque requête, les n meilleures paires (score, position) d'au
+        moins 'cutoff', du meilleur au moins bon score.
+        """
+        rows, cols = [], []
+        for row, query in enumerate(queries):
+            for gram in _tfidf_grams(query):
+                col = self._vocabulary.get(gram)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        scores = (self._normalized(rows, cols, len(queries)) @ self._matrix).tocsr()
+
+        results = []
+        for row in range(len(queries)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            values, positions = scores.data[start:end], scores.indices[start:end]
+            keep = values >= cutoff
+            values, positions = values[keep], positions[keep]
+            if len(values) > n:
+                best = np.argpartition(-values, n - 1)[:n]
+                values, positions = values[best], positions[best]
+            order = np.argsort(-values, kind='stable')
+            results.append([(float(values[i]), int(positions[i])) for i in order])
+        return results
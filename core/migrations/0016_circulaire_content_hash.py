@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='circulaire',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', help_text='Empreinte canonique du contenu importé', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='circulaire',
+            index=models.Index(fields=['commerce', 'date_debut', 'date_fin'], name='circulaire_periode_idx'),
+        ),
+    ]
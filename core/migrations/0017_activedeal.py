@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_circulaire_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveDeal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('produit_nom', models.CharField(max_length=255)),
+                ('marque', models.CharField(blank=True, max_length=100, null=True)),
+                ('commerce_nom', models.CharField(max_length=200)),
+                ('categorie_nom', models.CharField(blank=True, max_length=100, null=True)),
+                ('prix', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('details_prix', models.CharField(blank=True, max_length=100, null=True)),
+                ('submitted_by_username', models.CharField(blank=True, max_length=150, null=True)),
+                ('circulaire', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.circulaire')),
+                ('commerce', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.commerce')),
+                ('price_entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='active_deal', to='core.prix')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.produit')),
+            ],
+            options={
+                'verbose_name': 'Rabais actif',
+                'verbose_name_plural': 'Rabais actifs',
+                'indexes': [models.Index(fields=['snapshot_date', 'price_entry'], name='activedeal_date_prix_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_activedeal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
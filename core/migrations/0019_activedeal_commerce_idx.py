@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_marketdataversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activedeal',
+            index=models.Index(fields=['snapshot_date', 'commerce', 'price_entry'], name='activedeal_commerce_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_activedeal_commerce_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activedeal',
+            name='prix_unitaire',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='activedeal',
+            name='quantite_lot',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='activedeal',
+            name='unite_mesure',
+            field=models.CharField(default='unite', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='prix',
+            name='prix_unitaire',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=4, help_text="Prix effectif d'une unité, d'un kg ou d'un litre", max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='prix',
+            name='quantite_lot',
+            field=models.PositiveIntegerField(default=1, help_text="Quantité d'une offre multiple (ex: 2 pour '2 pour 5.00$')"),
+        ),
+        migrations.AddField(
+            model_name='prix',
+            name='unite_mesure',
+            field=models.CharField(choices=[('unite', 'Unité'), ('kg', 'Kilogramme'), ('l', 'Litre')], default='unite', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='activedeal',
+            index=models.Index(fields=['snapshot_date', 'prix_unitaire', 'price_entry'], name='activedeal_prix_unitaire_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_prix_unitaire'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommerceAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=200, unique=True)),
+                ('commerce', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='core.commerce')),
+            ],
+            options={
+                'verbose_name': 'Alias de commerce',
+                'verbose_name_plural': 'Alias de commerces',
+            },
+        ),
+    ]
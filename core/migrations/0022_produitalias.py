@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_commercealias'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProduitAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terme', models.CharField(help_text="Nom d'article normalisé (ex: 'lait')", max_length=255)),
+                ('selections', models.PositiveIntegerField(default=0, help_text="Nombre d'utilisateurs ayant fait ce choix")),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='core.produit')),
+                ('selectionne_par', models.ManyToManyField(blank=True, related_name='produit_aliases', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Alias de produit',
+                'verbose_name_plural': 'Alias de produits',
+                'unique_together': {('terme', 'produit')},
+            },
+        ),
+    ]
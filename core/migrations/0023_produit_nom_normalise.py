@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:23
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Copie figée de core/text.py à cette migration : une évolution des règles de
+# normalisation ne doit pas changer ce que fait 'migrate' sur une base neuve
+# (backfill_nom_normalise recalcule les noms avec les règles courantes).
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss'})
+_UNITES = {
+    'g': 'g', 'gr': 'g', 'gramme': 'g', 'grammes': 'g',
+    'kg': 'kg', 'mg': 'mg',
+    'ml': 'ml', 'l': 'l', 'litre': 'l', 'litres': 'l',
+    'lb': 'lb', 'lbs': 'lb', 'livre': 'lb', 'livres': 'lb',
+    'oz': 'oz', 'un': 'un', 'unite': 'un', 'unites': 'un',
+    '%': '%',
+}
+_QUANTITE_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(' + '|'.join(sorted(map(re.escape, _UNITES), key=len, reverse=True)) + r')(?![a-z])')
+_SEPARATEURS_RE = re.compile(r"[^a-z0-9%.]+|(?<!\d)\.|\.(?!\d)")
+
+
+def _singular(word):
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith('eaux'):
+        return word[:-1]
+    if word.endswith('aux'):
+        return word[:-3] + 'al'
+    if word.endswith(('s', 'x')) and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def normalize_name(text):
+    text = str(text or '').lower().translate(_LIGATURES)
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    text = _QUANTITE_RE.sub(lambda m: m.group(1).replace(',', '.') + _UNITES[m.group(2)], text)
+    return ' '.join(_singular(word) for word in _SEPARATEURS_RE.sub(' ', text).split())
+
+
+def remplir_nom_normalise(apps, schema_editor):
+    """ Calcule nom_normalise des produits existants, par lots d'identifiants. """
+    Produit = apps.get_model('core', 'Produit')
+    dernier_id = 0
+    while True:
+        lot = list(Produit.objects.filter(id__gt=dernier_id).order_by('id').only('id', 'nom')[:BATCH_SIZE])
+        if not lot:
+            break
+        dernier_id = lot[-1].id
+        for produit in lot:
+            produit.nom_normalise = normalize_name(produit.nom)
+        Produit.objects.bulk_update(lot, ['nom_normalise'])
+
+
+def renormaliser_alias(apps, schema_editor):
+    """
+    Les termes des alias appris étaient seulement en minuscules : ils passent
+    par la même normalisation que les noms. Deux alias qui deviennent le même
+    (terme, produit) sont fusionnés, leurs utilisateurs réunis.
+    """
+    ProduitAlias = apps.get_model('core', 'ProduitAlias')
+    for alias in ProduitAlias.objects.order_by('id'):
+        terme = normalize_name(alias.terme)[:255]
+        if terme == alias.terme:
+            continue
+        cible = ProduitAlias.objects.filter(terme=terme, produit_id=alias.produit_id).first()
+        if cible is None:
+            alias.terme = terme
+            alias.save(update_fields=['terme'])
+            continue
+        cible.selectionne_par.add(*alias.selectionne_par.all())
+        cible.selections = cible.selectionne_par.count()
+        cible.save(update_fields=['selections'])
+        alias.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_produitalias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='nom_normalise',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(remplir_nom_normalise, migrations.RunPython.noop),
+        migrations.RunPython(renormaliser_alias, migrations.RunPython.noop),
+    ]
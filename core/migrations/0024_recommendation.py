@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_produit_nom_normalise'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terme', models.CharField(help_text="Nom d'article normalisé au moment du calcul", max_length=255)),
+                ('deals', models.JSONField(blank=True, default=list)),
+                ('version', models.BigIntegerField(default=0, help_text='Version des données de marché utilisée')),
+                ('date_calcul', models.DateTimeField(auto_now=True)),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recommendation', to='core.shoppinglistitem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Fichier: core/migrations/0025_produit_recherche.py
+
+from django.db import migrations
+
+# DDL figé à cette migration ; core/search.py garde sa propre copie, réappliquée après chaque migrate.
+FTS_TABLE = 'core_produit_fts'
+
+SQLITE_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS core_produit_fts_ai AFTER INSERT ON core_produit BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, nom_normalise, marque) VALUES (new.id, new.nom_normalise, new.marque);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS core_produit_fts_ad AFTER DELETE ON core_produit BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nom_normalise, marque) VALUES ('delete', old.id, old.nom_normalise, old.marque);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS core_produit_fts_au AFTER UPDATE OF nom_normalise, marque ON core_produit BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nom_normalise, marque) VALUES ('delete', old.id, old.nom_normalise, old.marque);
+        INSERT INTO {FTS_TABLE}(rowid, nom_normalise, marque) VALUES (new.id, new.nom_normalise, new.marque);
+    END""",
+)
+
+POSTGRES_STATEMENTS = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS core_produit_nom_normalise_trgm ON core_produit USING gin (nom_normalise gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS core_produit_marque_trgm ON core_produit USING gin (UPPER(marque) gin_trgm_ops)",
+)
+
+
+def _sqlite_has_fts5(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.fts5_test USING fts5(x)")
+        cursor.execute("DROP TABLE temp.fts5_test")
+        return True
+    except Exception:
+        return False
+
+
+def installer(apps, schema_editor):
+    """ FTS5 sur SQLite, pg_trgm et index GIN sur PostgreSQL (voir core/search.py). """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRES_STATEMENTS:
+                cursor.execute(statement)
+            return
+        if connection.vendor != 'sqlite' or not _sqlite_has_fts5(cursor):
+            return
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "nom_normalise, marque, content='core_produit', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def desinstaller(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for trigger in ('core_produit_fts_ai', 'core_produit_fts_ad', 'core_produit_fts_au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS core_produit_nom_normalise_trgm")
+            cursor.execute("DROP INDEX IF EXISTS core_produit_marque_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_recommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(installer, desinstaller),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_produit_recherche'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProduitRedirection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancien_id', models.BigIntegerField(unique=True)),
+                ('ancien_nom', models.CharField(db_index=True, max_length=255)),
+                ('ancien_marque', models.CharField(blank=True, default='', max_length=100)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redirections', to='core.produit')),
+            ],
+            options={
+                'verbose_name': 'Redirection de produit',
+                'verbose_name_plural': 'Redirections de produits',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def compter_confirmations(apps, schema_editor):
+    """ Recopie le nombre de confirmations existantes, en une seule requête UPDATE. """
+    Prix = apps.get_model('core', 'Prix')
+    Confirmation = Prix.confirmations.through
+    nombre = Confirmation.objects.filter(prix_id=OuterRef('pk')).values('prix_id').annotate(n=Count('id')).values('n')
+    Prix.objects.update(confirmations_count=Coalesce(Subquery(nombre), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_produitredirection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prix',
+            name='confirmations_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compter_confirmations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_prix_confirmations_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Nombre de fois où un worker a réservé la tâche'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='date_progress',
+            field=models.DateTimeField(blank=True, help_text='Dernier signe de vie du worker', null=True),
+        ),
+    ]
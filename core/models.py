@@ -1,11 +1,17 @@
 # Fichier: core/models.py
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator
-from django.db.models import F
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.text import normalize_name
 
 # Create your models here.
 
@@ -25,6 +31,30 @@ class Commerce(models.Model):
         verbose_name = "Commerce"
         verbose_name_plural = "Commerces"
 
+class CommerceAlias(models.Model):
+    """
+    Autre nom sous lequel les clients désignent un commerce (ex: 'Super C'
+    pour 'Super C Fleury'). Consulté avant la recherche par sous-chaîne de
+    l'optimiseur ; l'alias est enregistré en minuscules.
+    """
+    alias = models.CharField(max_length=200, unique=True)
+    commerce = models.ForeignKey(Commerce, on_delete=models.CASCADE, related_name="aliases")
+
+    def clean(self):
+        # Avant validate_unique : « IGA » après « iga » est une erreur de formulaire, pas une IntegrityError.
+        self.alias = (self.alias or '').strip().lower()
+
+    def save(self, *args, **kwargs):
+        self.alias = self.alias.strip().lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.alias} → {self.commerce.nom}"
+
+    class Meta:
+        verbose_name = "Alias de commerce"
+        verbose_name_plural = "Alias de commerces"
+
 class Categorie(models.Model):
     nom = models.CharField(max_length=100, unique=True)
 
@@ -44,6 +74,16 @@ class Produit(models.Model):
     # Plus tard, on pourrait faire de 'catégorie' son propre modèle avec une clé étrangère
     categorie = models.ForeignKey(Categorie, on_delete=models.SET_NULL, null=True, blank=True, help_text="Catégorie du produit")
     code_barres = models.CharField(max_length=50, blank=True, null=True, unique=True, help_text="Le code-barres UPC du produit")
+    # Calculé à l'enregistrement (voir core/text.py) ; les insertions groupées le remplissent elles-mêmes.
+    # Indexé pour les recherches par égalité et par préfixe ; les sous-chaînes passent par core/search.py (FTS5, pg_trgm).
+    nom_normalise = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.nom_normalise = normalize_name(self.nom)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nom' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nom_normalise'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if self.marque:
@@ -54,6 +94,45 @@ class Produit(models.Model):
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
 
+class ProduitAlias(models.Model):
+    """
+    Association apprise entre un nom d'article de liste d'épicerie (normalisé)
+    et un produit : chaque rabais choisi dans l'optimiseur l'enregistre. Les
+    choix sont comptés une fois par utilisateur.
+    """
+    terme = models.CharField(max_length=255, help_text="Nom d'article normalisé (ex: 'lait')")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name="aliases")
+    selectionne_par = models.ManyToManyField(User, related_name="produit_aliases", blank=True)
+    selections = models.PositiveIntegerField(default=0, help_text="Nombre d'utilisateurs ayant fait ce choix")
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.terme} → {self.produit.nom} ({self.selections})"
+
+    class Meta:
+        verbose_name = "Alias de produit"
+        verbose_name_plural = "Alias de produits"
+        unique_together = ('terme', 'produit')
+
+class ProduitRedirection(models.Model):
+    """
+    Produit fusionné dans un produit canonique par la commande
+    dedupe_produits. L'ancien identifiant et l'ancien nom continuent de
+    désigner le produit canonique (soumission de prix, importation).
+    """
+    ancien_id = models.BigIntegerField(unique=True)
+    ancien_nom = models.CharField(max_length=255, db_index=True)
+    ancien_marque = models.CharField(max_length=100, blank=True, default='')
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name="redirections")
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.ancien_nom} (#{self.ancien_id}) → {self.produit.nom}"
+
+    class Meta:
+        verbose_name = "Redirection de produit"
+        verbose_name_plural = "Redirections de produits"
+
 class Circulaire(models.Model):
     """
     Représente une circulaire pour un commerce, avec une période de validité.
@@ -61,6 +140,7 @@ class Circulaire(models.Model):
     commerce = models.ForeignKey(Commerce, on_delete=models.CASCADE, help_text="Le commerce associé à cette circulaire")
     date_debut = models.DateField(help_text="Date de début de validité de la circulaire")
     date_fin = models.DateField(help_text="Date de fin de validité de la circulaire")
+    content_hash = models.CharField(max_length=64, blank=True, default='', help_text="Empreinte canonique du contenu importé")
     
     def __str__(self):
         return f"Circulaire pour {self.commerce.nom} ({self.date_debut} au {self.date_fin})"
@@ -68,21 +148,39 @@ class Circulaire(models.Model):
     class Meta:
         verbose_name = "Circulaire"
         verbose_name_plural = "Circulaires"
+        indexes = [
+            models.Index(fields=['commerce', 'date_debut', 'date_fin'], name='circulaire_periode_idx'),
+        ]
 
 class Prix(models.Model):
     """
     Le prix d'un produit spécifique dans un commerce, potentiellement lié à une circulaire.
     """
+    UNITE_CHOICES = [
+        ('unite', 'Unité'),
+        ('kg', 'Kilogramme'),
+        ('l', 'Litre'),
+    ]
+
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name="prix")
     commerce = models.ForeignKey(Commerce, on_delete=models.CASCADE, related_name="prix")
     circulaire = models.ForeignKey(Circulaire, on_delete=models.SET_NULL, null=True, blank=True, related_name="prix")
     
     prix = models.DecimalField(max_digits=10, decimal_places=2, help_text="Le prix de l'article")
     details_prix = models.CharField(max_length=100, blank=True, null=True, help_text="Détails additionnels (ex: '2 pour 5.00$', 'par livre')")
+
+    # Calculés à l'écriture à partir de details_prix (voir core/pricing.py).
+    prix_unitaire = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, db_index=True, help_text="Prix effectif d'une unité, d'un kg ou d'un litre")
+    quantite_lot = models.PositiveIntegerField(default=1, help_text="Quantité d'une offre multiple (ex: 2 pour '2 pour 5.00$')")
+    unite_mesure = models.CharField(max_length=10, choices=UNITE_CHOICES, default='unite')
     
     submitted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="submitted_prices")
     
     confirmations = models.ManyToManyField(User, related_name="confirmed_prices", blank=True)
+    # Tenu à jour par confirm_price, et par les signaux plus bas pour les autres
+    # écritures (admin, suppression d'un utilisateur) ; pour lister les prix sans
+    # joindre la table des confirmations.
+    confirmations_count = models.PositiveIntegerField(default=0, editable=False)
     
     date_mise_a_jour = models.DateTimeField(auto_now=True)
 
@@ -93,6 +191,50 @@ class Prix(models.Model):
         verbose_name = "Prix"
         verbose_name_plural = "Prix"
 
+class ActiveDeal(models.Model):
+    """
+    Copie dénormalisée d'un prix de circulaire active à 'snapshot_date'.
+    Reconstruite par core/active_deals.py ; ne pas modifier à la main.
+    """
+    price_entry = models.OneToOneField(Prix, on_delete=models.CASCADE, related_name="active_deal")
+    circulaire = models.ForeignKey(Circulaire, on_delete=models.CASCADE, related_name="+")
+    commerce = models.ForeignKey(Commerce, on_delete=models.CASCADE, related_name="+")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name="+")
+    snapshot_date = models.DateField()
+
+    produit_nom = models.CharField(max_length=255)
+    marque = models.CharField(max_length=100, blank=True, null=True)
+    commerce_nom = models.CharField(max_length=200)
+    categorie_nom = models.CharField(max_length=100, blank=True, null=True)
+    prix = models.DecimalField(max_digits=10, decimal_places=2)
+    details_prix = models.CharField(max_length=100, blank=True, null=True)
+    prix_unitaire = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    quantite_lot = models.PositiveIntegerField(default=1)
+    unite_mesure = models.CharField(max_length=10, default='unite')
+    submitted_by_username = models.CharField(max_length=150, blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.produit_nom} chez {self.commerce_nom} - {self.prix}$ ({self.snapshot_date})"
+
+    class Meta:
+        verbose_name = "Rabais actif"
+        verbose_name_plural = "Rabais actifs"
+        indexes = [
+            models.Index(fields=['snapshot_date', 'price_entry'], name='activedeal_date_prix_idx'),
+            models.Index(fields=['snapshot_date', 'commerce', 'price_entry'], name='activedeal_commerce_idx'),
+            models.Index(fields=['snapshot_date', 'prix_unitaire', 'price_entry'], name='activedeal_prix_unitaire_idx'),
+        ]
+
+class MarketDataVersion(models.Model):
+    """
+    Compteur global (une seule ligne) incrémenté à chaque écriture de données
+    de marché. Partagé par tous les processus via la base ; voir core/market_cache.py.
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Version des données de marché : {self.version}"
+
 class Profile(models.Model):
     """ Modèle pour étendre les fonctionnalités du modèle User de base. """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
@@ -114,6 +256,108 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
     # get_or_create est la méthode la plus sûre ici.
     Profile.objects.get_or_create(user=instance)
 
+@receiver(post_save, sender=Commerce)
+@receiver(post_delete, sender=Commerce)
+@receiver(post_save, sender=CommerceAlias)
+@receiver(post_delete, sender=CommerceAlias)
+def invalidate_store_names(sender, **kwargs):
+    """ Les noms et alias de commerces sont mis en cache avec la version des données de marché. """
+    from core.market_cache import bump_market_version
+    bump_market_version()
+
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance, **kwargs):
+    """ Jeton supprimé (déconnexion) : voir core/api/authentication.py. """
+    from core.api.authentication import token_cache_key
+    cache.delete(token_cache_key(instance.key))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user_tokens(sender, instance, **kwargs):
+    from core.api.authentication import token_cache_key
+    cache.delete_many([token_cache_key(key) for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True)])
+
+@receiver(post_save, sender=Prix)
+@receiver(post_delete, sender=Prix)
+def invalidate_market_prices(sender, **kwargs):
+    """ Toute écriture d'un prix (admin compris) invalide les listes en cache. """
+    from core.market_cache import bump_market_version
+    bump_market_version()
+
+@receiver(post_save, sender=Produit)
+def index_product_name(sender, instance, **kwargs):
+    """ Autocomplétion du processus à jour dès la validation (voir core/autocomplete.py). """
+    from core.autocomplete import autocomplete
+    transaction.on_commit(lambda: autocomplete.product_saved(instance))
+
+@receiver(post_delete, sender=Produit)
+def unindex_product_name(sender, instance, **kwargs):
+    from core.autocomplete import autocomplete
+    produit_id = instance.id
+    transaction.on_commit(lambda: autocomplete.product_deleted(produit_id))
+
+def recount_confirmations(prix_ids):
+    """ Recalcule confirmations_count des prix 'prix_ids' depuis la table des confirmations. """
+    Confirmation = Prix.confirmations.through
+    nombre = Confirmation.objects.filter(prix_id=OuterRef('pk')).values('prix_id').annotate(n=Count('id')).values('n')
+    return Prix.objects.filter(id__in=list(prix_ids)).update(confirmations_count=Coalesce(Subquery(nombre), 0))
+
+@receiver(m2m_changed, sender=Prix.confirmations.through)
+def sync_confirmations_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Confirmations ajoutées ou retirées hors de confirm_price (admin, shell),
+    depuis un prix ou depuis un utilisateur (reverse).
+    """
+    if action == 'pre_clear' and reverse:
+        instance._cleared_price_ids = list(instance.confirmed_prices.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        prix_ids = [instance.pk]
+    elif action == 'post_clear':
+        prix_ids = getattr(instance, '_cleared_price_ids', [])
+    else:
+        prix_ids = pk_set or []
+    if prix_ids:
+        from core.market_cache import bump_market_version
+        recount_confirmations(prix_ids)
+        bump_market_version()
+
+@receiver(pre_delete, sender=User)
+def remember_confirmed_prices(sender, instance, **kwargs):
+    """ La suppression en cascade des confirmations n'envoie pas m2m_changed. """
+    instance._confirmed_price_ids = list(instance.confirmed_prices.values_list('id', flat=True))
+
+@receiver(post_delete, sender=User)
+def recount_after_user_deleted(sender, instance, **kwargs):
+    prix_ids = getattr(instance, '_confirmed_price_ids', None)
+    if prix_ids:
+        from core.market_cache import bump_market_version
+        recount_confirmations(prix_ids)
+        bump_market_version()
+
+@receiver(pre_save, sender=Produit)
+def remember_barcode(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'code_barres' not in update_fields:
+        instance._ancien_code_barres = instance.code_barres
+    else:
+        instance._ancien_code_barres = Produit.objects.filter(pk=instance.pk).values_list('code_barres', flat=True).first()
+
+@receiver(post_save, sender=Produit)
+@receiver(post_delete, sender=Produit)
+def forget_cached_barcode(sender, instance, **kwargs):
+    """ Un code-barres ajouté, modifié ou retiré ne doit pas rester « inconnu » ou rattaché en cache. """
+    ancien = getattr(instance, '_ancien_code_barres', None)
+    if kwargs['signal'] is post_save and instance.code_barres == ancien:
+        return
+    codes = [code for code in (instance.code_barres, ancien) if code]
+    if codes:
+        from core.barcodes import forget_barcodes
+        transaction.on_commit(lambda: forget_barcodes(codes))
+
 # --- NOUVEAU MODÈLE POUR LES SIGNALEMENTS ---
 class Report(models.Model):
     """ Modèle pour que les utilisateurs puissent signaler des données incorrectes. """
@@ -145,6 +389,47 @@ class Report(models.Model):
         # Un utilisateur ne peut signaler le même prix qu'une seule fois
         unique_together = ('price_entry', 'reported_by')
 
+# --- FILE D'ATTENTE DES IMPORTATIONS DE CIRCULAIRES ---
+class ImportJob(models.Model):
+    """
+    Importation de circulaire exécutée hors du cycle de requête.
+    Le document est écrit sur disque, puis traité par la commande run_import_worker.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('FAILED', 'Échec'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    fichier = models.CharField(max_length=500, help_text="Chemin du document JSON à importer")
+    submitted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="import_jobs")
+    items_processed = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0, help_text="Nombre de fois où un worker a réservé la tâche")
+    errors = models.JSONField(default=list, blank=True)
+    result = models.JSONField(default=dict, blank=True, help_text="Résumés des circulaires importées")
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_started = models.DateTimeField(null=True, blank=True)
+    date_progress = models.DateTimeField(null=True, blank=True, help_text="Dernier signe de vie du worker")
+    date_finished = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def duration(self):
+        """ Durée en secondes (jusqu'à maintenant si l'importation est en cours). """
+        if not self.date_started:
+            return None
+        fin = self.date_finished or timezone.now()
+        return (fin - self.date_started).total_seconds()
+
+    def __str__(self):
+        return f"Importation #{self.id} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['date_created']
+        verbose_name = "Importation de circulaire"
+        verbose_name_plural = "Importations de circulaires"
+
 # --- NOUVEAU MODÈLE POUR L'INVENTAIRE ---
 class InventoryCategory(models.Model):
     """ Représente une catégorie d'inventaire personnalisée pour un utilisateur. """
@@ -199,6 +484,24 @@ class ShoppingListItem(models.Model):
         ordering = ['date_added']
 
 
+class Recommendation(models.Model):
+    """
+    Meilleurs rabais précalculés pour un article de liste d'épicerie, tous
+    commerces confondus (voir core/recommendations.py). Recalculés après les
+    importations de circulaires ; 'terme' permet de repérer un article renommé
+    depuis le calcul.
+    """
+    item = models.OneToOneField(ShoppingListItem, on_delete=models.CASCADE, related_name="recommendation")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recommendations")
+    terme = models.CharField(max_length=255, help_text="Nom d'article normalisé au moment du calcul")
+    deals = models.JSONField(default=list, blank=True)
+    version = models.BigIntegerField(default=0, help_text="Version des données de marché utilisée")
+    date_calcul = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.terme} ({len(self.deals)} rabais) pour {self.user_id}"
+
+
 # --- NOUVEAU MODÈLE POUR LES RECETTES ---
 class Recipe(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recipes")
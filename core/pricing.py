@@ -0,0 +1,101 @@
+# Fichier: core/pricing.py
+
+"""
+Prix unitaire normalisé à partir du texte libre de Prix.details_prix.
+
+Le texte d'une circulaire ou d'une soumission ('2 pour 5,00$', '3/10$',
+'1,99$/lb', 'par livre', '0,89 $/100 g') est lu une seule fois, à l'écriture,
+pour remplir trois colonnes comparables en SQL :
+
+- prix_unitaire : prix effectif d'une unité vendue, ou d'un kilogramme / d'un
+  litre quand le prix est au poids ou au volume ;
+- quantite_lot  : nombre d'unités d'une offre multiple ('2 pour 5$' → 2) ;
+- unite_mesure  : 'unite', 'kg' ou 'l'.
+
+Comme parsing.py, ce module n'importe aucun modèle Django.
+"""
+
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+UNITE = 'unite'
+KILOGRAMME = 'kg'
+LITRE = 'l'
+
+UnitPrice = namedtuple('UnitPrice', ['prix_unitaire', 'quantite_lot', 'unite_mesure'])
+
+_QUANTUM = Decimal('0.0001')
+_LIVRE_EN_KG = Decimal('0.45359237')
+
+_MONTANT = r'(\d+(?:[.,]\d{1,2})?)'
+
+# '2 pour 5$', '2 / 5.00', '3/10$', '2 for $5'
+_LOT_RE = re.compile(r'(\d+)\s*(?:pour|for|/)\s*\$?\s*' + _MONTANT + r'(?![\d.,]|\s*(?:g|ml|kg|l)\b)', re.I)
+
+# '1,99$/lb', '$4.38/kg', '12,10 $ le kg', 'par livre', '/100 g'
+_TAUX_RE = re.compile(
+    r'(?:\$?\s*' + _MONTANT + r'\s*\$?\s*)?'
+    r'(?:/|\bpar\b|\ble\b|\bla\b|\bper\b)\s*'
+    r'(100\s*g|100\s*ml|lbs?|livres?|kg|kilos?|kilogrammes?|l|litres?)\b',
+    re.I,
+)
+
+# Facteur pour ramener un prix « par <unité lue> » à un prix par kg ou par litre.
+_UNITES = {
+    '100g': (KILOGRAMME, Decimal(10)),
+    '100ml': (LITRE, Decimal(10)),
+    'lb': (KILOGRAMME, 1 / _LIVRE_EN_KG),
+    'lbs': (KILOGRAMME, 1 / _LIVRE_EN_KG),
+    'livre': (KILOGRAMME, 1 / _LIVRE_EN_KG),
+    'livres': (KILOGRAMME, 1 / _LIVRE_EN_KG),
+    'kg': (KILOGRAMME, Decimal(1)),
+    'kilo': (KILOGRAMME, Decimal(1)),
+    'kilos': (KILOGRAMME, Decimal(1)),
+    'kilogramme': (KILOGRAMME, Decimal(1)),
+    'kilogrammes': (KILOGRAMME, Decimal(1)),
+    'l': (LITRE, Decimal(1)),
+    'litre': (LITRE, Decimal(1)),
+    'litres': (LITRE, Decimal(1)),
+}
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value).replace(',', '.'))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def parse_unit_price(details, prix):
+    """
+    Retourne un UnitPrice pour le texte 'details' et le prix numérique 'prix'.
+    Sans indication lisible, le prix unitaire est 'prix' lui-même (None s'il
+    est nul ou absent).
+    """
+    prix = _decimal(prix) if prix is not None else None
+    texte = details or ''
+
+    lot = _LOT_RE.search(texte)
+    if lot:
+        quantite, total = int(lot.group(1)), _decimal(lot.group(2))
+        if quantite >= 2 and total:
+            return UnitPrice((total / quantite).quantize(_QUANTUM), quantite, UNITE)
+
+    taux = []
+    for match in _TAUX_RE.finditer(texte):
+        unite, facteur = _UNITES[re.sub(r'\s+', '', match.group(2).lower())]
+        montant = _decimal(match.group(1)) if match.group(1) else prix
+        if montant:
+            taux.append((facteur == 1, unite, montant * facteur))
+    if taux:
+        # '5,49 $/lb 12,10 $/kg' : le prix déjà exprimé au kg est préféré à une conversion.
+        _, unite, valeur = max(taux, key=lambda t: t[0])
+        return UnitPrice(valeur.quantize(_QUANTUM), 1, unite)
+
+    return UnitPrice(prix.quantize(_QUANTUM) if prix else None, 1, UNITE)
+
+
+def unit_price_fields(details, prix):
+    """ Les colonnes Prix correspondantes, à passer tel quel à Prix(...). """
+    return parse_unit_price(details, prix)._asdict()
@@ -0,0 +1,132 @@
+# Fichier: core/recommendations.py
+
+"""
+Rabais recommandés précalculés pour les listes d'épicerie (table Recommendation).
+
+Après une importation de circulaires, compute_recommendations associe les
+articles de toutes les listes aux prix actifs, tous commerces confondus, et
+garde les TOP_DEALS premiers rabais de chaque article. La page de
+l'optimiseur peut alors s'afficher sans attendre le match.
+
+Les utilisateurs sont traités par groupes de USER_CHUNK_SIZE : seuls les
+articles d'un groupe sont en mémoire à la fois. Le match passe par le
+catalogue chaud (core/catalog.py), dont le cache de résultats par article
+fait qu'un même nom ("lait") n'est cherché qu'une fois pour tous les
+utilisateurs.
+
+Les importations par l'API appellent schedule_recommendations : le calcul
+est lancé après la validation de la transaction, dans un fil
+d'arrière-plan, pour ne pas retarder la réponse. Une importation qui se
+termine pendant un calcul en relance un seul autre à la fin de celui-ci.
+
+Entre deux calculs, une circulaire peut se terminer (changement de date) ou
+un prix communautaire expirer sans nouvelle version des données : les
+rabais servis sont donc d'abord filtrés par drop_inactive_deals.
+"""
+
+import threading
+import traceback
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.catalog import active_prices, catalog, normalize_item_name
+from core.market_cache import get_market_version
+from core.models import Recommendation, ShoppingListItem
+
+USER_CHUNK_SIZE = 500
+TOP_DEALS = 20
+BATCH_SIZE = 500
+
+
+def _recommend(user_ids, now, version, top):
+    items = list(
+        ShoppingListItem.objects.filter(user_id__in=user_ids).order_by('id').values_list('id', 'user_id', 'name')
+    )
+    termes = [normalize_item_name(name) for _, _, name in items]
+    uniques = list(dict.fromkeys(terme for terme in termes if terme))
+    deals, _ = catalog.find_deals([], uniques, now)
+    par_terme = dict(zip(uniques, deals))
+
+    rows = [
+        Recommendation(item_id=item_id, user_id=user_id, terme=terme[:255],
+                       deals=par_terme.get(terme, [])[:top], version=version)
+        for (item_id, user_id, _), terme in zip(items, termes)
+    ]
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id__in=user_ids).delete()
+        Recommendation.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def drop_inactive_deals(deal_lists, now):
+    """ Retire de chaque liste de rabais ceux dont le prix n'est plus actif (une requête). """
+    price_ids = {deal['price_id'] for deals in deal_lists for deal in deals}
+    actifs = set(active_prices(now.date()).filter(id__in=price_ids).values_list('id', flat=True)) if price_ids else set()
+    return [[deal for deal in deals if deal['price_id'] in actifs] for deals in deal_lists]
+
+
+def compute_recommendations(chunk_size=USER_CHUNK_SIZE, top=TOP_DEALS, on_progress=None):
+    """
+    Recalcule les recommandations de tous les utilisateurs ayant une liste.
+    'on_progress(utilisateurs, articles)' est appelé après chaque groupe.
+    Retourne (nombre d'utilisateurs, nombre d'articles).
+    """
+    # Le catalogue du processus peut dater d'avant l'importation qui vient de se terminer.
+    catalog.clear()
+    now = timezone.now()
+    version = get_market_version()
+
+    dernier_id = 0
+    utilisateurs = 0
+    articles = 0
+    while True:
+        user_ids = list(
+            ShoppingListItem.objects.filter(user_id__gt=dernier_id)
+            .order_by('user_id').values_list('user_id', flat=True).distinct()[:chunk_size]
+        )
+        if not user_ids:
+            break
+        dernier_id = user_ids[-1]
+        articles += _recommend(user_ids, now, version, top)
+        utilisateurs += len(user_ids)
+        if on_progress:
+            on_progress(utilisateurs, articles)
+    return utilisateurs, articles
+
+
+_lock = threading.Lock()
+_running = False
+_again = False
+
+
+def _run_in_background():
+    global _running, _again
+    try:
+        while True:
+            try:
+                compute_recommendations()
+            except Exception:
+                traceback.print_exc()
+            with _lock:
+                if not _again:
+                    _running = False
+                    return
+                _again = False
+    finally:
+        connection.close()
+
+
+def _start():
+    global _running, _again
+    with _lock:
+        if _running:
+            _again = True
+            return
+        _running = True
+    threading.Thread(target=_run_in_background, daemon=True).start()
+
+
+def schedule_recommendations():
+    """ Recalcule les recommandations en arrière-plan une fois la transaction en cours validée. """
+    transaction.on_commit(_start)
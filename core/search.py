@@ -0,0 +1,146 @@
+# Fichier: core/search.py
+
+"""
+Recherche plein texte des produits (endpoint /api/products/search/).
+
+- SQLite : table virtuelle FTS5 'core_produit_fts' à contenu externe
+  (colonnes nom_normalise et marque de core_produit), tenue à jour par des
+  déclencheurs : toute écriture sur Produit, y compris bulk_create et
+  QuerySet.update, est indexée. Classement par bm25, le nom pesant plus que
+  la marque ; chaque mot cherché est un préfixe ("pat" trouve "Pâtes").
+- PostgreSQL : extension pg_trgm et index GIN trigrammes sur nom_normalise
+  et UPPER(marque), qui servent les filtres LIKE ; classement par similarité
+  de mots (TrigramWordSimilarity).
+- Autres bases, ou SQLite compilé sans FTS5 : filtre par sous-chaîne, trié
+  par nom.
+
+Dans tous les cas chaque mot doit se trouver dans le nom ou la marque, et au
+plus MAX_RESULTS produits sont retournés.
+
+La migration 0025 crée l'index avec sa propre copie de ces instructions ;
+install_search_index est appelée après chaque migrate : sur SQLite, une
+migration qui reconstruit core_produit (ALTER TABLE émulé) supprime les
+déclencheurs, qui sont alors recréés et l'index reconstruit.
+"""
+
+from django.db import connection
+from django.db.models import Q
+
+from core.models import Produit
+from core.text import normalize_name
+
+DEFAULT_LIMIT = 20
+MAX_RESULTS = 50
+FTS_TABLE = 'core_produit_fts'
+# Poids bm25 des colonnes (nom_normalise, marque).
+FTS_WEIGHTS = (10.0, 2.0)
+
+_SQLITE_TRIGGERS = {
+    'core_produit_fts_ai': f"""
+        CREATE TRIGGER core_produit_fts_ai AFTER INSERT ON core_produit BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, nom_normalise, marque) VALUES (new.id, new.nom_normalise, new.marque);
+        END""",
+    'core_produit_fts_ad': f"""
+        CREATE TRIGGER core_produit_fts_ad AFTER DELETE ON core_produit BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nom_normalise, marque) VALUES ('delete', old.id, old.nom_normalise, old.marque);
+        END""",
+    'core_produit_fts_au': f"""
+        CREATE TRIGGER core_produit_fts_au AFTER UPDATE OF nom_normalise, marque ON core_produit BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, nom_normalise, marque) VALUES ('delete', old.id, old.nom_normalise, old.marque);
+            INSERT INTO {FTS_TABLE}(rowid, nom_normalise, marque) VALUES (new.id, new.nom_normalise, new.marque);
+        END""",
+}
+
+_POSTGRES_STATEMENTS = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS core_produit_nom_normalise_trgm ON core_produit USING gin (nom_normalise gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS core_produit_marque_trgm ON core_produit USING gin (UPPER(marque) gin_trgm_ops)",
+)
+
+_fts_available = None
+
+
+def _sqlite_has_fts5(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if cursor.fetchone()[0]:
+        return True
+    # Certaines compilations chargent FTS5 sans l'annoncer.
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.fts5_test USING fts5(x)")
+        cursor.execute("DROP TABLE temp.fts5_test")
+        return True
+    except Exception:
+        return False
+
+
+def install_search_index(using_connection=None):
+    """ Crée (ou recrée) l'index de recherche de la base ; sans effet s'il est complet. """
+    global _fts_available
+    _fts_available = None
+    conn = using_connection or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            for statement in _POSTGRES_STATEMENTS:
+                cursor.execute(statement)
+            return
+        if conn.vendor != 'sqlite' or not _sqlite_has_fts5(cursor):
+            return
+
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "nom_normalise, marque, content='core_produit', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'core_produit'")
+        existants = {row[0] for row in cursor.fetchall()}
+        manquants = [name for name in _SQLITE_TRIGGERS if name not in existants]
+        for name in manquants:
+            cursor.execute(_SQLITE_TRIGGERS[name])
+        if manquants:
+            # Des écritures ont pu échapper à l'index : on le relit depuis core_produit.
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _use_fts():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def _fts_query(mots):
+    # Chaque mot entre guillemets (les caractères spéciaux de FTS5 restent littéraux), en préfixe.
+    return ' '.join('"{}"*'.format(mot.replace('"', '""')) for mot in mots)
+
+
+def _contains_filter(mots):
+    condition = Q()
+    for mot in mots:
+        condition &= Q(nom_normalise__contains=mot) | Q(marque__icontains=mot)
+    return condition
+
+
+def search_products(query, limit=DEFAULT_LIMIT):
+    """ Produits correspondant à 'query', du plus au moins pertinent ; au plus MAX_RESULTS. """
+    limit = max(1, min(limit, MAX_RESULTS))
+    mots = normalize_name(query).split()
+    if not mots:
+        return []
+
+    if _use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, %s, %s), rowid LIMIT %s",
+                [_fts_query(mots), *FTS_WEIGHTS, limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        produits = Produit.objects.in_bulk(ids)
+        return [produits[produit_id] for produit_id in ids if produit_id in produits]
+
+    produits = Produit.objects.filter(_contains_filter(mots))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        produits = produits.annotate(pertinence=TrigramWordSimilarity(' '.join(mots), 'nom_normalise'))
+        return list(produits.order_by('-pertinence', 'nom', 'id')[:limit])
+    return list(produits.order_by('nom', 'id')[:limit])
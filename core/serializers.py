@@ -1,7 +1,8 @@
 # Fichier: core/serializers.py
 
 from rest_framework import serializers
-from .models import InventoryItem, ShoppingListItem, Recipe, Produit, Prix, Commerce, InventoryCategory
+from .models import InventoryItem, ShoppingListItem, Recipe, Produit, ProduitRedirection, Prix, Commerce, InventoryCategory
+from .pricing import unit_price_fields
 
 # --- SÉRIALISEURS D'INVENTAIRE ---
 
@@ -69,6 +70,15 @@ class PrixSubmissionSerializer(serializers.ModelSerializer):
         # On inclut les champs nécessaires à la création
         fields = ['id', 'prix', 'details_prix', 'produit_id', 'commerce_id']
 
+    def validate_produit_id(self, value):
+        """ Un produit fusionné par dedupe_produits est remplacé par son produit canonique. """
+        if Produit.objects.filter(id=value).exists():
+            return value
+        redirection = ProduitRedirection.objects.filter(ancien_id=value).values_list('produit_id', flat=True).first()
+        if redirection is None:
+            raise serializers.ValidationError("Produit introuvable.")
+        return redirection
+
     def create(self, validated_data):
         # On utilise le 'user' qui est passé dans le contexte de la vue
         user = self.context['request'].user
@@ -79,6 +89,7 @@ class PrixSubmissionSerializer(serializers.ModelSerializer):
             commerce_id=validated_data['commerce_id'],
             prix=validated_data['prix'],
             details_prix=validated_data.get('details_prix', ''),
-            submitted_by=user
+            submitted_by=user,
+            **unit_price_fields(validated_data.get('details_prix'), validated_data['prix'])
         )
         return prix_obj
\ No newline at end of file
@@ -1,13 +1,47 @@
 # Fichier: core/tests.py
 
+import gzip
+import heapq
+import importlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
-from .models import Commerce
+from rest_framework.authtoken.models import Token
+from django.utils import timezone
+from .models import Commerce, CommerceAlias, Produit, ProduitAlias, ProduitRedirection, Prix, Circulaire, ActiveDeal, ImportJob, Recommendation, ShoppingListItem, Profile
+from .flyers.jobs import JOB_TIMEOUT, MAX_ATTEMPTS, claim_next_job, run_job
+from .flyers.parsing import parse_item
+from .flyers.stream import iter_flyer_events
+from .market_cache import bump_market_version
+from .matching import TFIDF_AVAILABLE, TfidfMatcher, TfidfWeights, TrigramIndex
+from .catalog import ALIAS_MIN_USERS, catalog
+from .recommendations import TOP_DEALS
+from .basket import solve, _objective, _solve_exact
+from .pricing import parse_unit_price
+from .text import normalize_name
+from . import search
+from .management.commands import import_flyers
+from .autocomplete import PrefixIndex, autocomplete
+from .active_deals import rebuild_active_deals
+from .dedupe import find_duplicates, merge_products
 
 class CoreAPITests(TestCase):
 
     def setUp(self):
         """Cette méthode est exécutée avant chaque test."""
+        cache.clear()
         Commerce.objects.create(nom="Test Supermarché", adresse="123 Rue Fictive")
 
     def test_get_commerces_endpoint(self):
@@ -36,3 +70,1141 @@ class CoreAPITests(TestCase):
         
         # On peut toujours vérifier le type de contenu si on le souhaite
         self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class FlyerImportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="importeur", password="motdepasse")
+        self.client.force_login(self.user)
+        self.url = reverse('api_import_flyer')
+
+    def test_import_cree_produits_categories_et_prix(self):
+        """Vérifie que l'import groupé crée les lignes attendues et rapporte les durées."""
+        Produit.objects.create(nom="Lait 2%", marque="Natrel")
+        payload = {
+            "store": "IGA",
+            "date_debut": "2025-01-01",
+            "date_fin": "2025-01-07",
+            "categories": [
+                {"category_name": "Laitiers", "items": [
+                    {"name": "Lait 2%", "brand": "Natrel", "price": "4,99$", "single_price": "4.99"},
+                    {"name": "Yogourt", "brand": "Liberté", "price": "2 pour 5$", "single_price": 2.5},
+                ]},
+                {"category_name": "", "items": [
+                    {"name": "Pain", "single_price": ""},
+                ]},
+            ],
+        }
+        response = self.client.post(self.url, payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['articles_importes'], 3)
+        self.assertIn('total', data['durees_ms'])
+        self.assertEqual(Produit.objects.count(), 3)
+        self.assertEqual(Prix.objects.filter(circulaire__commerce__nom="IGA").count(), 3)
+        self.assertEqual(Produit.objects.get(nom="Lait 2%").categorie.nom, "Laitiers")
+        self.assertEqual(Produit.objects.get(nom="Pain").categorie.nom, "Divers")
+        self.assertEqual(Prix.objects.get(produit__nom="Pain").prix, Decimal("0.00"))
+
+    def test_import_invalide_ne_laisse_rien(self):
+        """Une erreur au milieu de l'import annule toute la transaction."""
+        payload = {
+            "store": "Metro",
+            "date_debut": "2025-01-01",
+            "date_fin": "2025-01-07",
+            "categories": [{"category_name": "Fruits", "items": [
+                {"name": "Pommes", "single_price": "1.99"},
+                {"name": "Poires", "single_price": "abc"},
+            ]}],
+        }
+        response = self.client.post(self.url, payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Commerce.objects.filter(nom="Metro").exists())
+        self.assertEqual(Prix.objects.count(), 0)
+
+    def test_prix_non_fini_refuse(self):
+        """NaN et l'infini passent quantize sans erreur : ils sont refusés explicitement."""
+        for valeur in ("NaN", "sNaN", "Infinity", "-inf", float('nan')):
+            with self.assertRaises(ValueError):
+                parse_item("Fruits", {"name": "Pommes", "single_price": valeur})
+
+
+class FlyerStreamTests(TestCase):
+
+    def test_lecture_en_flux_par_petits_morceaux(self):
+        """Le lecteur incrémental retrouve les articles même avec un tampon minuscule."""
+        document = json.dumps([
+            {"store": "IGA", "date_debut": "2025-01-01", "date_fin": "2025-01-07", "categories": [
+                {"items": [{"name": "Café", "single_price": 12.5}], "category_name": "Épicerie"},
+            ]},
+            {"store": "Maxi", "date_debut": "2025-01-02", "date_fin": "2025-01-08", "categories": [
+                {"category_name": "Fruits", "items": [{"name": "Pommes", "single_price": 123}]},
+            ]},
+        ], ensure_ascii=False).encode('utf-8')
+
+        events = list(iter_flyer_events(io.BytesIO(document), read_size=3))
+
+        articles = [(e[1], e[2]['name'], e[2]['single_price']) for e in events if e[0] == 'article']
+        self.assertEqual(articles, [("Épicerie", "Café", 12.5), ("Fruits", "Pommes", 123)])
+        self.assertEqual([e[1]['store'] for e in events if e[0] == 'debut'], ["IGA", "Maxi"])
+
+    def test_nombre_coupe_en_fin_de_tampon(self):
+        """Un nombre décimal d'en-tête se relit entier quelle que soit la taille de lecture."""
+        document = json.dumps({"store": "IGA", "page": 12.55, "date_debut": "2025-01-01", "date_fin": "2025-01-07",
+                               "categories": [{"category_name": "Fruits", "items": [{"name": "Pommes", "single_price": 1.5e1}]}]}).encode('utf-8')
+
+        for read_size in range(1, len(document) + 1):
+            with self.subTest(read_size=read_size):
+                events = list(iter_flyer_events(io.BytesIO(document), read_size=read_size))
+                self.assertEqual([e[1]['page'] for e in events if e[0] == 'debut'], [12.55])
+                self.assertEqual([e[2]['single_price'] for e in events if e[0] == 'article'], [15.0])
+
+
+    def test_cles_apres_categories(self):
+        """Une clé hors en-tête après 'categories' est ignorée ; une clé d'en-tête y est refusée."""
+        def document(**cles):
+            return json.dumps({"store": "IGA", "date_debut": "2025-01-01",
+                               "categories": [{"category_name": "Fruits", "items": [{"name": "Pommes"}]}], **cles}).encode('utf-8')
+
+        events = list(iter_flyer_events(io.BytesIO(document(scraped_at="2025-01-01T08:00", meta={"pages": [1, 2]}))))
+        self.assertEqual([e[2]['name'] for e in events if e[0] == 'article'], ["Pommes"])
+        with self.assertRaisesMessage(ValueError, "date_fin"):
+            list(iter_flyer_events(io.BytesIO(document(date_fin="2025-01-07"))))
+
+class ImportCommandTests(TestCase):
+
+    def test_commande_import_flyer(self):
+        """La commande importe le fichier par lots."""
+        items = [{"name": f"Produit {i}", "single_price": "1.00"} for i in range(25)]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as fp:
+            json.dump({"store": "Metro", "date_debut": "2025-01-01", "date_fin": "2025-01-07",
+                       "categories": [{"category_name": "Divers", "items": items}]}, fp)
+        self.addCleanup(os.remove, fp.name)
+
+        call_command('import_flyer', fp.name, chunk_size=10, stdout=io.StringIO())
+
+        self.assertEqual(Prix.objects.filter(commerce__nom="Metro").count(), 25)
+        self.assertEqual(Produit.objects.count(), 25)
+
+    def test_commande_import_flyers_dossier(self):
+        """La commande parallèle importe chaque fichier du dossier et isole les fichiers invalides."""
+        with tempfile.TemporaryDirectory() as dossier:
+            for i, store in enumerate(["IGA", "Maxi"]):
+                with open(os.path.join(dossier, f"{store}.json"), 'w') as fp:
+                    json.dump({"store": store, "date_debut": "2025-01-01", "date_fin": "2025-01-07",
+                               "categories": [{"category_name": "Fruits", "items": [
+                                   {"name": "Pommes", "single_price": f"1.{i}9"}]}]}, fp)
+            with open(os.path.join(dossier, "casse.json"), 'w') as fp:
+                fp.write('{"store": "Metro"}')
+
+            erreurs = io.StringIO()
+            call_command('import_flyers', dossier, workers=2, stdout=io.StringIO(), stderr=erreurs)
+
+        self.assertEqual(Prix.objects.count(), 2)
+        self.assertEqual(Produit.objects.count(), 1)
+        self.assertIn("casse.json", erreurs.getvalue())
+
+    def test_commande_import_flyers_succes_partiel(self):
+        """Un fichier dont la deuxième circulaire échoue est rapporté comme importé en partie."""
+        reelle = import_flyers.import_parsed_flyer
+
+        def import_parsed_flyer(header, items, content_hash):
+            if header.store == "Maxi":
+                raise ValueError("panne")
+            return reelle(header, items, content_hash)
+
+        with tempfile.TemporaryDirectory() as dossier:
+            with open(os.path.join(dossier, "lot.json"), 'w') as fp:
+                json.dump([{"store": store, "date_debut": "2025-01-01", "date_fin": "2025-01-07",
+                            "categories": [{"category_name": "Fruits", "items": [{"name": "Pommes", "single_price": "1.99"}]}]}
+                           for store in ["IGA", "Maxi"]], fp)
+
+            sortie, erreurs = io.StringIO(), io.StringIO()
+            with mock.patch.object(import_flyers, 'import_parsed_flyer', import_parsed_flyer):
+                call_command('import_flyers', dossier, workers=1, skip_recommendations=True, stdout=sortie, stderr=erreurs)
+
+        self.assertEqual(Prix.objects.count(), 1)
+        self.assertIn("lot.json : échec après 1 circulaire(s) importée(s) (panne)", erreurs.getvalue())
+        self.assertIn("depuis 0/1 fichier(s), et en partie depuis 1 fichier(s).", sortie.getvalue())
+
+
+class ImportJobTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="importeur", password="motdepasse")
+        self.client.force_login(self.user)
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.dossier = dossier.name
+
+    def test_file_attente_puis_worker(self):
+        """L'endpoint répond tout de suite ; le worker fait l'import et le statut le rapporte."""
+        payload = {"store": "IGA", "date_debut": "2025-01-01", "date_fin": "2025-01-07",
+                   "categories": [{"category_name": "Fruits", "items": [{"name": "Pommes", "single_price": "1.99"}]}]}
+        with self.settings(FLYER_IMPORT_DIR=self.dossier):
+            response = self.client.post(reverse('api_import_job_create'), payload, content_type='application/json')
+
+            self.assertEqual(response.status_code, 202)
+            job_id = response.json()['job_id']
+            self.assertEqual(Prix.objects.count(), 0)
+
+            call_command('run_import_worker', once=True, stdout=io.StringIO())
+
+        statut = self.client.get(reverse('api_import_job_status', args=[job_id])).json()
+        self.assertEqual(statut['status'], 'DONE')
+        self.assertEqual(statut['items_processed'], 1)
+        self.assertEqual(statut['errors'], [])
+        self.assertIsNotNone(statut['duration'])
+        self.assertEqual(Prix.objects.count(), 1)
+
+    def _job(self, contenu, **champs):
+        chemin = os.path.join(self.dossier, f"{len(os.listdir(self.dossier))}.json")
+        with open(chemin, 'w') as fp:
+            fp.write(contenu)
+        return ImportJob.objects.create(fichier=chemin, **champs)
+
+    def test_tache_abandonnee_reprise_puis_abandonnee(self):
+        """Une tâche RUNNING sans progression est reprise, puis marquée en échec après MAX_ATTEMPTS."""
+        ancien = timezone.now() - JOB_TIMEOUT - timedelta(minutes=1)
+        payload = json.dumps({"store": "IGA", "date_debut": "2025-01-01", "date_fin": "2025-01-07", "categories": []})
+        reprise = self._job(payload, status='RUNNING', attempts=1, date_started=ancien, date_progress=ancien)
+        perdue = self._job(payload, status='RUNNING', attempts=MAX_ATTEMPTS, date_started=ancien, date_progress=ancien)
+        active = self._job(payload, status='RUNNING', attempts=1, date_started=ancien, date_progress=timezone.now())
+
+        job = claim_next_job()
+
+        self.assertEqual((job.id, job.attempts), (reprise.id, 2))
+        perdue.refresh_from_db()
+        self.assertEqual(perdue.status, 'FAILED')
+        self.assertFalse(os.path.exists(perdue.fichier))
+        active.refresh_from_db()
+        self.assertEqual((active.status, active.attempts), ('RUNNING', 1))
+
+    def test_fichier_supprime_apres_echec(self):
+        """Le document d'une tâche en échec est supprimé comme celui d'une tâche terminée."""
+        job = self._job('{"store": "Metro"', status='RUNNING', attempts=1, date_started=timezone.now())
+
+        job = run_job(job)
+
+        self.assertEqual(job.status, 'FAILED')
+        self.assertFalse(os.path.exists(job.fichier))
+
+
+class FlyerDeduplicationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="importeur", password="motdepasse")
+        self.client.force_login(self.user)
+        self.url = reverse('api_import_flyer')
+        self.payload = {
+            "store": "IGA", "date_debut": "2025-01-01", "date_fin": "2025-01-07",
+            "categories": [{"category_name": "Fruits", "items": [
+                {"name": "Pommes", "price": "1,99$/lb", "single_price": "1.99"},
+                {"name": "Poires", "single_price": "2.49"},
+                {"name": "Bananes", "single_price": "0.69"},
+            ]}],
+        }
+
+    def test_reimport_identique_sans_effet(self):
+        """Renvoyer exactement la même circulaire ne crée aucune ligne."""
+        self.client.post(self.url, self.payload, content_type='application/json')
+        response = self.client.post(self.url, self.payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['statut'], 'identique')
+        self.assertEqual(Circulaire.objects.count(), 1)
+        self.assertEqual(Prix.objects.count(), 3)
+
+    def test_reimport_modifie_applique_le_diff(self):
+        """Une circulaire réémise ne modifie que les articles qui ont changé."""
+        self.client.post(self.url, self.payload, content_type='application/json')
+        ids_avant = dict(Prix.objects.values_list('produit__nom', 'id'))
+
+        items = self.payload['categories'][0]['items']
+        items[1]['single_price'] = "1.99"  # Poires : prix modifié
+        del items[2]                        # Bananes : retirées
+        items.append({"name": "Kiwis", "single_price": "0.50"})
+        response = self.client.post(self.url, self.payload, content_type='application/json')
+
+        self.assertEqual(response.json()['prix'], {'crees': 1, 'modifies': 1, 'inchanges': 1, 'supprimes': 1})
+        self.assertEqual(Circulaire.objects.count(), 1)
+        prix = dict(Prix.objects.values_list('produit__nom', 'prix'))
+        self.assertEqual(prix, {"Pommes": Decimal("1.99"), "Poires": Decimal("1.99"), "Kiwis": Decimal("0.50")})
+        self.assertEqual(Prix.objects.get(produit__nom="Pommes").id, ids_avant["Pommes"])
+        self.assertEqual(Prix.objects.get(produit__nom="Poires").id, ids_avant["Poires"])
+
+
+class ActiveDealsSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="importeur", password="motdepasse")
+        self.client.force_login(self.user)
+        today = timezone.now().date()
+        self.payload = {
+            "store": "IGA",
+            "date_debut": (today - timedelta(days=1)).isoformat(),
+            "date_fin": (today + timedelta(days=5)).isoformat(),
+            "categories": [{"category_name": "Fruits", "items": [
+                {"name": "Pommes", "brand": "Québec", "price": "1,99$/lb", "single_price": "1.99"},
+                {"name": "Poires", "single_price": "2.49"},
+            ]}],
+        }
+        self.client.post(reverse('api_import_flyer'), self.payload, content_type='application/json')
+
+    def test_endpoints_servis_depuis_l_instantane(self):
+        """Les deux endpoints publics lisent l'instantané construit à l'import."""
+        self.assertEqual(ActiveDeal.objects.count(), 2)
+
+        rabais = self.client.get(reverse('api_get_rabais_actifs')).json()
+        self.assertEqual([r['produit_nom'] for r in rabais], ["Pommes", "Poires"])
+        self.assertEqual(rabais[0]['details_prix'], "🔥 1,99$/lb")
+        self.assertEqual(rabais[1]['details_prix'], "🔥 2.49 $")
+        self.assertEqual(rabais[0]['categorie_nom'], "Fruits")
+
+        circulaires = self.client.get(reverse('api_get_circulaires_actives')).json()
+        self.assertEqual(circulaires, {"IGA": {"categories": [{"category_name": "Fruits", "items": [
+            {"name": "Pommes", "brand": "Québec", "price": "1,99$/lb", "single_price": "1.99"},
+            {"name": "Poires", "brand": "", "price": "", "single_price": "2.49"},
+        ]}]}})
+
+    def test_changement_de_date_reconstruit(self):
+        """Un instantané d'une autre journée est reconstruit à la première lecture."""
+        ActiveDeal.objects.update(snapshot_date=timezone.now().date() - timedelta(days=1))
+
+        rabais = self.client.get(reverse('api_get_rabais_actifs')).json()
+
+        self.assertEqual(len(rabais), 2)
+        self.assertFalse(ActiveDeal.objects.exclude(snapshot_date=timezone.now().date()).exists())
+
+    def test_reconstruction_partielle_sur_instantane_vide(self):
+        """Sans instantané du jour (premier déploiement), une reconstruction partielle refait tout."""
+        ActiveDeal.objects.all().delete()
+        self.payload.update(store="Metro")
+
+        self.client.post(reverse('api_import_flyer'), self.payload, content_type='application/json')
+
+        self.assertEqual(sorted(ActiveDeal.objects.values_list('commerce_nom', flat=True)), ["IGA", "IGA", "Metro", "Metro"])
+
+    def test_pagination_filtres_et_champs(self):
+        """Curseur, filtre par commerce/catégorie et sélection de champs sur les rabais."""
+        url = reverse('api_get_rabais_actifs')
+        page = self.client.get(url, {'limit': 1, 'fields': 'produit_nom,prix'}).json()
+        self.assertEqual(page['results'], [{"produit_nom": "Pommes", "prix": "1.99"}])
+
+        page = self.client.get(url, {'limit': 1, 'cursor': page['next_cursor']}).json()
+        self.assertEqual([r['produit_nom'] for r in page['results']], ["Poires"])
+        self.assertIsNone(page['next_cursor'])
+
+        self.assertEqual(self.client.get(url, {'commerce': 'Metro'}).json(), [])
+        self.assertEqual(self.client.get(url, {'commerce': '²'}).json(), [])
+        self.assertEqual(len(self.client.get(url, {'commerce': 'IGA', 'categorie': 'Fruits'}).json()), 2)
+        self.assertEqual(self.client.get(url, {'fields': 'inconnu'}).status_code, 400)
+
+    def test_tri_par_prix_unitaire(self):
+        """?tri=prix_unitaire trie par unité puis sur la colonne calculée à l'import, curseur compris."""
+        url = reverse('api_get_rabais_actifs')
+        rabais = self.client.get(url, {'tri': 'prix_unitaire'}).json()
+        self.assertEqual([(r['produit_nom'], r['prix_unitaire'], r['unite_mesure']) for r in rabais],
+                         [("Pommes", "4.3872", "kg"), ("Poires", "2.4900", "unite")])
+
+        page = self.client.get(url, {'tri': 'prix_unitaire', 'limit': 1}).json()
+        page = self.client.get(url, {'tri': 'prix_unitaire', 'limit': 1, 'cursor': page['next_cursor']}).json()
+        self.assertEqual([r['produit_nom'] for r in page['results']], ["Poires"])
+        self.assertIsNone(page['next_cursor'])
+        rabais = self.client.get(url, {'tri': 'prix_unitaire', 'unite': 'unite'}).json()
+        self.assertEqual([r['produit_nom'] for r in rabais], ["Poires"])
+        self.assertEqual([r['produit_nom'] for r in self.client.get(url, {'unite': 'KG,Unite'}).json()], ["Pommes", "Poires"])
+        self.assertEqual(self.client.get(url, {'unite': 'lb'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'tri': 'prix'}).status_code, 400)
+
+    def test_mode_flux_memes_octets(self):
+        """?stream=1 produit exactement les mêmes octets que la réponse normale."""
+        self.payload.update(store="Metro")
+        self.client.post(reverse('api_import_flyer'), self.payload, content_type='application/json')
+
+        for name in ('api_get_rabais_actifs', 'api_get_circulaires_actives'):
+            normal = self.client.get(reverse(name))
+            flux = self.client.get(reverse(name), {'stream': '1'})
+            self.assertTrue(flux.streaming)
+            self.assertEqual(b''.join(flux.streaming_content), normal.content)
+
+
+class MarketCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Commerce.objects.create(nom="IGA")
+        self.url = reverse('api_get_commerces')
+
+    def test_etag_et_304(self):
+        """Un client qui renvoie l'ETag reçoit un 304 tant que les données n'ont pas changé."""
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ecriture_invalide_le_cache(self):
+        """Une écriture incrémente la version : nouvel ETag et contenu à jour."""
+        etag = self.client.get(self.url)['ETag']
+        Commerce.objects.create(nom="Metro")
+        self.assertEqual(len(self.client.get(self.url).json()), 1)  # encore en cache
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_market_version()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_reponse_precompressee(self):
+        """Les rabais actifs sont servis précompressés selon Accept-Encoding."""
+        url = reverse('api_get_rabais_actifs')
+        normal = self.client.get(url)
+        compresse = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(compresse['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compresse.content), normal.content)
+        self.assertNotEqual(compresse['ETag'], normal['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=compresse['ETag']).status_code, 304)
+
+
+    def test_prix_communautaires_drf(self):
+        """Réponse DRF mise en cache en JSON ; l'API explorable reste servie, sans cache ; un prix modifié invalide."""
+        prix = Prix.objects.create(produit=Produit.objects.create(nom="Beurre"), commerce=Commerce.objects.get(), prix=Decimal("5.49"))
+        url = reverse('api_get_community_prices')
+        response = self.client.get(url)
+        self.assertEqual(response.json()[0]['prix'], "5.49")
+        with self.assertNumQueries(1):  # version des données de marché
+            self.assertEqual(self.client.get(url).content, response.content)
+
+        html = self.client.get(url, HTTP_ACCEPT='text/html')
+        self.assertTrue(html['Content-Type'].startswith('text/html'))
+        self.assertNotIn('ETag', html)
+
+        prix.prix = Decimal("4.99")
+        with self.captureOnCommitCallbacks(execute=True):
+            prix.save()
+        self.assertEqual(self.client.get(url).json()[0]['prix'], "4.99")
+
+class OptimizerMatchingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalog.clear()
+        self.user = User.objects.create_user(username="client", password="x")
+        self.client.force_login(self.user)
+        commerce = Commerce.objects.create(nom="IGA Extra")
+        today = timezone.now().date()
+        circulaire = Circulaire.objects.create(commerce=commerce, date_debut=today, date_fin=today)
+        for nom in ("Lait 2%", "Lait au chocolat", "Pommes Gala", "Pain tranché", "Beurre salé"):
+            Prix.objects.create(produit=Produit.objects.create(nom=nom), commerce=commerce,
+                                circulaire=circulaire, prix=Decimal("3.99"))
+
+    def test_index_equivalent_au_balayage(self):
+        """L'index donne les mêmes résultats que le balayage complet et difflib, par le chemin de l'optimiseur."""
+        import difflib
+        from core.catalog import _fuzzy_scores
+        noms = ["lait 2%", "lait au chocolat", "pommes gala", "pain tranché", "beurre salé", "la", "fromage"]
+        index = TrigramIndex(noms)
+        requetes = ("lait", "la", "ain", "pome", "beure sale", "fromages", "xyz")
+        for requete in requetes:
+            self.assertEqual([noms[i] for i in index.substring_matches(requete)], [n for n in noms if requete in n])
+
+        commerce = Commerce.objects.create(nom="Metro")
+        for nom in ("La", "Fromage"):
+            Prix.objects.create(produit=Produit.objects.create(nom=nom), commerce=commerce, prix=Decimal("1.00"))
+        catalog.clear()
+        shards = catalog.shards([])
+        tous = [name for shard in shards for name in shard.index.names]
+        for requete, matches in zip(requetes, _fuzzy_scores(shards, requetes, 'difflib', 5, 0.5)):
+            meilleurs = heapq.nlargest(5, matches, key=lambda name: (matches[name][0], name))
+            self.assertEqual(meilleurs, difflib.get_close_matches(requete, tous, n=5, cutoff=0.5))
+
+    def test_optimisation_liste(self):
+        """Les articles trouvent leurs rabais par sous-chaîne puis par correspondance floue."""
+        response = self.client.post(reverse('api_optimize_list'), {
+            "items": [{"name": "Lait"}, {"name": "Pomes gala"}],
+            "stores": ["IGA"],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        lait, pommes = response.json()
+        self.assertEqual([d['name'] for d in lait['deals']], ["Lait 2%", "Lait au chocolat"])
+        self.assertEqual([d['name'] for d in pommes['deals']], ["Pommes Gala"])
+
+    def test_requete_chaude_sans_base(self):
+        """Une fois le catalogue construit, une requête ne touche plus la base ; une écriture l'invalide."""
+        url = reverse('api_optimize_list')
+        payload = {"items": [{"name": "Beurre"}], "stores": ["IGA"]}
+        self.client.post(url, payload, content_type='application/json')
+
+        self.client.force_login(self.user)  # la session est chargée avant de compter
+        with self.assertNumQueries(2):  # session + utilisateur, aucune requête de prix
+            response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(len(response.json()[0]['deals']), 1)
+
+        commerce = Commerce.objects.get(nom="IGA Extra")
+        Prix.objects.create(produit=Produit.objects.create(nom="Beurre doux"), commerce=commerce,
+                            circulaire=Circulaire.objects.get(), prix=Decimal("4.49"))
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_market_version()
+        catalog._checked_at = 0.0  # expiration de l'intervalle de vérification
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(len(response.json()[0]['deals']), 2)
+
+    def test_cache_de_resultats(self):
+        """Un article déjà optimisé est servi par le cache ; seuls les nouveaux sont recalculés."""
+        url = reverse('api_optimize_list')
+        post = lambda noms: self.client.post(url, {"items": [{"name": n} for n in noms], "stores": ["IGA"]},
+                                             content_type='application/json')
+        premier = post(["Lait", "Pain"])
+        self.assertEqual((premier['X-Cache-Hits'], premier['X-Cache-Misses']), ('0', '2'))
+
+        second = post(["lait ", "Pain", "Beurre"])
+        self.assertEqual((second['X-Cache-Hits'], second['X-Cache-Misses']), ('2', '1'))
+        self.assertEqual(second.json()[0]['deals'], premier.json()[0]['deals'])
+
+    def test_choix_appris(self):
+        """Un rabais choisi par assez d'utilisateurs passe en tête des rabais de l'article, sans remplacer les autres."""
+        url = reverse('api_optimize_list')
+        post = lambda: self.client.post(url, {"items": [{"name": "Lait"}]}, content_type='application/json')
+        lait, chocolat = Prix.objects.get(produit__nom="Lait 2%"), Prix.objects.get(produit__nom="Lait au chocolat")
+        self.assertEqual([d['price_id'] for d in post().json()[0]['deals']], [lait.id, chocolat.id])
+
+        selection = {"item_name": " LAIT ", "price_id": chocolat.id}
+        response = self.client.post(reverse('api_optimize_selection'), selection, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post(reverse('api_optimize_selection'), selection,
+                                          content_type='application/json').status_code, 200)
+        self.assertEqual(ProduitAlias.objects.get(terme="lait").selections, 1)
+        # Un seul utilisateur ne change rien pour les autres.
+        self.assertEqual([d['price_id'] for d in post().json()[0]['deals']], [lait.id, chocolat.id])
+
+        for i in range(ALIAS_MIN_USERS - 1):
+            self.client.force_login(User.objects.create_user(username=f"client{i}", password="x"))
+            self.client.post(reverse('api_optimize_selection'), selection, content_type='application/json')
+        self.assertEqual([d['price_id'] for d in post().json()[0]['deals']], [chocolat.id, lait.id])
+
+    def test_alias_appris_sans_match_flou(self):
+        """Un terme qui a assez de produits appris ne passe ni par la sous-chaîne ni par le match flou."""
+        from core import catalog as catalog_module
+        shards = catalog.shards(["IGA"])
+        produits = list(Produit.objects.filter(nom__in=["Pain tranché", "Beurre salé", "Pommes Gala"]).values_list('id', flat=True))
+        with mock.patch.object(catalog_module, '_fuzzy_scores', wraps=catalog_module._fuzzy_scores) as flou, \
+                mock.patch.object(TrigramIndex, 'substring_matches', autospec=True, return_value=[]) as sous_chaine:
+            resultats = catalog_module.match_entries(shards, ["dejeuner"], timezone.now(), produit_aliases={"dejeuner": produits})
+        self.assertEqual(len(resultats[0]), 3)
+        flou.assert_not_called()
+        sous_chaine.assert_not_called()
+
+    def test_choix_valide_avec_les_magasins_optimises(self):
+        """Le choix est validé avec les magasins de l'optimisation ; un identifiant en texte est accepté."""
+        maxi = Commerce.objects.create(nom="Maxi")
+        for nom in ("Pome A", "Pome B", "Pome C"):
+            Prix.objects.create(produit=Produit.objects.create(nom=nom), commerce=maxi, prix=Decimal("1.99"))
+        catalog.clear()
+        payload = {"items": [{"name": "pome"}], "stores": ["IGA"]}
+        [pommes] = self.client.post(reverse('api_optimize_list'), payload, content_type='application/json').json()[0]['deals']
+        self.assertEqual(pommes['name'], "Pommes Gala")
+
+        url = reverse('api_optimize_selection')
+        selection = {"item_name": "pome", "price_id": str(pommes['price_id'])}
+        # Tous commerces confondus, "pome" trouve assez de prix par sous-chaîne chez Maxi.
+        self.assertEqual(self.client.post(url, selection, content_type='application/json').status_code, 400)
+        response = self.client.post(url, {**selection, "stores": ["IGA"], "matcher": "difflib"}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_choix_hors_rabais_refuse(self):
+        """Un prix que l'optimiseur ne propose pas pour l'article, ou qui n'est plus actif, est refusé."""
+        url = reverse('api_optimize_selection')
+        pain = Prix.objects.get(produit__nom="Pain tranché")
+        response = self.client.post(url, {"item_name": "Lait", "price_id": pain.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        lait = Prix.objects.get(produit__nom="Lait 2%")
+        Circulaire.objects.update(date_fin=timezone.now().date() - timedelta(days=1))
+        catalog.clear()
+        response = self.client.post(url, {"item_name": "Lait", "price_id": lait.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProduitAlias.objects.exists())
+
+    def test_alias_de_commerce(self):
+        """Un alias désigne son commerce ; les autres noms restent cherchés par sous-chaîne."""
+        metro = Commerce.objects.create(nom="Metro Plus")
+        CommerceAlias.objects.create(alias=" Épicerie du coin ", commerce=metro)
+        catalog.clear()
+        ids = lambda stores: [shard.commerce_id for shard in catalog.shards(stores)]
+        iga = Commerce.objects.get(nom="IGA Extra").id
+        self.assertEqual(ids(["épicerie du coin"]), [metro.id])
+        self.assertEqual(ids(["iga", "Épicerie du coin"]), [iga, metro.id])
+        self.assertEqual(ids(["Maxi"]), [])
+
+    def test_alias_de_commerce_doublon_sans_casse(self):
+        """« IGA » après « iga » est refusé par la validation, pas par la base."""
+        iga = Commerce.objects.get(nom="IGA Extra")
+        CommerceAlias.objects.create(alias="iga", commerce=iga)
+
+        with self.assertRaises(ValidationError) as erreur:
+            CommerceAlias(alias=" IGA ", commerce=iga).full_clean()
+        self.assertIn('alias', erreur.exception.message_dict)
+
+    @unittest.skipUnless(TFIDF_AVAILABLE, "NumPy/SciPy non installés")
+    def test_matcher_tfidf(self):
+        """Le match TF-IDF est choisi par paramètre et signalé par X-Matcher."""
+        response = self.client.post(reverse('api_optimize_list'), {
+            "items": [{"name": "Pomes gala"}, {"name": "Beure sale"}],
+            "matcher": "tfidf",
+        }, content_type='application/json')
+        self.assertEqual(response['X-Matcher'], 'tfidf')
+        pommes, beurre = response.json()
+        self.assertEqual(pommes['deals'][0]['name'], "Pommes Gala")
+        self.assertEqual(beurre['deals'][0]['name'], "Beurre salé")
+
+        response = self.client.post(reverse('api_optimize_list'), {"items": [], "matcher": "autre"},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @unittest.skipUnless(TFIDF_AVAILABLE, "NumPy/SciPy non installés")
+    def test_tfidf_scores_comparables_entre_commerces(self):
+        """Avec l'IDF commun, un même nom obtient le même score dans chaque commerce."""
+        commun = ["lait 2%", "lait chocolat", "lait amande", "pain blanc"]
+        poids = TfidfWeights(commun + ["beurre sale"])
+        scores_a = {position: score for score, position in TfidfMatcher(commun, poids).scored_matches(["lait"], cutoff=0)[0]}
+        scores_b = {position: score for score, position in TfidfMatcher(["lait 2%", "beurre sale"], poids).scored_matches(["lait"], cutoff=0)[0]}
+
+        # "lait 2%" est en position 0 dans les deux commerces.
+        self.assertAlmostEqual(scores_a[0], scores_b[0])
+
+
+class BasketSolverTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="client", password="x")
+        self.client.force_login(self.user)
+        produit = Produit.objects.create(nom="Lait")
+        self.prix = {}
+        for nom, lait, pain in (("IGA", "4.00", "3.00"), ("Metro", "3.50", "3.60")):
+            commerce = Commerce.objects.create(nom=nom)
+            self.prix[nom] = (
+                Prix.objects.create(produit=produit, commerce=commerce, prix=Decimal(lait)),
+                Prix.objects.create(produit=Produit.objects.create(nom=f"Pain {nom}"), commerce=commerce, prix=Decimal(pain)),
+            )
+
+    def _solve(self, **options):
+        items = [
+            {"name": "Lait", "quantity": "2", "deals": [{"price_id": p[0].id} for p in self.prix.values()]},
+            {"name": "Pain", "quantity": "1", "deals": [{"price_id": p[1].id} for p in self.prix.values()]},
+        ]
+        response = self.client.post(reverse('api_optimize_solve'), {"items": items, **options},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_panier_multi_magasins(self):
+        """Sans contrainte, chaque article va au magasin le moins cher (prix × quantité)."""
+        panier = self._solve()
+        self.assertEqual(sorted(panier['stores']), ["IGA", "Metro"])
+        self.assertEqual(panier['items'][0]['selectedDeal'], self.prix["Metro"][0].id)
+        self.assertEqual(Decimal(panier['total']), Decimal("10.00"))
+
+    def test_penalite_et_plafond(self):
+        """La pénalité par magasin supplémentaire ou le plafond regroupent les achats."""
+        for options in ({"store_penalty": "1"}, {"max_stores": 1}):
+            panier = self._solve(**options)
+            self.assertEqual(panier['stores'], ["Metro"])
+            self.assertEqual(Decimal(panier['cost']), Decimal("10.60"))
+
+    def test_prix_inactif_ignore(self):
+        """Un prix communautaire de plus de 7 jours n'est plus proposé au panier."""
+        Prix.objects.filter(id=self.prix["Metro"][0].id).update(date_mise_a_jour=timezone.now() - timedelta(days=8))
+
+        panier = self._solve()
+
+        self.assertEqual(panier['items'][0]['selectedDeal'], self.prix["IGA"][0].id)
+
+    def test_forme_invalide_refusee(self):
+        """Un price_id non entier (liste, objet) ou des 'deals' mal formés donnent un 400, pas une erreur serveur."""
+        url = reverse('api_optimize_solve')
+        for deals in ([{"price_id": [1]}], [{"price_id": {"id": 1}}], {"price_id": 1}, ["1"]):
+            response = self.client.post(url, {"items": [{"name": "Lait", "deals": deals}]}, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_heuristique_proche_de_l_optimum(self):
+        """Trop de magasins pour l'énumération : l'heuristique reste proche de l'optimum."""
+        import random
+        rng = random.Random(1)
+        costs = [{s: rng.uniform(1, 10) for s in range(15) if rng.random() < 0.8} for _ in range(100)]
+        stores, method = solve(costs, 15, store_penalty=2.0)
+        self.assertEqual(method, 'heuristique')
+        optimum = _objective(costs, _solve_exact(costs, 15, 15, 2.0), 2.0)
+        self.assertLessEqual(_objective(costs, stores, 2.0), optimum * 1.02)
+
+        self.assertEqual(solve(costs, 15, max_stores=3, store_penalty=2.0)[1], 'exact')
+
+
+class UnitPriceTests(TestCase):
+
+    def test_lecture_des_details(self):
+        """Offres multiples, prix au poids et texte sans indication."""
+        cas = {
+            ("2 pour 5,00$", "2.50"): (Decimal("2.5000"), 2, 'unite'),
+            ("3/10$", "0"): (Decimal("3.3333"), 3, 'unite'),
+            ("1,99$/lb", "1.99"): (Decimal("4.3872"), 1, 'kg'),
+            ("par livre", "1.99"): (Decimal("4.3872"), 1, 'kg'),
+            ("0,89 $/100 g", "0"): (Decimal("8.9000"), 1, 'kg'),
+            ("5,49 $/lb 12,10 $/kg", "5.49"): (Decimal("12.1000"), 1, 'kg'),
+            ("2/500 g", "3.00"): (Decimal("3.0000"), 1, 'unite'),
+            ("", "0"): (None, 1, 'unite'),
+        }
+        for (details, prix), attendu in cas.items():
+            self.assertEqual(tuple(parse_unit_price(details, prix)), attendu, details)
+
+    def test_backfill(self):
+        """La commande remplit les colonnes des prix existants."""
+        commerce = Commerce.objects.create(nom="IGA")
+        prix = Prix.objects.create(produit=Produit.objects.create(nom="Yogourt"), commerce=commerce,
+                                   prix=Decimal("2.50"), details_prix="2 pour 5$")
+        call_command('backfill_prix_unitaire', stdout=io.StringIO())
+        prix.refresh_from_db()
+        self.assertEqual((prix.prix_unitaire, prix.quantite_lot), (Decimal("2.5000"), 2))
+
+
+class NormalizedNameTests(TestCase):
+
+    def test_normalisation(self):
+        """Accents, pluriels et unités ne distinguent plus deux noms."""
+        for a, b in (("Pâtes Penne 900 G", "pates penne 900g"), ("Tomates", "tomate"),
+                     ("Lait 2 %", "lait 2%"), ("Œufs", "oeuf"), ("Gâteaux", "gateau")):
+            self.assertEqual(normalize_name(a), normalize_name(b))
+
+    def test_colonne_et_recherche(self):
+        """La colonne est remplie à l'enregistrement et par la commande de rattrapage."""
+        produit = Produit.objects.create(nom="Pâtes Penne")
+        self.assertEqual(produit.nom_normalise, "pate penne")
+
+        Produit.objects.filter(id=produit.id).update(nom_normalise='')
+        call_command('backfill_nom_normalise', stdout=io.StringIO())
+        produit.refresh_from_db()
+        self.assertEqual(produit.nom_normalise, "pate penne")
+
+        self.client.force_login(User.objects.create_user(username="client", password="x"))
+        response = self.client.get(reverse('product_search'), {'q': 'pates'})
+        self.assertEqual([p['nom'] for p in response.json()], ["Pâtes Penne"])
+
+    def test_optimiseur_sur_noms_normalises(self):
+        """« pates » et « tomate » trouvent « Pâtes » et « Tomates » par sous-chaîne."""
+        catalog.clear()
+        user = User.objects.create_user(username="client", password="x")
+        self.client.force_login(user)
+        commerce = Commerce.objects.create(nom="IGA")
+        for nom in ("Pâtes Penne", "Tomates italiennes"):
+            Prix.objects.create(produit=Produit.objects.create(nom=nom), commerce=commerce, prix=Decimal("1.99"))
+        response = self.client.post(reverse('api_optimize_list'), {"items": [{"name": "pates"}, {"name": "tomate"}]},
+                                    content_type='application/json')
+        self.assertEqual([r['deals'][0]['name'] for r in response.json()], ["Pâtes Penne", "Tomates italiennes"])
+
+    def test_migration_remplit_et_renormalise(self):
+        """La migration 0023 remplit la colonne et fusionne les alias dont le terme normalisé coïncide."""
+        from django.apps import apps
+        migration = importlib.import_module('core.migrations.0023_produit_nom_normalise')
+        produit = Produit.objects.create(nom="Pâtes Penne")
+        Produit.objects.filter(id=produit.id).update(nom_normalise='')
+        a, b = User.objects.create_user(username="a"), User.objects.create_user(username="b")
+        for terme, user in (("pâtes", a), ("pates", b)):
+            alias = ProduitAlias.objects.create(terme=terme, produit=produit, selections=1)
+            alias.selectionne_par.add(user)
+
+        migration.remplir_nom_normalise(apps, None)
+        migration.renormaliser_alias(apps, None)
+
+        produit.refresh_from_db()
+        self.assertEqual(produit.nom_normalise, "pate penne")
+        alias = ProduitAlias.objects.get()
+        self.assertEqual((alias.terme, alias.selections), ("pate", 2))
+
+
+class RecommendationTests(TestCase):
+
+    def setUp(self):
+        catalog.clear()
+        today = timezone.now().date()
+        for nom, produit in (("IGA", "Lait 2%"), ("Metro", "Lait écrémé")):
+            commerce = Commerce.objects.create(nom=nom)
+            circulaire = Circulaire.objects.create(commerce=commerce, date_debut=today, date_fin=today)
+            Prix.objects.create(produit=Produit.objects.create(nom=produit), commerce=commerce,
+                                circulaire=circulaire, prix=Decimal("4.99"))
+        self.user = User.objects.create_user(username="client", password="x")
+        autre = User.objects.create_user(username="autre", password="x")
+        ShoppingListItem.objects.create(user=self.user, name="Lait")
+        ShoppingListItem.objects.create(user=autre, name="lait")
+
+    def test_calcul_par_groupes(self):
+        """Chaque article de chaque utilisateur reçoit ses rabais, par groupes d'utilisateurs."""
+        call_command('compute_recommendations', chunk_size=1, stdout=io.StringIO())
+        self.assertEqual(Recommendation.objects.count(), 2)
+        for recommendation in Recommendation.objects.all():
+            self.assertEqual(recommendation.terme, "lait")
+            self.assertEqual([deal['store'] for deal in recommendation.deals], ["IGA", "Metro"])
+
+    def test_endpoint(self):
+        """Les rabais précalculés sont servis tels quels ; un nouvel article est associé sur le moment."""
+        call_command('compute_recommendations', stdout=io.StringIO())
+        ShoppingListItem.objects.create(user=self.user, name="Lait écrémé")
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('api_optimize_recommendations'))
+        self.assertEqual(response['X-Precomputed-Hits'], '1')
+        self.assertEqual(response['X-Precomputed-Misses'], '1')
+        self.assertEqual([item['name'] for item in response.json()], ["Lait", "Lait écrémé"])
+        self.assertEqual(len(response.json()[0]['deals']), 2)
+
+        response = self.client.get(reverse('api_optimize_recommendations'), {'stores': 'metro'})
+        self.assertEqual([deal['store'] for deal in response.json()[0]['deals']], ["Metro"])
+
+    def test_rabais_perimes_et_magasins_avant_troncature(self):
+        """Un rabais terminé depuis le calcul est retiré ; le filtre de magasins passe avant le TOP_DEALS."""
+        metro = Commerce.objects.get(nom="Metro")
+        circulaire = Circulaire.objects.get(commerce=metro)
+        for i in range(TOP_DEALS):
+            Prix.objects.create(produit=Produit.objects.create(nom=f"Lait {i}"), commerce=Commerce.objects.get(nom="IGA"),
+                                circulaire=Circulaire.objects.get(commerce__nom="IGA"), prix=Decimal("1.00"))
+        # Au-delà des TOP_DEALS premiers rabais tous commerces confondus.
+        Prix.objects.create(produit=Produit.objects.create(nom="Lait Metro"), commerce=metro, circulaire=circulaire, prix=Decimal("1.00"))
+        call_command('compute_recommendations', stdout=io.StringIO())
+        self.client.force_login(self.user)
+        url = reverse('api_optimize_recommendations')
+
+        response = self.client.get(url, {'stores': 'metro'})
+        self.assertEqual(response['X-Precomputed-Hits'], '0')
+        self.assertEqual([deal['name'] for deal in response.json()[0]['deals']], ["Lait écrémé", "Lait Metro"])
+
+        Circulaire.objects.filter(id=circulaire.id).update(date_fin=timezone.now().date() - timedelta(days=1))
+        deals = self.client.get(url).json()[0]['deals']
+        self.assertEqual(len(deals), TOP_DEALS - 1)
+        self.assertNotIn("Metro", {deal['store'] for deal in deals})
+
+
+    def test_importation_api_relance_le_calcul(self):
+        """Une importation par l'API relance le calcul après validation ; une circulaire identique, non."""
+        from core import recommendations
+        self.client.force_login(self.user)
+        payload = {"store": "Maxi", "date_debut": "2025-01-01", "date_fin": "2025-01-07",
+                   "categories": [{"category_name": "Laitiers", "items": [{"name": "Lait 1%", "single_price": "3.99"}]}]}
+        with mock.patch.object(recommendations.threading, 'Thread') as fil:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('api_import_flyer'), payload, content_type='application/json')
+            fil.assert_called_once_with(target=recommendations._run_in_background, daemon=True)
+            recommendations._running = False
+
+            with self.captureOnCommitCallbacks(execute=True) as rappels:
+                self.client.post(reverse('api_import_flyer'), payload, content_type='application/json')
+            self.assertEqual(len(rappels), 0)
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username="client", password="x"))
+
+    def _search(self, **params):
+        response = self.client.get(reverse('product_search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [produit['nom'] for produit in response.json()]
+
+    def test_classement_et_prefixes(self):
+        """Chaque mot est un préfixe ; le nom pèse plus que la marque."""
+        Produit.objects.create(nom="Yogourt grec", marque="Liberté")
+        Produit.objects.create(nom="Lait 2%", marque="Natrel")
+        Produit.objects.create(nom="Beurre", marque="Lait de la ferme")
+        self.assertEqual(self._search(q="lai"), ["Lait 2%", "Beurre"])
+        self.assertEqual(self._search(q="lait natrel"), ["Lait 2%"])
+        self.assertEqual(self._search(q="liberte"), ["Yogourt grec"])
+
+    def test_index_a_jour_et_plafond(self):
+        """Les écritures, même groupées, sont indexées ; le nombre de résultats est plafonné."""
+        Produit.objects.bulk_create([Produit(nom=f"Pomme {i}", nom_normalise=f"pomme {i}") for i in range(60)])
+        self.assertEqual(len(self._search(q="pomme")), search.DEFAULT_LIMIT)
+        self.assertEqual(len(self._search(q="pomme", limit=1000)), search.MAX_RESULTS)
+
+        produit = Produit.objects.get(nom="Pomme 0")
+        produit.nom = "Poire"
+        produit.save()
+        self.assertEqual(self._search(q="poire"), ["Poire"])
+        produit.delete()
+        self.assertEqual(self._search(q="poire"), [])
+
+
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        autocomplete.clear()
+        Produit.objects.create(nom="Pâtes Penne 900 G", marque="Barilla")
+        Produit.objects.create(nom="Pain tranché", marque="POM")
+        autocomplete.build()
+        token = Token.objects.create(user=User.objects.create_user(username="client", password="x"))
+        self.headers = {'HTTP_AUTHORIZATION': f"Token {token.key}"}
+
+    def _complete(self, q):
+        response = self.client.get(reverse('product_autocomplete'), {'q': q}, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [produit['nom'] for produit in response.json()]
+
+    def test_prefixes_sans_requete_sql(self):
+        """Noms complets d'abord, puis mots du nom et marques ; aucune requête SQL une fois le jeton vu."""
+        self._complete("p")
+        for q, attendu in (("pa", ["Pain tranché", "Pâtes Penne 900 G"]), ("penne 900", ["Pâtes Penne 900 G"]),
+                           ("bari", ["Pâtes Penne 900 G"]), ("po", ["Pain tranché"])):
+            with self.assertNumQueries(0):
+                self.assertEqual(self._complete(q), attendu)
+
+    def test_index_non_construit(self):
+        """Sans préchauffage, la requête ne construit pas l'index elle-même : elle lance la construction."""
+        autocomplete.clear()
+        with mock.patch.object(autocomplete, 'warm') as warm:
+            self.assertEqual(self._complete("pa"), [])
+        warm.assert_called_once_with()
+
+    def test_jeton_supprime(self):
+        """Un jeton supprimé (déconnexion) n'est plus accepté, même en cache."""
+        self._complete("pa")
+        Token.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('product_autocomplete'), {'q': 'pa'}, **self.headers).status_code, 401)
+
+    def test_authentification_requise(self):
+        """Comme la recherche, l'autocomplétion demande un utilisateur connecté."""
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('product_autocomplete'), {'q': 'pa'}).status_code, 401)
+
+    def test_tableau_jamais_modifie_en_place(self):
+        """Une mise à jour substitue de nouveaux tableaux : une lecture en cours garde les anciens, intacts."""
+        index = PrefixIndex([(1, "Pain tranché", "POM", "")])
+        entries, recent, _ = index._view
+        copies = (list(entries), list(recent))
+
+        index.update([(2, "Pâtes", "", ""), (3, "Pain doré", "", "")], removed=[1])
+
+        self.assertEqual((entries, recent), copies)
+        self.assertIs(index.entries, entries)  # le grand tableau n'est pas recopié
+        self.assertEqual([produit['nom'] for produit in index.complete("pa", 10)], ["Pain doré", "Pâtes"])
+
+    def test_fusion_des_modifications(self):
+        """Au-delà de COMPACT_SIZE modifications, elles sont fusionnées dans le grand tableau."""
+        from core import autocomplete as module
+        index = PrefixIndex([(1, "Pain tranché", "", ""), (2, "Pâtes", "", "")])
+        with mock.patch.object(module, 'COMPACT_SIZE', 3):
+            index.update([(1, "Pain blanc", "", "")])
+            self.assertEqual(index._view[2], {1})
+            index.update([(3, "Poires", "", "")])
+        entries, recent, hidden = index._view
+        self.assertEqual((recent, hidden), ([], frozenset()))
+        self.assertEqual([entry for entry in entries if entry[2] == 1], [("blanc", 1, 1), ("pain blanc", 0, 1)])
+        self.assertEqual([produit['nom'] for produit in index.complete("p", 10)], ["Pain blanc", "Pâtes", "Poires"])
+
+    def test_modification_pendant_la_construction(self):
+        """Un produit enregistré pendant qu'une construction lit la base n'est pas perdu à la substitution."""
+        from core import autocomplete as module
+        lire = module._rows
+
+        def lecture_puis_renommage(*args):
+            rows = list(lire(*args))
+            produit = Produit.objects.get(nom="Pain tranché")
+            produit.nom = "Pain de blé"
+            with self.captureOnCommitCallbacks(execute=True):
+                produit.save()
+            return rows
+
+        with mock.patch.object(module, '_rows', lecture_puis_renommage):
+            autocomplete.build()
+        self.assertEqual(self._complete("pain"), ["Pain de blé"])
+
+    def test_mises_a_jour(self):
+        """Créations et suppressions du processus, puis rattrapage des insertions groupées."""
+        with self.captureOnCommitCallbacks(execute=True):
+            produit = Produit.objects.create(nom="Poireaux")
+        self.assertEqual(self._complete("poi"), ["Poireaux"])
+        with self.captureOnCommitCallbacks(execute=True):
+            produit.delete()
+        self.assertEqual(self._complete("poi"), [])
+
+        Produit.objects.bulk_create([Produit(nom="Poivron rouge", nom_normalise="poivron rouge")])
+        autocomplete.catch_up()
+        self.assertEqual(self._complete("poi"), ["Poivron rouge"])
+
+
+class BarcodeLookupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        today = timezone.now().date()
+        self.produit = Produit.objects.create(nom="Lait 2%", code_barres="055872012345")
+        for nom, prix in (("IGA", ("4.99", "4.49")), ("Metro", ("5.29",))):
+            commerce = Commerce.objects.create(nom=nom)
+            circulaire = Circulaire.objects.create(commerce=commerce, date_debut=today, date_fin=today)
+            for montant in prix:
+                Prix.objects.create(produit=self.produit, commerce=commerce, circulaire=circulaire, prix=Decimal(montant))
+
+    def test_code_unique(self):
+        """Meilleur prix par commerce, du moins cher au plus cher ; ensuite servi par le cache."""
+        url = reverse('product_barcode', args=["0-55872-01234-5"])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['produit']['id'], self.produit.id)
+        self.assertEqual([(p['store'], p['price']) for p in response.json()['prices']], [("IGA", "4.49"), ("Metro", "5.29")])
+        with self.assertNumQueries(1):  # version des données de marché
+            self.assertEqual(self.client.get(url).json(), response.json())
+        self.assertEqual(self.client.get(reverse('product_barcode', args=["999"])).status_code, 404)
+
+    def test_lot(self):
+        """Un lot de codes ; un EAN-13 trouve le UPC-A correspondant."""
+        response = self.client.post(reverse('product_barcode_batch'), {"codes": ["0055872012345", "123", "abc"]},
+                                    content_type='application/json')
+        results = response.json()['results']
+        self.assertEqual(results["0055872012345"]['produit']['nom'], "Lait 2%")
+        self.assertIsNone(results["123"])
+        self.assertIsNone(results["abc"])
+
+
+    def test_code_ajoute_apres_mise_en_cache(self):
+        """Un code ajouté à un produit (admin) n'est plus servi comme inconnu depuis le cache."""
+        url = reverse('product_barcode', args=["0123456789012"])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        beurre = Produit.objects.create(nom="Beurre")
+        beurre.code_barres = "123456789012"
+        with self.captureOnCommitCallbacks(execute=True):
+            beurre.save()
+        self.assertEqual(self.client.get(url).json()['produit']['id'], beurre.id)
+
+        beurre.code_barres = None
+        with self.captureOnCommitCallbacks(execute=True):
+            beurre.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_collision_de_variantes_journalisee(self):
+        """Deux produits portant les écritures UPC-A et EAN-13 d'un même code : le code demandé l'emporte, avec un avertissement."""
+        ean = Produit.objects.create(nom="Lait 2% (EAN)", code_barres="0055872012345")
+        with self.assertLogs('core.barcodes', level='WARNING') as logs:
+            response = self.client.get(reverse('product_barcode', args=["0055872012345"]))
+        self.assertEqual(response.json()['produit']['id'], ean.id)
+        self.assertIn("0055872012345", logs.output[0])
+
+class DedupeTests(TestCase):
+
+    def test_regroupement(self):
+        """Mêmes mots dans le désordre : doublons ; autre format ou autre marque : non."""
+        rows = [
+            (1, "Lait 2% Natrel 2L", "Natrel", ""),
+            (2, "Natrel lait 2 % 2 L", None, ""),
+            (3, "Lait 2% Natrel 4L", "Natrel", ""),
+            (4, "Lait 2% 2L", "Lactantia", ""),
+            (5, "Lait 2% 2L", "", ""),
+        ]
+        groupes, _ = find_duplicates(rows)
+        self.assertEqual(groupes, [[1, 2]])
+        # Plus permissif, le produit sans marque rejoint un groupe, mais Natrel et Lactantia restent séparés.
+        groupes, _ = find_duplicates(rows, threshold=0.6)
+        self.assertEqual(groupes, [[1, 2, 5]])
+
+    def test_fusion(self):
+        """Les prix passent au produit canonique, les doublons deviennent des redirections."""
+        commerce = Commerce.objects.create(nom="IGA")
+        canonique = Produit.objects.create(nom="Lait 2% Natrel 2L", marque="Natrel")
+        doublon = Produit.objects.create(nom="Natrel lait 2 % 2 L", code_barres="055872012345")
+        for produit in (canonique, canonique, doublon):
+            Prix.objects.create(produit=produit, commerce=commerce, prix=Decimal("4.99"))
+
+        out = io.StringIO()
+        call_command('dedupe_produits', '--dry-run', stdout=out)
+        self.assertIn("1 doublon(s)", out.getvalue())
+        self.assertTrue(Produit.objects.filter(id=doublon.id).exists())
+
+        call_command('dedupe_produits', stdout=io.StringIO())
+        self.assertFalse(Produit.objects.filter(id=doublon.id).exists())
+        self.assertEqual(Prix.objects.filter(produit=canonique).count(), 3)
+        canonique.refresh_from_db()
+        self.assertEqual(canonique.code_barres, "055872012345")
+        self.assertEqual(ProduitRedirection.objects.get(ancien_id=doublon.id).produit, canonique)
+
+        # L'ancien identifiant reste utilisable pour soumettre un prix.
+        self.client.force_login(User.objects.create_user(username="client", password="x"))
+        response = self.client.post(reverse('price_submit'), {"produit_id": doublon.id, "commerce_id": commerce.id, "prix": "3.99"},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Prix.objects.filter(produit=canonique).count(), 4)
+
+    def test_fusion_garde_les_rabais_actifs(self):
+        """Les rabais actifs des doublons passent au produit canonique dans la transaction de la fusion."""
+        commerce = Commerce.objects.create(nom="IGA")
+        today = timezone.now().date()
+        circulaire = Circulaire.objects.create(commerce=commerce, date_debut=today, date_fin=today)
+        canonique = Produit.objects.create(nom="Lait 2% Natrel 2L", marque="Natrel")
+        doublon = Produit.objects.create(nom="Natrel lait 2 % 2 L")
+        for produit in (canonique, doublon):
+            Prix.objects.create(produit=produit, commerce=commerce, circulaire=circulaire, prix=Decimal("4.99"))
+        rebuild_active_deals()
+
+        merge_products(canonique.id, [doublon.id])
+
+        self.assertEqual(list(ActiveDeal.objects.values_list('produit_id', 'produit_nom')),
+                         [(canonique.id, "Lait 2% Natrel 2L")] * 2)
+
+
+class ConfirmationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.auteur = User.objects.create_user(username="auteur", password="x")
+        self.prix = Prix.objects.create(
+            produit=Produit.objects.create(nom="Beurre"), commerce=Commerce.objects.create(nom="IGA"),
+            prix=Decimal("5.49"), submitted_by=self.auteur,
+        )
+
+    def test_confirmation_unique(self):
+        """Compteur et réputation ne bougent qu'à la première confirmation d'un utilisateur."""
+        self.client.force_login(User.objects.create_user(username="client", password="x"))
+        url = reverse('price_confirm', args=[self.prix.id])
+        self.assertEqual(self.client.post(url).json()['status'], 'succès')
+        self.assertEqual(self.client.post(url).json()['message'], 'Déjà confirmé.')
+
+        self.prix.refresh_from_db()
+        self.assertEqual(self.prix.confirmations_count, 1)
+        self.assertEqual(self.prix.confirmations.count(), 1)
+        self.auteur.profile.refresh_from_db()
+        self.assertEqual(self.auteur.profile.reputation, 5)
+
+        self.client.force_login(self.auteur)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        cache.clear()
+        response = self.client.get(reverse('api_get_community_prices'))
+        self.assertIn("(1 ✓)", response.json()[0]['details_prix'])
+
+    def test_confirmation_auteur_sans_profil(self):
+        """Un auteur sans profil en reçoit un, crédité : la confirmation n'est pas perdue."""
+        Profile.objects.filter(user=self.auteur).delete()
+        self.client.force_login(User.objects.create_user(username="client", password="x"))
+        response = self.client.post(reverse('price_confirm', args=[self.prix.id]))
+        self.assertEqual(response.json()['status'], 'succès')
+
+        self.prix.refresh_from_db()
+        self.assertEqual(self.prix.confirmations_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.auteur).reputation, 5)
+
+    def test_compteur_suit_admin_et_suppression(self):
+        """Confirmations modifiées hors de l'API (admin) ou supprimées avec leur utilisateur."""
+        client = User.objects.create_user(username="client", password="x")
+        autre = User.objects.create_user(username="autre", password="x")
+        self.prix.confirmations.add(client, autre)
+        self.prix.refresh_from_db()
+        self.assertEqual(self.prix.confirmations_count, 2)
+
+        autre.confirmed_prices.clear()
+        self.prix.refresh_from_db()
+        self.assertEqual(self.prix.confirmations_count, 1)
+
+        client.delete()
+        self.prix.refresh_from_db()
+        self.assertEqual(self.prix.confirmations_count, 0)
@@ -0,0 +1,54 @@
+# Fichier: core/text.py
+
+"""
+Normalisation des noms de produits et d'articles pour la recherche.
+
+normalize_name("Pâtes Penne 900 G") == normalize_name("pates penne 900g")
+normalize_name("Tomates") == normalize_name("tomate")
+normalize_name("Lait 2 %") == normalize_name("lait 2%")
+
+La même fonction est appliquée aux noms enregistrés (Produit.nom_normalise)
+et aux textes cherchés : la racine obtenue n'a pas besoin d'être un vrai mot,
+seulement d'être la même des deux côtés. Aucun modèle Django n'est importé.
+"""
+
+import re
+import unicodedata
+
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss'})
+
+_UNITES = {
+    'g': 'g', 'gr': 'g', 'gramme': 'g', 'grammes': 'g',
+    'kg': 'kg', 'mg': 'mg',
+    'ml': 'ml', 'l': 'l', 'litre': 'l', 'litres': 'l',
+    'lb': 'lb', 'lbs': 'lb', 'livre': 'lb', 'livres': 'lb',
+    'oz': 'oz', 'un': 'un', 'unite': 'un', 'unites': 'un',
+    '%': '%',
+}
+_QUANTITE_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(' + '|'.join(sorted(map(re.escape, _UNITES), key=len, reverse=True)) + r')(?![a-z])')
+_SEPARATEURS_RE = re.compile(r"[^a-z0-9%.]+|(?<!\d)\.|\.(?!\d)")
+
+
+def _strip_accents(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _singular(word):
+    """ Pluriels français courants : chevaux → cheval, gâteaux → gateau, tomates → tomate. """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith('eaux'):
+        return word[:-1]
+    if word.endswith('aux'):
+        return word[:-3] + 'al'
+    if word.endswith(('s', 'x')) and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def normalize_name(text):
+    """ Minuscules sans accents, pluriels ramenés au singulier, quantités et unités collées. """
+    text = _strip_accents(str(text or '').lower().translate(_LIGATURES))
+    text = _QUANTITE_RE.sub(lambda m: m.group(1).replace(',', '.') + _UNITES[m.group(2)], text)
+    return ' '.join(_singular(word) for word in _SEPARATEURS_RE.sub(' ', text).split())
@@ -7,6 +7,7 @@ from django.http import HttpResponseRedirect
 from django.contrib import messages
 from django.contrib.auth.models import User
 from .models import Prix, Circulaire, InventoryItem, ShoppingListItem, Recipe, Produit, Commerce, Categorie, Report
+from .market_cache import bump_market_version
 
 # --- VUES HTML (PAGES) ---
 
@@ -37,6 +38,7 @@ def reset_flyers_view(request):
     if request.method == 'POST' and request.user.is_superuser:
         prix_count, _ = Prix.objects.filter(circulaire__isnull=False).delete()
         circulaire_count, _ = Circulaire.objects.all().delete()
+        bump_market_version()
         messages.success(request, f'{circulaire_count} circulaires et {prix_count} prix associés ont été supprimés.')
     return HttpResponseRedirect('/admin/data-management/')
 
@@ -45,6 +47,7 @@ def reset_flyers_view(request):
 def reset_community_prices_view(request):
     if request.method == 'POST' and request.user.is_superuser:
         count, _ = Prix.objects.filter(circulaire__isnull=True).delete()
+        bump_market_version()
         messages.success(request, f'{count} prix communautaires ont été supprimés.')
     return HttpResponseRedirect('/admin/data-management/')
 
@@ -53,6 +56,7 @@ def reset_community_prices_view(request):
 def reset_users_view(request):
     if request.method == 'POST' and request.user.is_superuser:
         count, _ = User.objects.filter(is_superuser=False).delete()
+        bump_market_version()
         messages.success(request, f'{count} utilisateurs (non-administrateurs) ont été supprimés.')
     return HttpResponseRedirect('/admin/data-management/')
 
@@ -70,5 +74,6 @@ def reset_all_data_view(request):
         Commerce.objects.all().delete()
         Categorie.objects.all().delete()
         User.objects.filter(is_superuser=False).delete()
+        bump_market_version()
         messages.warning(request, 'La base de données a été entièrement réinitialisée (sauf les comptes administrateurs).')
     return HttpResponseRedirect('/admin/data-management/')
@@ -22,6 +22,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Variables d'état
     let optimizedItems = [];
+    // Magasins et algorithme de la dernière optimisation : le serveur valide un choix de rabais avec les mêmes.
+    let optimizationParams = JSON.parse(localStorage.getItem('savedOptimizationParams')) || { stores: [], matcher: 'difflib' };
     let allStores = [];
     let nearbyStores = [];
     let manualStores = [];
@@ -994,6 +996,20 @@ document.addEventListener('DOMContentLoaded', function() {
     
     function saveOptimizedList() {
         localStorage.setItem('savedOptimizedList', JSON.stringify(optimizedItems));
+        localStorage.setItem('savedOptimizationParams', JSON.stringify(optimizationParams));
+    }
+
+    // Le choix est envoyé au serveur pour améliorer les associations de l'optimiseur.
+    // Sans connexion ou en cas d'erreur, on l'ignore : la sélection locale reste valide.
+    function recordDealSelection(itemName, deal) {
+        if (!localStorage.getItem('authToken') || !deal || deal.price_id == null) return;
+        apiCall('optimize/selection', 'POST', {
+            item_name: itemName,
+            price_id: deal.price_id,
+            stores: optimizationParams.stores,
+            matcher: optimizationParams.matcher
+        })
+            .catch(error => console.warn("Choix de rabais non enregistré :", error.message));
     }
 
     function handleDealSelection(event) {
@@ -1007,6 +1023,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (dealIndex >= 0) {
                     const selectedDeal = item.deals[dealIndex];
                     item.selectedDeal = selectedDeal;
+                    recordDealSelection(item.name, selectedDeal);
                     
                     const priceString = String(selectedDeal.price);
                     let priceForTotal = '';
@@ -1075,6 +1092,24 @@ document.addEventListener('DOMContentLoaded', function() {
         if (savedList && Array.isArray(savedList) && savedList.length > 0) {
             optimizedItems = savedList;
             renderOptimizedList();
+        } else {
+            loadRecommendations();
+        }
+    }
+
+    // Sans liste sauvegardée, on affiche tout de suite les rabais précalculés par le serveur
+    // (tous commerces confondus) ; le bouton d'optimisation reste disponible pour affiner.
+    async function loadRecommendations() {
+        if (!localStorage.getItem('authToken')) return;
+        try {
+            const recommendations = await apiCall('optimize/recommendations', 'GET');
+            if (Array.isArray(recommendations) && recommendations.length > 0 && optimizedItems.length === 0) {
+                optimizedItems = recommendations;
+                optimizationParams = { stores: [], matcher: 'difflib' };
+                renderOptimizedList();
+            }
+        } catch (error) {
+            console.warn("Recommandations indisponibles :", error.message);
         }
     }
     
@@ -1246,12 +1281,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         try {
+            const params = { stores: selectedStores, matcher: 'difflib' };
             const response = await apiCall('optimize', 'POST', {
                 items: shoppingList,
-                stores: selectedStores
+                ...params
             });
 
             optimizedItems = response;
+            optimizationParams = params;
             renderOptimizedList();
             saveOptimizedList();
 